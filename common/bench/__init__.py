@@ -0,0 +1,3 @@
+"""
+基准测试与正确性校验工具，用 python -m common.bench.<模块名> 运行
+"""
@@ -0,0 +1,206 @@
+"""
+perft 基准测试：统计从某个局面出发走 N 步能到达的所有局面数，用来衡量走法生成的速度，
+同时对比旧的棋子逻辑(active_map_block + active_block_set)和新的走法生成器是否完全一致。
+
+用法：
+    python -m common.bench.perft                       # 新生成器，测试局面集，深度 3
+    python -m common.bench.perft -d 4 --divide         # 同时输出每步棋的分支数
+    python -m common.bench.perft -b legacy -d 2        # 用界面棋子的旧逻辑跑
+    python -m common.bench.perft -b legal              # 只走合法走法(王不能送吃)
+    python -m common.bench.perft -b compare -d 3       # 两种逻辑逐步对比，不一致时返回码为 1
+    python -m common.bench.perft --fen "<FEN>"         # 只测指定局面
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Callable
+
+from common.engine.position import Position, START_FEN, promotion_type, move_name, MOVE_PROMOTION
+from common.engine.movegen import generate_moves, generate_legal_moves
+
+__all__ = [
+    "PERFT_SUITE", "FastBackend", "LegacyBackend", "BACKENDS",
+    "perft", "divide",
+]
+
+# 测试局面集：(名字, FEN)，覆盖吃过路兵、王车易位、升变和吃王结束
+PERFT_SUITE: list[tuple[str, str]] = [
+    ('开局', START_FEN),
+    ('王车易位', 'r2k3r/ppp2ppp/2n5/3pp3/3PP3/2N5/PPP2PPP/R4K1R w KQkq -'),
+    ('吃过路兵', 'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w - d6f6'),
+    ('双方过路兵', 'rnbqkbnr/pp3ppp/8/2pPp3/3pP3/8/PPP2PPP/RNBQKBNR b - c6e3'),
+    ('升变', 'n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - -'),
+    ('中局', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w - -'),
+    ('残局吃王', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -'),
+]
+
+
+class FastBackend:
+    """
+    基于局面模型的后端，可以换成任意走法生成函数
+    """
+    def __init__(self, position: Position, generator: Callable[[Position], list[int]] = generate_moves):
+        """
+        :param position: 局面，会被直接修改，需要保留原局面时传入副本
+        :parameter generator: (可选) 走法生成函数，默认为 generate_moves
+        """
+        self.position = position
+        self.generator = generator
+        self.make_move = position.make_move
+        self.unmake_move = position.unmake_move
+
+    def generate_moves(self) -> list[int]:
+        return self.generator(self.position)
+
+
+class LegacyBackend:
+    """
+    基于界面棋子的后端，走法完全由各棋子的 active_map_block 激活的地图块决定，
+    走子用 GameMap.make_move / unmake_move，不播放动画
+    """
+    def __init__(self, position: Position):
+        """
+        :param position: 局面，会被直接修改，需要保留原局面时传入副本
+        """
+        # 没有窗口时用 SDL 的虚拟驱动，必须在 pygame 初始化前设置
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        import pygame
+        pygame.init()
+        screen = pygame.display.get_surface() or pygame.display.set_mode((800, 800))
+        # 资源加载依赖显示模式，所以在这里才导入
+        from common.uiBase import UIBase
+        from common.gameMap import GameMap
+        container = UIBase(screen, 75, 75, (640, 640))
+        self.game_map = GameMap(container, 640, position)
+        self.position = self.game_map.position
+        self.make_move = self.game_map.make_move
+        self.unmake_move = self.game_map.unmake_move
+
+    def generate_moves(self) -> list[int]:
+        game_map = self.game_map
+        chess_set = game_map.chess_dict[game_map.round_name]
+        # 王被吃掉后游戏结束
+        if not any(chess.chess_type == 'wang' for chess in chess_set):
+            return []
+        moves = []
+        for chess in list(chess_set):
+            # 只激活地图块，不走 select_chess，省掉音效
+            game_map.selected_chess = chess
+            chess.active_map_block()
+            for block in game_map.active_block_set:
+                if block.chess is not None and block.chess.state != 'eaten':
+                    continue
+                move = game_map.create_move(chess, block.list_x, block.list_y)
+                # 界面上升变对象是走完再选的，这里展开成四种
+                if promotion_type(move) != -1:
+                    moves.extend(move & 0xFFF | MOVE_PROMOTION + n << 12 for n in range(4))
+                else:
+                    moves.append(move)
+            game_map.cancel_select_chess()
+        return moves
+
+
+# 后端名字对应的类
+BACKENDS = {
+    'fast': FastBackend,
+    'legacy': LegacyBackend,
+    'legal': lambda position: FastBackend(position, generate_legal_moves),
+}
+
+
+def perft(backend: FastBackend | LegacyBackend, depth: int) -> int:
+    """
+    统计走 depth 步后的叶子局面数
+    :param backend: 后端
+    :param depth: 深度
+    :return: 局面数
+    """
+    moves = backend.generate_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        undo = backend.make_move(move)
+        nodes += perft(backend, depth - 1)
+        backend.unmake_move(undo)
+    return nodes
+
+def divide(backend: FastBackend | LegacyBackend, depth: int) -> dict[str, int]:
+    """
+    按第一步棋拆分 perft 的结果，和其他实现对比时可以快速定位出错的分支
+    :param backend: 后端
+    :param depth: 深度，至少为 1
+    :return: {走法记号: 局面数}
+    """
+    result = {}
+    for move in backend.generate_moves():
+        undo = backend.make_move(move)
+        result[move_name(move)] = perft(backend, depth - 1)
+        backend.unmake_move(undo)
+    return dict(sorted(result.items()))
+
+
+def _run(backend_name: str, fen: str, depth: int) -> tuple[dict[str, int], float]:
+    """
+    跑一次 divide 并计时
+    :return: (divide 结果, 耗时秒数)
+    """
+    backend = BACKENDS[backend_name](Position.from_fen(fen))
+    start_time = time.perf_counter()
+    result = divide(backend, depth)
+    return result, time.perf_counter() - start_time
+
+def _report(name: str, backend_name: str, depth: int, result: dict[str, int], seconds: float, show_divide: bool):
+    nodes = sum(result.values())
+    print(f'[{backend_name}] {name}  深度 {depth}  局面数 {nodes}  '
+          f'耗时 {seconds:.3f}s  {int(nodes / max(seconds, 1e-9))} NPS')
+    if show_divide:
+        for name, count in result.items():
+            print(f'    {name}: {count}')
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog = 'python -m common.bench.perft', description = '走法生成的 perft 基准测试')
+    parser.add_argument('-d', '--depth', type = int, default = 3, help = '搜索深度，默认 3')
+    parser.add_argument('-b', '--backend', choices = ['fast', 'legacy', 'legal', 'compare'], default = 'fast',
+                        help = 'fast 为新生成器，legacy 为界面棋子的旧逻辑，legal 为合法走法，compare 为前两者对比')
+    parser.add_argument('--fen', action = 'append', help = '只测试指定的局面，可以重复使用')
+    parser.add_argument('--divide', action = 'store_true', help = '输出每一步棋的分支数')
+    args = parser.parse_args(argv)
+
+    suite = [(fen, fen) for fen in args.fen] if args.fen else PERFT_SUITE
+    depth = max(args.depth, 1)
+    total_nodes = 0
+    total_seconds = 0.0
+    mismatch = False
+    for name, fen in suite:
+        if args.backend != 'compare':
+            result, seconds = _run(args.backend, fen, depth)
+            _report(name, args.backend, depth, result, seconds, args.divide)
+            total_nodes += sum(result.values())
+            total_seconds += seconds
+            continue
+
+        legacy_result, legacy_seconds = _run('legacy', fen, depth)
+        fast_result, fast_seconds = _run('fast', fen, depth)
+        _report(name, 'legacy', depth, legacy_result, legacy_seconds, False)
+        _report(name, 'fast', depth, fast_result, fast_seconds, False)
+        total_nodes += sum(fast_result.values())
+        total_seconds += fast_seconds
+        if legacy_result != fast_result:
+            mismatch = True
+            print(f'    不一致：{fen}')
+            for move in sorted(legacy_result.keys() | fast_result.keys()):
+                if legacy_result.get(move) != fast_result.get(move):
+                    print(f'    {move}: legacy {legacy_result.get(move)}  fast {fast_result.get(move)}')
+
+    print(f'总计 局面数 {total_nodes}  耗时 {total_seconds:.3f}s  {int(total_nodes / max(total_seconds, 1e-9))} NPS')
+    if args.backend == 'compare':
+        print('两种逻辑不一致' if mismatch else '两种逻辑完全一致')
+    return 1 if mismatch else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+并行搜索的基准测试：对比不同进程数下的每秒节点数、固定时间内的搜索深度和搜到指定深度所需的时间。
+
+用法：
+    python -m common.bench.smp                         # 进程数 1、2、4…直到 CPU 核心数
+    python -m common.bench.smp -w 1 8 16 -t 5 -d 6     # 指定进程数、固定思考时间和目标深度
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from common.engine.position import Position
+from common.engine.parallel import ParallelSearcher
+from common.bench.perft import PERFT_SUITE
+
+__all__ = [
+    "SMP_SUITE", "measure",
+]
+
+# 测试局面集，只取有实际对局意义的局面
+SMP_SUITE: list[tuple[str, str]] = [(name, fen) for name, fen in PERFT_SUITE if name in ('开局', '王车易位', '中局')]
+
+
+def measure(workers: int, fen: str, time_limit: float, target_depth: int, tt_mb: int) -> dict[str, float]:
+    """
+    测量一个局面
+    :param workers: 搜索进程数
+    :param fen: 局面
+    :param time_limit: 固定思考时间，单位秒
+    :param target_depth: 测量耗时的目标深度
+    :param tt_mb: 置换表占用的内存
+    :return: {'depth': 固定时间内完成的深度, 'nps': 每秒节点数, 'time_to_depth': 搜到目标深度的秒数}
+    """
+    searcher = ParallelSearcher(workers, tt_mb)
+    try:
+        position = Position.from_fen(fen)
+        start_time = time.perf_counter()
+        _, _, depth = searcher.search(position, time_limit)
+        seconds = time.perf_counter() - start_time
+        nps = searcher.nodes / max(seconds, 1e-9)
+
+        # 清空置换表，避免上一次搜索的结果影响计时
+        searcher.clear()
+        start_time = time.perf_counter()
+        searcher.search(position, float('inf'), target_depth)
+        time_to_depth = time.perf_counter() - start_time
+    finally:
+        searcher.close()
+    return {'depth': depth, 'nps': nps, 'time_to_depth': time_to_depth}
+
+
+def main(argv: list[str] | None = None) -> int:
+    cpu_count = os.cpu_count() or 1
+    default_workers = [1]
+    while default_workers[-1] * 2 <= cpu_count:
+        default_workers.append(default_workers[-1] * 2)
+    parser = argparse.ArgumentParser(prog = 'python -m common.bench.smp', description = '并行搜索的基准测试')
+    parser.add_argument('-w', '--workers', type = int, nargs = '+', default = default_workers,
+                        help = '要测试的进程数，默认为 1、2、4…直到 CPU 核心数')
+    parser.add_argument('-t', '--time', type = float, default = 2.0, help = '固定思考时间，默认 2 秒')
+    parser.add_argument('-d', '--depth', type = int, default = 5, help = '测量耗时的目标深度，默认 5')
+    parser.add_argument('--tt-mb', type = int, default = 64, help = '置换表占用的内存，默认 64 MB')
+    args = parser.parse_args(argv)
+
+    print(f'CPU 核心数 {cpu_count}  固定时间 {args.time}s  目标深度 {args.depth}')
+    baseline = None
+    for workers in args.workers:
+        results = [measure(workers, fen, args.time, args.depth, args.tt_mb) for _, fen in SMP_SUITE]
+        depth = sum(result['depth'] for result in results) / len(results)
+        nps = sum(result['nps'] for result in results) / len(results)
+        time_to_depth = sum(result['time_to_depth'] for result in results)
+        if baseline is None:
+            baseline = time_to_depth
+        print(f'进程数 {workers:>3}  平均深度 {depth:.2f}  {int(nps)} NPS  '
+              f'搜到深度 {args.depth} 共 {time_to_depth:.3f}s  加速比 {baseline / max(time_to_depth, 1e-9):.2f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,426 @@
+"""
+自对弈锦标赛：两个引擎从开局集的局面出发轮流执白执黑对弈，用进程池同时下多局，不需要界面。
+每下完一局就往结果文件末尾追加一行 JSON，中途停下后用同一个结果文件再次运行会接着统计；
+同时做序贯概率比检验(SPRT)，判定新引擎是否比旧引擎强，结论出来后立即停止。
+
+用法：
+    python -m common.bench.tournament new=. old=../chess-old --tc 10+0.1 -j 8 -o results.jsonl
+    python -m common.bench.tournament new=. old=../chess-old --sprt 0 5 --alpha 0.05 --beta 0.05
+    python -m common.bench.tournament A=. B=. --games 200 --tc 2+0.02     # 同一份代码自对弈，检查结果接近 0 Elo
+
+引擎用 名字=源码目录 指定，目录里的 common/engine 会以单独的包名载入，新旧两份代码可以在同一个进程里对弈。
+裁判使用本目录的局面模型和走法生成器：吃王(或标准规则下将死)获胜，按时间控制超时判负，
+走出不合法的棋判负，三次重复局面、五十回合和步数上限判和
+"""
+
+import argparse
+import importlib.util
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+from types import ModuleType
+from typing import Any, Iterable
+
+from common.engine.position import Position, START_FEN, EMPTY, WANG, move_name
+from common.engine.movegen import generate_moves, generate_legal_moves, in_check
+from common.engine.history import PositionHistory, is_irreversible
+from common.engine.book import read_games
+
+__all__ = [
+    "parse_time_control", "load_openings", "play_game",
+    "elo_to_score", "score_to_elo", "sprt_llr", "sprt_bounds", "estimate_elo", "run_tournament",
+]
+
+# 本项目的根目录，引擎目录和它相同时直接使用已经导入的 common.engine
+_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+# 默认的开局集
+DEFAULT_OPENINGS = os.path.join(_ROOT, 'resource', 'book', 'openings.txt')
+# 分配思考时间时假设还要走多少步
+_MOVES_TO_GO = 30
+# 搜索每隔一批节点才看一次时间，实际用时会略超过思考时间，分配时预留出来
+MOVE_OVERHEAD = 0.05
+# 结果记号，以白方视角
+RESULT_WHITE = '1-0'
+RESULT_BLACK = '0-1'
+RESULT_DRAW = '1/2-1/2'
+
+
+def parse_time_control(text: str) -> tuple[float, float]:
+    """
+    解析时间控制
+    :param text: 基础时间+每步加秒，单位秒，比如 10+0.1，省略加秒时为 0
+    :return: (基础时间, 每步加秒)
+    """
+    base, _, increment = text.partition('+')
+    try:
+        base_time, increment_time = float(base), float(increment or 0)
+    except ValueError:
+        raise ValueError(f'时间控制应写成 基础时间+每步加秒：{text}') from None
+    if base_time <= 0 or increment_time < 0:
+        raise ValueError(f'时间控制应写成 基础时间+每步加秒：{text}')
+    return base_time, increment_time
+
+
+def load_openings(path: str, plies: int) -> list[str]:
+    """
+    读取开局集，每行是一个 FEN，或者和开局库棋谱一样的一串走法记号，走法只取前 plies 步
+    :param path: 开局集文件路径，# 开头的行是注释
+    :param plies: 每个走法开局取前多少步
+    :return: 去重后的开局局面 FEN 列表，按出现顺序排列
+    """
+    openings = []
+    for game in read_games(path):
+        if '/' in game[0]:
+            openings.append(' '.join(game))
+            continue
+        position = Position.start()
+        for name in game[:plies]:
+            moves = {move_name(move): move for move in generate_legal_moves(position)}
+            if name not in moves:
+                break
+            position.make_move(moves[name])
+        openings.append(position.to_fen())
+    return list(dict.fromkeys(openings))
+
+
+# 每个进程已经载入的引擎包，键为源码目录
+_ENGINES: dict[str, ModuleType] = {}
+# 每个进程里每个引擎的搜索器，置换表在同一引擎的多局之间复用，每局开始前清空
+_SEARCHERS: dict[str, Any] = {}
+
+def _load_engine(path: str) -> ModuleType:
+    """
+    载入源码目录里的引擎包，不同目录的引擎包以不同的包名载入，互不干扰
+    :param path: 源码目录
+    :return: 引擎包，含有 Position 和 Searcher
+    """
+    path = os.path.normpath(os.path.abspath(path))
+    if path in _ENGINES:
+        return _ENGINES[path]
+    if path == _ROOT:
+        import common.engine as engine
+    else:
+        engine_dir = os.path.join(path, 'common', 'engine')
+        name = f'_tournament_engine_{len(_ENGINES)}'
+        spec = importlib.util.spec_from_file_location(name, os.path.join(engine_dir, '__init__.py'),
+                                                      submodule_search_locations = [engine_dir])
+        if spec is None:
+            raise ImportError(f'{path} 里没有 common/engine')
+        engine = importlib.util.module_from_spec(spec)
+        # 包里的模块用相对导入，要先登记包名
+        sys.modules[name] = engine
+        spec.loader.exec_module(engine)
+    _ENGINES[path] = engine
+    return engine
+
+
+def play_game(task: dict[str, Any]) -> dict[str, Any]:
+    """
+    下一局棋，进程池里的每个任务就是一局
+    :param task: {'round': 第几局, 'opening': 开局 FEN, 'white': (名字, 源码目录), 'black': (名字, 源码目录),
+                  'tc': (基础时间, 每步加秒), 'tt_mb': 置换表内存, 'max_plies': 步数上限, 'standard_rules': 是否按标准规则}
+    :return: 结果字典，white、black 为引擎名字，result 以白方视角，另有结束原因、步数和走法记录
+    """
+    position = Position.from_fen(task['opening'])
+    history = PositionHistory(position.hash)
+    base_time, increment = task['tc']
+    standard_rules = task['standard_rules']
+    # 下标为阵营，1 为白方(P2)
+    players = (task['black'], task['white'])
+    clocks = [base_time, base_time]
+    engines = []
+    for name, path in players:
+        engine = _load_engine(path)
+        if name not in _SEARCHERS:
+            _SEARCHERS[name] = engine.Searcher(task['tt_mb'])
+        _SEARCHERS[name].clear()
+        engines.append((engine, _SEARCHERS[name]))
+
+    moves: list[str] = []
+    winner, reason = None, ''
+    while True:
+        side = position.side
+        legal_moves = generate_legal_moves(position)
+        if not legal_moves:
+            if standard_rules:
+                winner, reason = (side ^ 1, '将死') if in_check(position) else (None, '逼和')
+                break
+            # 无路可走时只能送吃
+            legal_moves = generate_moves(position)
+            if not legal_moves:
+                winner, reason = None, '无子可走'
+                break
+
+        engine, searcher = engines[side]
+        # 同一份代码直接复制局面，其他目录的引擎通过 FEN 转换
+        engine_position = position.copy() if engine.Position is Position else engine.Position.from_fen(position.to_fen())
+        time_limit = max(min(clocks[side] / _MOVES_TO_GO + increment, clocks[side] / 2) - MOVE_OVERHEAD, 0.001)
+        start_time = time.perf_counter()
+        if standard_rules:
+            move = searcher.search(engine_position, time_limit, standard_rules = True)[0]
+        else:
+            move = searcher.search(engine_position, time_limit)[0]
+        clocks[side] -= time.perf_counter() - start_time
+        if clocks[side] < 0:
+            winner, reason = side ^ 1, '超时'
+            break
+        clocks[side] += increment
+        if move not in legal_moves:
+            winner, reason = side ^ 1, f'不合法的走法 {move_name(move) if move else "无"}'
+            break
+
+        moves.append(move_name(move))
+        target = position.board[move >> 6 & 63]
+        if target != EMPTY and target % 6 == WANG:
+            winner, reason = side, '吃王'
+            break
+        undo = position.make_move(move)
+        history.push(position.hash, is_irreversible(position, undo))
+        draw_reason = history.draw_reason()
+        if draw_reason is not None:
+            reason = draw_reason
+            break
+        if len(moves) >= task['max_plies']:
+            reason = '步数上限'
+            break
+
+    return {
+        'round': task['round'],
+        'white': task['white'][0],
+        'black': task['black'][0],
+        'result': RESULT_DRAW if winner is None else RESULT_WHITE if winner else RESULT_BLACK,
+        'reason': reason,
+        'opening': task['opening'],
+        'plies': len(moves),
+        'moves': ' '.join(moves),
+    }
+
+
+def elo_to_score(elo: float) -> float:
+    """
+    Elo 差对应的期望得分
+    """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+def score_to_elo(score: float) -> float:
+    """
+    期望得分对应的 Elo 差，得分为 0 或 1 时返回正负无穷
+    """
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+def sprt_llr(wins: int, draws: int, losses: int, elo0: float, elo1: float) -> float:
+    """
+    SPRT 的对数似然比，用三项分布的正态近似(GSPRT)
+    :param wins: 新引擎胜局数
+    :param draws: 和局数
+    :param losses: 新引擎负局数
+    :param elo0: 原假设的 Elo 差，新引擎不比它强
+    :param elo1: 备择假设的 Elo 差，新引擎至少强这么多
+    :return: 对数似然比，胜负局都没有时为 0
+    """
+    count = wins + draws + losses
+    if not wins or not losses:
+        # 样本方差还没法估计
+        return 0.0
+    score = (wins + draws / 2) / count
+    variance = (wins + draws / 4) / count - score * score
+    if variance <= 0:
+        return 0.0
+    score0, score1 = elo_to_score(elo0), elo_to_score(elo1)
+    return (score1 - score0) * (2 * score - score0 - score1) / (2 * variance / count)
+
+def sprt_bounds(alpha: float, beta: float) -> tuple[float, float]:
+    """
+    SPRT 的判定界限
+    :param alpha: 第一类错误率，新引擎没变强却判为变强的概率
+    :param beta: 第二类错误率，新引擎变强了却判为没变强的概率
+    :return: (下界, 上界)，对数似然比低于下界接受原假设，高于上界接受备择假设
+    """
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+def estimate_elo(wins: int, draws: int, losses: int) -> tuple[float, float]:
+    """
+    根据战绩估计 Elo 差
+    :return: (Elo 差, 95% 置信区间的半宽)，局数太少时半宽为无穷
+    """
+    count = wins + draws + losses
+    if not count:
+        return 0.0, math.inf
+    score = (wins + draws / 2) / count
+    if not 0 < score < 1:
+        return score_to_elo(score), math.inf
+    deviation = math.sqrt(max((wins + draws / 4) / count - score * score, 0) / count)
+    low, high = score_to_elo(score - 1.96 * deviation), score_to_elo(score + 1.96 * deviation)
+    return score_to_elo(score), (high - low) / 2
+
+
+def _read_results(path: str) -> Iterable[dict[str, Any]]:
+    if not os.path.isfile(path):
+        return
+    with open(path, 'r', encoding = 'utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # 上次运行被强行打断时最后一行可能没写完
+                    continue
+
+def _tally(result: dict[str, Any], name: str, stats: list[int]):
+    """
+    按引擎 name 的视角把一局的结果计入 [胜, 和, 负]
+    """
+    if result['result'] == RESULT_DRAW:
+        stats[1] += 1
+    elif (result['result'] == RESULT_WHITE) == (result['white'] == name):
+        stats[0] += 1
+    else:
+        stats[2] += 1
+
+
+def run_tournament(engines: list[tuple[str, str]], openings: list[str], games: int, output: str,
+                   tc: tuple[float, float], jobs: int = 1, tt_mb: int = 4, max_plies: int = 400,
+                   standard_rules: bool = False, sprt: tuple[float, float] | None = (0.0, 5.0),
+                   alpha: float = 0.05, beta: float = 0.05, log: Any = print) -> tuple[list[int], str | None]:
+    """
+    运行锦标赛，每个开局两个引擎各执一次白
+    :param engines: [(名字, 源码目录)]，两个引擎，第一个为新引擎
+    :param openings: 开局 FEN 列表
+    :param games: 总局数，包括结果文件里已有的对局
+    :param output: 结果文件，每局追加一行 JSON
+    :param tc: (基础时间, 每步加秒)
+    :parameter jobs: (可选) 同时下多少局
+    :parameter tt_mb: (可选) 每个引擎的置换表内存
+    :parameter max_plies: (可选) 超过这么多半回合判和
+    :parameter standard_rules: (可选) 是否按标准规则，将死获胜、逼和判和
+    :parameter sprt: (可选) (elo0, elo1)，为 None 时不做 SPRT，下满 games 局为止
+    :parameter alpha: (可选) SPRT 的第一类错误率
+    :parameter beta: (可选) SPRT 的第二类错误率
+    :parameter log: (可选) 输出进度的函数
+    :return: (新引擎的 [胜, 和, 负], SPRT 结论)，结论为 'H1' 表示新引擎更强，'H0' 表示没有变强，没有结论时为 None
+    """
+    (new_name, _), (old_name, _) = engines
+    if new_name == old_name:
+        raise ValueError('两个引擎的名字不能相同')
+    if not openings:
+        raise ValueError('开局集是空的')
+    stats = [0, 0, 0]
+    # 已经下完的轮次，多进程下完成的顺序是乱的，中途打断时小于最大轮次的对局也可能没下
+    done: set[int] = set()
+    for result in _read_results(output):
+        if ({result.get('white'), result.get('black')} == {new_name, old_name}
+                and result['round'] not in done):
+            _tally(result, new_name, stats)
+            done.add(result['round'])
+    bounds = sprt_bounds(alpha, beta) if sprt is not None else None
+
+    def decision() -> str | None:
+        if bounds is None:
+            return None
+        llr = sprt_llr(*stats, *sprt)
+        return 'H0' if llr <= bounds[0] else 'H1' if llr >= bounds[1] else None
+
+    def report(prefix: str):
+        elo, error = estimate_elo(*stats)
+        text = f'{prefix}{new_name} 胜 {stats[0]} 和 {stats[1]} 负 {stats[2]}  Elo {elo:+.1f} ±{error:.1f}'
+        if bounds is not None:
+            text += f'  LLR {sprt_llr(*stats, *sprt):+.2f} [{bounds[0]:.2f}, {bounds[1]:.2f}]'
+        log(text)
+
+    if sum(stats):
+        report(f'结果文件里已有 {sum(stats)} 局：')
+    verdict = decision()
+    if verdict is not None or len(done) >= games:
+        return stats, verdict
+
+    # 同一个开局的两局挨在一起，先后手的优势互相抵消，续跑时补上缺的轮次，保持每个开局两边各执一次白
+    tasks = [{
+        'round': index,
+        'opening': openings[index // 2 % len(openings)],
+        'white': engines[index % 2],
+        'black': engines[1 - index % 2],
+        'tc': tc,
+        'tt_mb': tt_mb,
+        'max_plies': max_plies,
+        'standard_rules': standard_rules,
+    } for index in range(games) if index not in done]
+    # 统一使用 spawn，和引擎工作进程一致
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(max(jobs, 1)) as pool, open(output, 'a', encoding = 'utf-8') as file:
+        for result in pool.imap_unordered(play_game, tasks):
+            # 一局一行，立即写入磁盘，中途打断也不会丢掉已经下完的对局
+            file.write(json.dumps(result, ensure_ascii = False) + '\n')
+            file.flush()
+            _tally(result, new_name, stats)
+            report(f'第 {result["round"] + 1} 局 {result["white"]} - {result["black"]} {result["result"]} '
+                   f'({result["reason"]}, {result["plies"]} 步)  ')
+            verdict = decision()
+            if verdict is not None:
+                # 结论已经出来，没下完的对局直接丢弃
+                pool.terminate()
+                break
+    return stats, verdict
+
+
+def _parse_engine(text: str) -> tuple[str, str]:
+    name, separator, path = text.partition('=')
+    if not separator or not name:
+        raise argparse.ArgumentTypeError(f'引擎应写成 名字=源码目录：{text}')
+    if not os.path.isdir(os.path.join(path or '.', 'common', 'engine')):
+        raise argparse.ArgumentTypeError(f'{path} 里没有 common/engine')
+    return name, path or '.'
+
+def _parse_time_control(text: str) -> tuple[float, float]:
+    try:
+        return parse_time_control(text)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error)) from None
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog = 'python -m common.bench.tournament', description = '自对弈锦标赛和 SPRT')
+    parser.add_argument('engines', type = _parse_engine, nargs = 2, metavar = '名字=源码目录',
+                        help = '两个引擎，第一个为新引擎')
+    parser.add_argument('-o', '--output', default = 'tournament.jsonl', help = '结果文件，每局追加一行 JSON，默认 tournament.jsonl')
+    parser.add_argument('-j', '--jobs', type = int, default = os.cpu_count() or 1, help = '同时下多少局，默认为 CPU 核心数')
+    parser.add_argument('-n', '--games', type = int, default = 20000, help = '最多下多少局，默认 20000')
+    parser.add_argument('--tc', type = _parse_time_control, default = (10.0, 0.1), help = '时间控制，基础时间+每步加秒，默认 10+0.1')
+    parser.add_argument('--openings', default = DEFAULT_OPENINGS, help = '开局集，每行一个 FEN 或一串走法')
+    parser.add_argument('--opening-plies', type = int, default = 8, help = '走法开局取前多少步，默认 8')
+    parser.add_argument('--max-plies', type = int, default = 400, help = '超过多少半回合判和，默认 400')
+    parser.add_argument('--tt-mb', type = int, default = 4, help = '每个引擎的置换表内存，默认 4')
+    parser.add_argument('--standard', action = 'store_true', help = '按标准规则下棋，将死获胜、逼和判和')
+    parser.add_argument('--sprt', type = float, nargs = 2, default = (0.0, 5.0), metavar = ('ELO0', 'ELO1'),
+                        help = 'SPRT 的两个假设，默认 0 5')
+    parser.add_argument('--no-sprt', action = 'store_true', help = '不做 SPRT，下满局数为止')
+    parser.add_argument('--alpha', type = float, default = 0.05, help = 'SPRT 的第一类错误率，默认 0.05')
+    parser.add_argument('--beta', type = float, default = 0.05, help = 'SPRT 的第二类错误率，默认 0.05')
+    args = parser.parse_args(argv)
+
+    openings = load_openings(args.openings, args.opening_plies) if args.openings else [START_FEN]
+    start_time = time.perf_counter()
+    stats, verdict = run_tournament(args.engines, openings, args.games, args.output, args.tc, args.jobs,
+                                    args.tt_mb, args.max_plies, args.standard,
+                                    None if args.no_sprt else tuple(args.sprt), args.alpha, args.beta)
+    seconds = time.perf_counter() - start_time
+    new_name = args.engines[0][0]
+    if verdict == 'H1':
+        print(f'SPRT 结论：{new_name} 更强')
+    elif verdict == 'H0':
+        print(f'SPRT 结论：{new_name} 没有变强')
+    else:
+        print('SPRT 没有结论')
+    print(f'用时 {seconds:.1f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,6 +6,7 @@
 import pygame
 from common.uiBase import UIBase
 from common import resources
+from common.engine.attacks import squares_of
 from typing import Literal
 
 
@@ -198,24 +199,19 @@ class BasicChess(UIBase):
                     self.show_outline = 'orange'
                     self.game_map.select_chess(self)
                 elif self.state == 'eaten':
+                    # 先生成走法，die 会重置地图块状态
+                    move = self.game_map.create_move(self.game_map.selected_chess, self.list_x, self.list_y)
                     # 注意顺序，die 一定要在 move 前
                     self.die()
                     self.game_map.selected_chess.move_to(self.list_x, self.list_y)
                     if self.chess_type == 'wang':
-                        self.game_map.game_over = True
                         color = {
                             'P1': '黑方',
                             'P2': '白方'
                         }
-                        from ..scene.gameScene import load_new_game
-                        self.game_map.create_choose_ui(
-                            f'{color[self.game_map.round_name]}获得胜利',
-                            {'重新开始': resources.ICON},
-                            lambda e:load_new_game(self.game_map.container),
-                            (140, 140),
-                        )
+                        self.game_map.end_game(f'{color[self.game_map.round_name]}获得胜利', self.game_map.round_name)
 
-                    self.game_map.change_round()
+                    self.game_map.finish_turn(move)
                 elif self.state == 'edge':
                     pass
 
@@ -230,6 +226,23 @@ class BasicChess(UIBase):
         """
         pass
 
+    def active_attack_blocks(self, attacks: int):
+        """
+        按攻击范围激活地图块，空格可走，敌方棋子可吃，己方棋子跳过
+        :param attacks: 攻击范围的位棋盘
+        :return:
+        """
+        map_data = self.game_map.map_data
+        for sq in squares_of(attacks):
+            dest_block = map_data[sq >> 3][sq & 7]
+            if dest_block.chess is None:
+                dest_block.display = True
+                self.game_map.active_block_set.add(dest_block)
+            # 如果该区域是敌方棋子
+            elif dest_block.chess.chess_name != self.chess_name:
+                self.game_map.change_chess_state(dest_block, 'eaten')
+                dest_block.chess.enabled_event = True
+
     def mouse_in_mask(self, mask):
         """
         判断鼠标是否在 mask 实例内，也就是是否发生碰撞
@@ -267,6 +280,22 @@ class BasicChess(UIBase):
         self.transition_move_to(dest_pos, duration = 0.3).then(self.finish_move)
         self.move_sound_effect.play()
 
+    def place_at(self, list_x: int, list_y: int):
+        """
+        不播放动画，直接把棋子摆到某个位置，只改棋子自身，地图数据由调用者维护
+        :param list_x: 列表坐标 x
+        :param list_y: 列表坐标 y
+        :return:
+        """
+        self.list_x = list_x
+        self.list_y = list_y
+        self.pos_x = list_x * self.block_size + 79
+        self.pos_y = list_y * self.block_size + 79
+        self.rect.x = self.pos_x
+        self.rect.y = self.pos_y
+        self.chess_img_outline_pos = (self.pos_x, self.pos_y)
+        self.chess_img_pos = (self.pos_x + self.offset_x, self.pos_y + self.offset_y)
+
     def finish_move(self):
         """
         棋子结束移动后的回调函数
@@ -287,5 +316,5 @@ class BasicChess(UIBase):
         # 删除原位置的棋子位置信息
         self.game_map.map_data[self.list_y][self.list_x].chess = None
         self.game_map.map_data[self.list_y][self.list_x].border = 'normal'
-        self.game_map.chess_dict[self.chess_name].remove(self)
+        self.game_map.chess_dict[self.chess_name].discard(self)
         self.close()
\ No newline at end of file
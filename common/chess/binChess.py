@@ -11,6 +11,9 @@ from .cheChess import CheChess
 from .maChess import MaChess
 from .xiangChess import XiangChess
 from common import resources
+from common.engine.position import (HOU, CHE, MA, XIANG, MOVE_PROMOTION, SIDE_NAMES,
+                                    encode_move, move_from, move_to, promotion_type)
+from common.engine.attacks import PAWN_ATTACK_SQUARES
 from typing import Literal
 
 chess_switch = {
@@ -19,6 +22,22 @@ chess_switch = {
     '马': MaChess,
     '象': XiangChess
 }
+# 升变对象对应局面模型里的棋子类型
+chess_switch_type = {
+    '皇后': HOU,
+    '车': CHE,
+    '马': MA,
+    '象': XIANG
+}
+# 局面模型里的升变类型对应的升变对象
+type_to_chess_name = {chess_type: name for name, chess_type in chess_switch_type.items()}
+# 局面模型里的升变类型对应的棋子类
+type_to_chess_switch = {
+    HOU: HouChess,
+    CHE: CheChess,
+    MA: MaChess,
+    XIANG: XiangChess
+}
 
 class BinChess(BasicChess):
 
@@ -32,6 +51,8 @@ class BinChess(BasicChess):
                  chess_name: Literal["P1", "P2"]
                  ):
         super().__init__(screen, x, y, size, game_map, "bin", chess_color, chess_name)
+        # 局面模型中的阵营下标，用来查攻击表
+        self.side = SIDE_NAMES.index(chess_name)
         # 记录开局是否移动过两步
         self.move_two_step = False
         # 记录是否移动过
@@ -42,37 +63,32 @@ class BinChess(BasicChess):
 
 
     def active_map_block(self):
+        map_data = self.game_map.map_data
         # 解释一下， (not self.have_moved) 作为“布尔值”可以隐性转换为 0 或 1，直接对应了[移动过走一格，没移动走两格]
         for num in range(1, 2 + ( not self.have_moved )):
             dest_y = self.list_y + self.toward * num
             # 抵达地图边缘
             if dest_y < 0 or dest_y > 7:
                 continue
-            toward_block = self.game_map.map_data[dest_y][self.list_x]
+            toward_block = map_data[dest_y][self.list_x]
             # 如果正前方没有棋子
             if not toward_block.chess:
                 toward_block.display = True
                 self.game_map.active_block_set.add(toward_block)
             else: break
 
-        for x in [1, -1]:
-            dest_y = self.list_y + self.toward
-            dest_x = self.list_x + x
-            if dest_y < 0 or dest_y > 7 or dest_x < 0 or dest_x > 7 :
-                continue
-            dest_block = self.game_map.map_data[dest_y][dest_x]
+        for sq in PAWN_ATTACK_SQUARES[self.side][self.list_y * 8 + self.list_x]:
+            dest_block = map_data[sq >> 3][sq & 7]
             # 如果该区域是敌方棋子
-            if dest_block.chess and dest_block.chess.chess_name != self.chess_name:
-                dest_block.chess.enabled_event = True
-                self.game_map.change_chess_state(dest_block, 'eaten')
-
-        # =========== 路过吃兵的代码 ================
-        for x in [1, -1]:
-            dest_x = self.list_x + x
-            if dest_x < 0 or dest_x > 7:
+            if dest_block.chess:
+                if dest_block.chess.chess_name != self.chess_name:
+                    dest_block.chess.enabled_event = True
+                    self.game_map.change_chess_state(dest_block, 'eaten')
                 continue
-            # 获取水平面上的左右格子
-            near_block = self.game_map.map_data[self.list_y][dest_x]
+
+            # =========== 路过吃兵的代码 ================
+            # 斜前方的空格子，对应水平面上同一列的格子
+            near_block = map_data[self.list_y][sq & 7]
             near_chess = near_block.chess
             if (near_chess and
                 near_chess.chess_type == "bin" and
@@ -80,14 +96,11 @@ class BinChess(BasicChess):
                 near_chess.move_two_step and
                 near_chess.move_step_num == 1
                 ):
-                # 获取可以吃的格子
-                dest_block = self.game_map.map_data[near_chess.list_y + self.toward][near_chess.list_x]
-                if dest_block.chess is None:
-                    dest_block.display = True
-                    dest_block.border = 'LuGuo'
-                    dest_block.switch_block = near_block
-                    self.game_map.active_block_set.add(dest_block)
-                    dest_block.change_render_index(63)
+                dest_block.display = True
+                dest_block.border = 'LuGuo'
+                dest_block.switch_block = near_block
+                self.game_map.active_block_set.add(dest_block)
+                dest_block.change_render_index(63)
 
 
     def move_to(self, list_x: int, list_y: int):
@@ -113,6 +126,10 @@ class BinChess(BasicChess):
             # 如果游戏结束则不判断，防止吃掉地方王之后就变异了
             if self.game_map.game_over:
                 return
+            # 电脑直接按搜索出的走法升变，不弹出选择 UI
+            if self.chess_name == self.game_map.ai_side:
+                self.become_chess(type_to_chess_name[promotion_type(self.game_map.promotion_move)])
+                return
             # 兵的升变
             self.state = 'edge'
             self.show_outline = 'green'
@@ -137,7 +154,16 @@ class BinChess(BasicChess):
         self.die()
         self.game_map.map_data[self.list_y][self.list_x].chess = new_chess
         self.game_map.container.children.insert(65, new_chess)
+        # insert 不会像 append 一样记录父节点，不补上的话升变出的棋子被吃后 close 删不掉它
+        new_chess.parent_node = self.game_map.container
         self.game_map.cancel_select_chess()
-        self.game_map.chess_dict[self.chess_name].append(new_chess)
+        self.game_map.chess_dict[self.chess_name].add(new_chess)
+        # 选择完升变对象后才同步局面并切换回合
+        move = self.game_map.promotion_move
+        self.game_map.promotion_move = None
+        self.game_map.push_move(encode_move(
+            move_from(move), move_to(move), MOVE_PROMOTION + chess_switch_type[chess_type] - MA
+        ))
+        self.game_map.change_round()
 
         
\ No newline at end of file
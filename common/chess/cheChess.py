@@ -5,6 +5,7 @@
 import pygame
 from .basicChess import BasicChess
 from common.gameMap import GameMap
+from common.engine.attacks import rook_attacks
 from typing import Literal
 
 
@@ -24,21 +25,6 @@ class CheChess(BasicChess):
 
 
     def active_map_block(self):
-        # 通用模板， 象、后、马、王通用计算函数，只需要略微修改就可以通用
-        for v in [-1, 1]:
-            for x, y in [[0, 1], [1, 0]]:
-                for index in range(1, 8):
-                    dest_y = self.list_y + y * v * index
-                    dest_x = self.list_x + x * v * index
-                    if dest_y < 0 or dest_y > 7 or dest_x < 0 or dest_x > 7:
-                        continue
-                    dest_block = self.game_map.map_data[dest_y][dest_x]
-                    if dest_block.chess is None:
-                        dest_block.display = True
-                        self.game_map.active_block_set.add(dest_block)
-                    else:
-                        # 如果该区域是敌方棋子
-                        if dest_block.chess.chess_name != self.chess_name:
-                            self.game_map.change_chess_state(dest_block, 'eaten')
-                            dest_block.chess.enabled_event = True
-                        break
\ No newline at end of file
+        # 车的攻击范围只需查一次表，遇到的第一个棋子已经包含在内
+        sq = self.list_y * 8 + self.list_x
+        self.active_attack_blocks(rook_attacks(sq, self.game_map.position.occupied))
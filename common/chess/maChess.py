@@ -5,6 +5,7 @@
 import pygame
 from .basicChess import BasicChess
 from common.gameMap import GameMap
+from common.engine.attacks import KNIGHT_SQUARES
 from typing import Literal
 
 
@@ -24,18 +25,15 @@ class MaChess(BasicChess):
 
 
     def active_map_block(self):
-        for v in [-1, 1]:
-            for x, y in [[2, 1], [1, 2], [-1, 2], [-2, 1]]:
-                dest_y = self.list_y + y * v
-                dest_x = self.list_x + x * v
-                if dest_y < 0 or dest_y > 7 or dest_x < 0 or dest_x > 7:
-                    continue
-                dest_block = self.game_map.map_data[dest_y][dest_x]
-                if dest_block.chess is None:
-                    dest_block.display = True
-                    self.game_map.active_block_set.add(dest_block)
-                else:
-                    # 如果该区域是敌方棋子
-                    if dest_block.chess.chess_name != self.chess_name:
-                        self.game_map.change_chess_state(dest_block, 'eaten')
-                        dest_block.chess.enabled_event = True
+        map_data = self.game_map.map_data
+        # 直接查预先算好的落点，不用每次都判断越界
+        for sq in KNIGHT_SQUARES[self.list_y * 8 + self.list_x]:
+            dest_block = map_data[sq >> 3][sq & 7]
+            if dest_block.chess is None:
+                dest_block.display = True
+                self.game_map.active_block_set.add(dest_block)
+            else:
+                # 如果该区域是敌方棋子
+                if dest_block.chess.chess_name != self.chess_name:
+                    self.game_map.change_chess_state(dest_block, 'eaten')
+                    dest_block.chess.enabled_event = True
@@ -5,6 +5,7 @@
 import pygame
 from .basicChess import BasicChess
 from common.gameMap import GameMap
+from common.engine.attacks import bishop_attacks
 from typing import Literal
 
 
@@ -24,20 +25,5 @@ class XiangChess(BasicChess):
 
 
     def active_map_block(self):
-        for v in [-1, 1]:
-            for x, y in [[1, 1], [-1, 1]]:
-                for index in range(1, 8):
-                    dest_y = self.list_y + y * v * index
-                    dest_x = self.list_x + x * v * index
-                    if dest_y < 0 or dest_y > 7 or dest_x < 0 or dest_x > 7:
-                        continue
-                    dest_block = self.game_map.map_data[dest_y][dest_x]
-                    if dest_block.chess is None:
-                        dest_block.display = True
-                        self.game_map.active_block_set.add(dest_block)
-                    else:
-                        # 如果该区域是敌方棋子
-                        if dest_block.chess.chess_name != self.chess_name:
-                            self.game_map.change_chess_state(dest_block, 'eaten')
-                            dest_block.chess.enabled_event = True
-                        break
\ No newline at end of file
+        sq = self.list_y * 8 + self.list_x
+        self.active_attack_blocks(bishop_attacks(sq, self.game_map.position.occupied))
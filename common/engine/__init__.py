@@ -0,0 +1,16 @@
+from .position import Position
+from .transposition import TranspositionTable
+from .movegen import generate_moves, generate_legal_moves
+from .evaluate import evaluate
+from .search import Searcher
+
+
+# 方便其他模块一次性导入
+__all__ = [
+    "Position",
+    "TranspositionTable",
+    "generate_moves",
+    "generate_legal_moves",
+    "evaluate",
+    "Searcher",
+]
@@ -0,0 +1,173 @@
+"""
+复盘分析：对局结束后把每个局面分给进程池搜索，按走完一步前后的分数差判定漏着和失误。
+局面之间互不依赖，各进程同时搜索，哪个局面先算完就先送回，前后两个局面都算完的那步棋立刻就能判定，
+界面上能看到分析的进度，不用等整盘棋算完。
+
+和引擎工作进程一样用 spawn 启动子进程，结果由后台线程收取后交给 on_result 回调
+"""
+
+import multiprocessing
+import threading
+from typing import Any, Callable, Sequence
+
+from .position import Position
+from .movegen import has_legal_move, in_check
+from .search import Searcher, MATE
+
+__all__ = [
+    "GameAnalysis", "classify_move", "BLUNDER_THRESHOLD", "MISTAKE_THRESHOLD",
+]
+
+# 走完一步后分数下降至少这么多算漏着
+BLUNDER_THRESHOLD = 300
+# 走完一步后分数下降至少这么多算失误
+MISTAKE_THRESHOLD = 100
+# 计算分差前把分数截断到这个范围，杀棋分之间的差距没有意义，比如三步杀和五步杀都是赢
+_SCORE_CAP = 1000
+# 每个局面的思考时间上限，防止个别复杂局面在指定深度下算太久，单位秒
+_POSITION_TIME_LIMIT = 10.0
+# 每个子进程的置换表大小，单位 MB
+_TT_MB = 16
+# 收取结果时每隔多久检查一次是否被叫停，单位秒
+_POLL_INTERVAL = 0.2
+
+# 子进程里的搜索器，同一个进程里的局面共用置换表
+_searcher: Searcher | None = None
+
+
+def _init_worker(tt_mb: int):
+    global _searcher
+    _searcher = Searcher(tt_mb, pawn_mb = 1)
+
+def _analyse_position(task: tuple[int, Position, int, bool]) -> tuple[int, int, int, int]:
+    """
+    子进程里搜索一个局面
+    :param task: (局面下标, 局面, 深度, 是否按标准规则)
+    :return: (局面下标, 最佳走法, 以走棋方视角的分数, 完成的深度)
+    """
+    index, position, depth, standard_rules = task
+    if position.king_square(position.side) == -1:
+        # 王已经被吃掉，对局在这里结束
+        return index, 0, -MATE, 0
+    if standard_rules and not has_legal_move(position):
+        return index, 0, -MATE if in_check(position) else 0, 0
+    move, score, finished_depth = _searcher.search(position, _POSITION_TIME_LIMIT, max_depth = depth,
+                                                   standard_rules = standard_rules)
+    return index, move, score, finished_depth
+
+
+def classify_move(score_before: int, score_after: int) -> tuple[int, str | None]:
+    """
+    按分数差判定一步棋
+    :param score_before: 走棋前的局面以走棋方视角的分数
+    :param score_after: 走棋后的局面以对方(也就是新的走棋方)视角的分数
+    :return: (损失的分数, '漏着' / '失误' / None)
+    """
+    before = max(-_SCORE_CAP, min(score_before, _SCORE_CAP))
+    after = -max(-_SCORE_CAP, min(score_after, _SCORE_CAP))
+    loss = max(before - after, 0)
+    if loss >= BLUNDER_THRESHOLD:
+        return loss, '漏着'
+    if loss >= MISTAKE_THRESHOLD:
+        return loss, '失误'
+    return loss, None
+
+
+class GameAnalysis:
+    """
+    一盘棋的复盘分析，start 之后立即返回，在后台线程里收取进程池的结果。
+    每算完一个局面调用一次 on_result，参数为
+    {"command": "progress", "tag", "finished": 算完的局面数, "total": 局面总数, "moves": 新判定的走法列表}，
+    全部算完后调用 {"command": "done", "tag", "moves": 按顺序排列的全部走法}。
+    走法为 {"ply": 第几个半回合(从 0 开始), "side": 走棋方, "move", "best_move", "loss", "label"}
+    """
+    def __init__(self, positions: Sequence[Position], moves: Sequence[int],
+                 on_result: Callable[[dict[str, Any]], None], depth: int = 6, workers: int | None = None,
+                 standard_rules: bool = False, tag: Any = None):
+        """
+        创建复盘分析
+        :param positions: 对局里依次出现的局面，比走法多一个，最后一个是终局
+        :param moves: 依次走的棋
+        :param on_result: 收到结果时调用，运行在后台线程里
+        :parameter depth: (可选) 每个局面的搜索深度
+        :parameter workers: (可选) 进程数，默认使用全部 CPU 核心，不会超过局面数
+        :parameter standard_rules: (可选) 是否按标准规则搜索
+        :parameter tag: (可选) 原样放进结果里，用来区分是哪一盘棋
+        """
+        if len(positions) != len(moves) + 1:
+            raise ValueError('局面数必须比走法数多一个')
+        self.positions = [position.copy() for position in positions]
+        self.moves = list(moves)
+        self.on_result = on_result
+        self.depth = depth
+        self.workers = max(1, min(workers or multiprocessing.cpu_count(), len(self.positions)))
+        self.standard_rules = standard_rules
+        self.tag = tag
+        # 每个局面的 (最佳走法, 分数)，还没算完时为 None
+        self.results: list[tuple[int, int] | None] = [None] * len(self.positions)
+        self.stopped = False
+        self.thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """
+        开始分析，已经开始过时什么也不做
+        :return:
+        """
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target = self._run, name = "GameAnalysis", daemon = True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        叫停分析，后台线程会关闭进程池，之后不再调用 on_result
+        :return:
+        """
+        self.stopped = True
+
+    def _judge(self, ply: int) -> dict[str, Any]:
+        best_move, score_before = self.results[ply]
+        score_after = self.results[ply + 1][1]
+        move = self.moves[ply]
+        # 走的就是搜索出的最佳走法时不算损失，前后两次搜索的深度不同，分数难免有出入
+        loss, label = (0, None) if move == best_move else classify_move(score_before, score_after)
+        return {
+            "ply": ply,
+            "side": self.positions[ply].side,
+            "move": move,
+            "best_move": best_move,
+            "loss": loss,
+            "label": label,
+        }
+
+    def _run(self):
+        tasks = [(index, position, self.depth, self.standard_rules) for index, position in enumerate(self.positions)]
+        context = multiprocessing.get_context("spawn")
+        finished = 0
+        with context.Pool(self.workers, initializer = _init_worker, initargs = (_TT_MB,)) as pool:
+            results = pool.imap_unordered(_analyse_position, tasks)
+            while finished < len(tasks):
+                try:
+                    index, move, score, _ = results.next(_POLL_INTERVAL)
+                except multiprocessing.TimeoutError:
+                    if self.stopped:
+                        break
+                    continue
+                if self.stopped:
+                    break
+                self.results[index] = move, score
+                finished += 1
+                # 这个局面和前一个、后一个局面组成的两步棋可能都能判定了
+                moves = [self._judge(ply) for ply in (index - 1, index)
+                         if 0 <= ply < len(self.moves) and self.results[ply] is not None
+                         and self.results[ply + 1] is not None]
+                self.on_result({"command": "progress", "tag": self.tag, "finished": finished,
+                                "total": len(tasks), "moves": moves})
+            # 离开 with 时进程池被 terminate，叫停时不用等剩下的局面
+        if not self.stopped:
+            self.on_result({"command": "done", "tag": self.tag,
+                            "moves": [self._judge(ply) for ply in range(len(self.moves))]})
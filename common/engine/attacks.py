@@ -0,0 +1,208 @@
+"""
+预先计算好的攻击表，模块导入时只生成一次
+"""
+
+from .position import TOWARD
+
+__all__ = [
+    "KNIGHT_ATTACKS", "KNIGHT_SQUARES",
+    "KING_ATTACKS", "KING_SQUARES",
+    "PAWN_ATTACKS", "PAWN_ATTACK_SQUARES",
+    "ROOK_MASKS", "ROOK_TABLES", "BISHOP_MASKS", "BISHOP_TABLES",
+    "rook_attacks", "bishop_attacks", "queen_attacks",
+    "BETWEEN", "LINE",
+    "squares_of",
+]
+
+
+def squares_of(bitboard: int) -> list[int]:
+    """
+    把位棋盘拆成格子列表
+    :param bitboard: 位棋盘
+    :return: 从小到大排列的格子
+    """
+    squares = []
+    while bitboard:
+        low_bit = bitboard & -bitboard
+        squares.append(low_bit.bit_length() - 1)
+        bitboard ^= low_bit
+    return squares
+
+def _create_leaper_table(offsets: list[tuple[int, int]]) -> tuple[list[int], list[tuple[int, ...]]]:
+    """
+    生成跳跃类走法的攻击表
+    :param offsets: (x, y) 偏移量列表
+    :return: 每个格子对应的位棋盘列表，以及每个格子对应的目标格子元组列表
+    """
+    bitboards = []
+    squares = []
+    for sq in range(64):
+        list_x = sq & 7
+        list_y = sq >> 3
+        targets = []
+        for x, y in offsets:
+            dest_x = list_x + x
+            dest_y = list_y + y
+            if 0 <= dest_x <= 7 and 0 <= dest_y <= 7:
+                targets.append(dest_y * 8 + dest_x)
+        squares.append(tuple(targets))
+        bitboard = 0
+        for target in targets:
+            bitboard |= 1 << target
+        bitboards.append(bitboard)
+    return bitboards, squares
+
+
+# 马
+KNIGHT_ATTACKS, KNIGHT_SQUARES = _create_leaper_table(
+    [(2, 1), (1, 2), (-1, 2), (-2, 1), (-2, -1), (-1, -2), (1, -2), (2, -1)]
+)
+# 王，不包含王车易位
+KING_ATTACKS, KING_SQUARES = _create_leaper_table(
+    [(1, 1), (-1, 1), (0, 1), (1, 0), (-1, -1), (1, -1), (0, -1), (-1, 0)]
+)
+# 兵的斜吃，按局面的 side 区分方向
+PAWN_ATTACKS: tuple[list[int], list[int]]
+PAWN_ATTACK_SQUARES: tuple[list[tuple[int, ...]], list[tuple[int, ...]]]
+_pawn_tables = [_create_leaper_table([(1, toward), (-1, toward)]) for toward in TOWARD]
+PAWN_ATTACKS = (_pawn_tables[0][0], _pawn_tables[1][0])
+PAWN_ATTACK_SQUARES = (_pawn_tables[0][1], _pawn_tables[1][1])
+del _pawn_tables
+
+
+def _create_slider_table(directions: list[tuple[int, int]]) -> tuple[list[int], list[dict[int, int]]]:
+    """
+    生成滑动类棋子的攻击表。
+    每个格子只保留射线上真正会挡路的格子(不含棋盘边缘)作为掩码，
+    用 "占位 & 掩码" 直接当作字典的键，相当于 PEXT 取出相关占位后查表，一次查询就能得到攻击范围
+    :param directions: (x, y) 方向列表
+    :return: 每个格子的掩码列表，以及每个格子的 {相关占位: 攻击范围} 字典列表
+    """
+    masks = []
+    tables = []
+    for sq in range(64):
+        list_x = sq & 7
+        list_y = sq >> 3
+        # 每条射线：(射线上所有格子, 射线方向上格子编号是否递增, 每个格子往后的射线)
+        rays = []
+        mask = 0
+        for x, y in directions:
+            ray_squares = []
+            dest_x = list_x + x
+            dest_y = list_y + y
+            while 0 <= dest_x <= 7 and 0 <= dest_y <= 7:
+                ray_squares.append(dest_y * 8 + dest_x)
+                dest_x += x
+                dest_y += y
+            if not ray_squares:
+                continue
+            ray = 0
+            for target in ray_squares:
+                ray |= 1 << target
+            # 被某个格子挡住后，这个格子后面的射线都到不了
+            behind = {}
+            for index, target in enumerate(ray_squares):
+                behind_ray = 0
+                for behind_target in ray_squares[index + 1:]:
+                    behind_ray |= 1 << behind_target
+                behind[target] = behind_ray
+            rays.append((ray, y * 8 + x > 0, behind))
+            # 最后一格不管有没有棋子都能到达，不需要放进掩码
+            mask |= ray ^ (1 << ray_squares[-1])
+
+        # 相同的攻击范围共用同一个整数对象，节省内存
+        shared = {}
+        table = {}
+        # 枚举掩码的所有子集
+        subset = 0
+        while True:
+            attacks = 0
+            for ray, increasing, behind in rays:
+                blockers = ray & subset
+                if blockers:
+                    if increasing:
+                        blocker = (blockers & -blockers).bit_length() - 1
+                    else:
+                        blocker = blockers.bit_length() - 1
+                    attacks |= ray ^ behind[blocker]
+                else:
+                    attacks |= ray
+            table[subset] = shared.setdefault(attacks, attacks)
+            subset = (subset - mask) & mask
+            if not subset:
+                break
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+
+# 车
+ROOK_MASKS, ROOK_TABLES = _create_slider_table([(1, 0), (-1, 0), (0, 1), (0, -1)])
+# 象
+BISHOP_MASKS, BISHOP_TABLES = _create_slider_table([(1, 1), (-1, 1), (1, -1), (-1, -1)])
+
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    """
+    车的攻击范围，包含挡路的第一个棋子所在格
+    :param sq: 所在格子
+    :param occupied: 全盘占位
+    :return: 位棋盘
+    """
+    return ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]]
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    """
+    象的攻击范围，包含挡路的第一个棋子所在格
+    :param sq: 所在格子
+    :param occupied: 全盘占位
+    :return: 位棋盘
+    """
+    return BISHOP_TABLES[sq][occupied & BISHOP_MASKS[sq]]
+
+def queen_attacks(sq: int, occupied: int) -> int:
+    """
+    后的攻击范围，就是车和象的并集
+    :param sq: 所在格子
+    :param occupied: 全盘占位
+    :return: 位棋盘
+    """
+    return ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]] | BISHOP_TABLES[sq][occupied & BISHOP_MASKS[sq]]
+
+
+def _create_line_tables() -> tuple[list[list[int]], list[list[int]]]:
+    """
+    生成两个格子之间的连线表，不在同一直线或斜线上时为 0
+    :return: (两格之间不含两端的格子, 穿过两格的整条线) 两张 [格子][格子] 的表
+    """
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        list_x = sq & 7
+        list_y = sq >> 3
+        for x, y in [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)]:
+            # 整条线由正反两个方向的射线加上自身组成
+            full_line = 1 << sq
+            for direction in (1, -1):
+                dest_x = list_x + x * direction
+                dest_y = list_y + y * direction
+                while 0 <= dest_x <= 7 and 0 <= dest_y <= 7:
+                    full_line |= 1 << dest_y * 8 + dest_x
+                    dest_x += x * direction
+                    dest_y += y * direction
+            ray = 0
+            dest_x = list_x + x
+            dest_y = list_y + y
+            while 0 <= dest_x <= 7 and 0 <= dest_y <= 7:
+                target = dest_y * 8 + dest_x
+                between[sq][target] = ray
+                line[sq][target] = full_line
+                ray |= 1 << target
+                dest_x += x
+                dest_y += y
+    return between, line
+
+
+# 两格之间的格子，用来计算挡将的位置
+# 穿过两格的整条线，用来限制被牵制的棋子只能沿牵制线移动
+BETWEEN, LINE = _create_line_tables()
@@ -0,0 +1,195 @@
+"""
+用 NumPy 批量评估局面：局面转成 12×64 的占位张量，子力和位置分是张量和权重的点积，
+兵型和机动性把张量压成 64 位整数后用整盘的位运算一次算完，适合从对局记录里一次评估成千上万个局面。
+分数和 evaluate 使用同一套子力价值、位置分表和兵型分，不开启机动性时两者的结果完全一致。
+
+这个模块依赖 numpy，只有分析和训练脚本会用到，游戏本身不导入它
+"""
+
+from typing import Sequence
+
+import numpy as np
+
+from .position import Position, BIN, MA, XIANG, CHE, HOU
+from .evaluate import PIECE_VALUES, PIECE_SQUARE_TABLES, PIECE_SQUARE_TABLES_ENDGAME, ENDGAME_MATERIAL
+from .pawns import (DOUBLED_PAWN_PENALTY, ISOLATED_PAWN_PENALTY, PASSED_PAWN_BONUS, FILE_MASKS, ADJACENT_FILE_MASKS,
+                    PASSED_PAWN_MASKS, promotion_distance)
+
+__all__ = [
+    "MOBILITY_WEIGHTS",
+    "position_tensor", "positions_tensor",
+    "evaluate_tensor", "evaluate_batch",
+]
+
+# 每多一个可以走到的格子加的分，下标为棋子类型，兵和王不计机动性
+MOBILITY_WEIGHTS = (0, 4, 3, 2, 1, 0)
+
+# 位置分表展开成 768 维的权重，和展开后的张量做点积就是子力加位置分(以 P2 视角)，两列依次为中局和残局
+_WEIGHTS = np.array([PIECE_SQUARE_TABLES[:12], PIECE_SQUARE_TABLES_ENDGAME[:12]], dtype = np.int32).reshape(2, 768).T
+# 每种棋子计入残局判断的子力，兵和王不计
+_PHASE_VALUES = np.array([PIECE_VALUES[chess_type] if chess_type in (MA, XIANG, CHE, HOU) else 0
+                          for _ in range(2) for chess_type in range(6)], dtype = np.int32)
+# 位棋盘平移时防止跨行回绕的掩码
+_NOT_FILE_A = np.uint64(0xFEFEFEFEFEFEFEFE)
+_NOT_FILE_H = np.uint64(0x7F7F7F7F7F7F7F7F)
+_NOT_FILE_AB = np.uint64(0xFCFCFCFCFCFCFCFC)
+_NOT_FILE_GH = np.uint64(0x3F3F3F3F3F3F3F3F)
+_ALL = np.uint64(0xFFFFFFFFFFFFFFFF)
+# 方向：(格子编号的变化量, 平移后要保留的格子)，格子编号为 y * 8 + x
+_BISHOP_DIRECTIONS = ((9, _NOT_FILE_A), (7, _NOT_FILE_H), (-7, _NOT_FILE_A), (-9, _NOT_FILE_H))
+_ROOK_DIRECTIONS = ((8, _ALL), (-8, _ALL), (1, _NOT_FILE_A), (-1, _NOT_FILE_H))
+_KNIGHT_DIRECTIONS = ((17, _NOT_FILE_A), (15, _NOT_FILE_H), (10, _NOT_FILE_AB), (6, _NOT_FILE_GH),
+                      (-6, _NOT_FILE_AB), (-10, _NOT_FILE_GH), (-15, _NOT_FILE_A), (-17, _NOT_FILE_H))
+
+
+def position_tensor(position: Position) -> np.ndarray:
+    """
+    把局面转成占位张量
+    :param position: 局面
+    :return: 形状为 (12, 64) 的 bool 数组，[棋子编号][格子] 为 True 表示有这个棋子
+    """
+    return positions_tensor([position])[0]
+
+def positions_tensor(positions: Sequence[Position]) -> np.ndarray:
+    """
+    把多个局面转成占位张量
+    :param positions: 局面序列
+    :return: 形状为 (N, 12, 64) 的 bool 数组
+    """
+    boards = np.array([position.board for position in positions], dtype = np.int8).reshape(-1, 64)
+    # 空格的编号是 12，和任何一个棋子编号都不相等
+    return boards[:, None, :] == np.arange(12, dtype = np.int8)[None, :, None]
+
+
+def _shift(bitboards: np.ndarray, delta: int) -> np.ndarray:
+    """
+    位棋盘整体平移，格子编号增加 delta
+    """
+    return bitboards << np.uint64(delta) if delta > 0 else bitboards >> np.uint64(-delta)
+
+def _popcount(bitboards: np.ndarray) -> np.ndarray:
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bitboards).astype(np.int32)
+    # numpy 2.0 以前没有 bitwise_count，按字节查表
+    return _POPCOUNT_TABLE[bitboards.view(np.uint8)].reshape(len(bitboards), 8).sum(axis = 1, dtype = np.int32)
+
+_POPCOUNT_TABLE = np.array([bin(byte).count('1') for byte in range(256)], dtype = np.int32)
+
+def _slider_mobility(pieces: np.ndarray, empty: np.ndarray, targets: np.ndarray,
+                     directions: tuple[tuple[int, np.uint64], ...]) -> np.ndarray:
+    """
+    统计滑动棋子能走到的格子数。
+    每个方向用 Kogge-Stone 填充一次求出整条射线，同一个方向上射线碰到第一个棋子就停，
+    所以一个格子最多被一个棋子从这个方向看到，逐方向累加就是逐个棋子的总和
+    :param pieces: (N,) 滑动棋子的位棋盘
+    :param empty: (N,) 空格的位棋盘
+    :param targets: (N,) 可以走到的格子，也就是非己方棋子
+    :param directions: 方向
+    :return: (N,) 格子数
+    """
+    mobility = np.zeros(len(pieces), dtype = np.int32)
+    for delta, keep in directions:
+        ray = pieces
+        passable = empty & keep
+        ray = ray | passable & _shift(ray, delta)
+        passable = passable & _shift(passable, delta)
+        ray = ray | passable & _shift(ray, delta * 2)
+        passable = passable & _shift(passable, delta * 2)
+        ray = ray | passable & _shift(ray, delta * 4)
+        mobility += _popcount(_shift(ray, delta) & keep & targets)
+    return mobility
+
+def _bitboards(tensor: np.ndarray) -> np.ndarray:
+    """
+    每个棋子编号的 64 个格子压成一个 64 位整数，之后的运算都是对 N 个整数做的
+    :param tensor: (N, 12, 64) 占位张量
+    :return: (N, 12) uint64 数组
+    """
+    return np.packbits(tensor, axis = 2, bitorder = 'little').view('<u8')[:, :, 0]
+
+def _pawn_structure(bitboards: np.ndarray, endgame: np.ndarray) -> np.ndarray:
+    """
+    双方的兵型分，和 pawn_structure 以及 evaluate 里残局通路兵的加分一致
+    :param bitboards: (N, 12) 位棋盘
+    :param endgame: (N,) 是否为残局
+    :return: (N,) 以 P2 视角的分数
+    """
+    score = np.zeros(len(bitboards), dtype = np.int32)
+    # 残局里通路兵的分加两次
+    passed_scale = np.where(endgame, 2, 1).astype(np.int32)
+    for side in range(2):
+        own = bitboards[:, side * 6 + BIN]
+        enemy = bitboards[:, (side ^ 1) * 6 + BIN]
+        side_score = np.zeros(len(bitboards), dtype = np.int32)
+        for x in range(8):
+            count = _popcount(own & np.uint64(FILE_MASKS[x]))
+            side_score -= DOUBLED_PAWN_PENALTY * np.maximum(count - 1, 0)
+            isolated = (own & np.uint64(ADJACENT_FILE_MASKS[x])) == 0
+            side_score -= ISOLATED_PAWN_PENALTY * count * isolated
+        for sq in range(8, 56):
+            is_pawn = (own >> np.uint64(sq) & np.uint64(1)).astype(bool)
+            if not is_pawn.any():
+                continue
+            passed = is_pawn & ((enemy & np.uint64(PASSED_PAWN_MASKS[side][sq])) == 0)
+            side_score += passed * passed_scale * PASSED_PAWN_BONUS[promotion_distance(side, sq)]
+        score += side_score if side else -side_score
+    return score
+
+def _mobility(bitboards: np.ndarray) -> np.ndarray:
+    """
+    双方的机动性分
+    :param bitboards: (N, 12) 位棋盘
+    :return: (N,) 以 P2 视角的分数
+    """
+    occupancy = (np.bitwise_or.reduce(bitboards[:, :6], axis = 1), np.bitwise_or.reduce(bitboards[:, 6:], axis = 1))
+    empty = ~(occupancy[0] | occupancy[1])
+    score = np.zeros(len(bitboards), dtype = np.int32)
+    for side in range(2):
+        base = side * 6
+        targets = ~occupancy[side]
+        # 马：每个方向的平移是一一对应的，逐方向累加就是每个马能跳到的格子数之和
+        knights = bitboards[:, base + MA]
+        mobility = np.zeros(len(bitboards), dtype = np.int32)
+        for delta, keep in _KNIGHT_DIRECTIONS:
+            mobility += _popcount(_shift(knights, delta) & keep & targets)
+        mobility *= MOBILITY_WEIGHTS[MA]
+        for chess_type in (XIANG, CHE, HOU):
+            pieces = bitboards[:, base + chess_type]
+            if not pieces.any():
+                continue
+            if chess_type != CHE:
+                mobility += MOBILITY_WEIGHTS[chess_type] * _slider_mobility(pieces, empty, targets, _BISHOP_DIRECTIONS)
+            if chess_type != XIANG:
+                mobility += MOBILITY_WEIGHTS[chess_type] * _slider_mobility(pieces, empty, targets, _ROOK_DIRECTIONS)
+        score += mobility if side else -mobility
+    return score
+
+
+def evaluate_tensor(tensor: np.ndarray, sides: np.ndarray, mobility: bool = True) -> np.ndarray:
+    """
+    评估已经转换好的占位张量
+    :param tensor: (N, 12, 64) 占位张量
+    :param sides: (N,) 走棋方，0 为 P1，1 为 P2
+    :parameter mobility: (可选) 是否计入机动性，关闭时和 evaluate 的结果一致
+    :return: (N,) 以各自走棋方视角的分数
+    """
+    scores = tensor.reshape(len(tensor), 768).astype(np.int32) @ _WEIGHTS
+    # 双方除兵和王以外的子力，决定用中局还是残局的位置分
+    material = tensor.sum(axis = 2, dtype = np.int32) @ _PHASE_VALUES
+    endgame = material <= ENDGAME_MATERIAL
+    score = np.where(endgame, scores[:, 1], scores[:, 0])
+    bitboards = _bitboards(tensor)
+    score += _pawn_structure(bitboards, endgame)
+    if mobility:
+        score += _mobility(bitboards)
+    return np.where(np.asarray(sides) == 1, score, -score)
+
+def evaluate_batch(positions: Sequence[Position], mobility: bool = True) -> np.ndarray:
+    """
+    一次评估多个局面
+    :param positions: 局面序列
+    :parameter mobility: (可选) 是否计入机动性，关闭时和 evaluate 的结果一致
+    :return: (N,) 以各自走棋方视角的分数
+    """
+    sides = np.array([position.side for position in positions], dtype = np.int8)
+    return evaluate_tensor(positions_tensor(positions), sides, mobility)
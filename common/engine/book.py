@@ -0,0 +1,171 @@
+"""
+开局库：仿照 Polyglot 的二进制格式，每条记录 16 字节 (局面哈希, 走法, 权重, 保留)，按哈希从小到大排好序。
+读取时用 mmap 映射整个文件，按哈希二分查找，启动时不解析也不加载文件，只有查找时碰到的页才会被读进内存。
+哈希使用本项目的 Zobrist 哈希，和 Polyglot 官方的开局库不通用
+
+生成开局库：
+    python -m common.engine.book resource/book/openings.txt -o resource/book/book.bin
+棋谱文件每行一局，走法用起点终点记号(和 move_name 一致)以空格分隔，比如 e2e4 e7e5 g1f3，
+# 开头的行是注释，遇到不合法的走法时这一局后面的走法全部忽略
+"""
+
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+from typing import Iterable
+
+from .position import Position, move_name
+from .movegen import generate_legal_moves
+
+__all__ = [
+    "OpeningBook", "build_book", "read_games",
+]
+
+# 记录格式：哈希(8) 走法(2) 权重(2) 保留(4)，大端序，这样按字节排序和按数值排序一致
+_RECORD = struct.Struct('>QHHI')
+RECORD_SIZE = _RECORD.size
+# 权重占 2 字节
+_MAX_WEIGHT = 0xFFFF
+
+
+class OpeningBook:
+    """
+    只读的开局库，文件不存在时视为空库
+    """
+    def __init__(self, path: str):
+        """
+        打开开局库
+        :param path: 开局库文件路径
+        """
+        self.path = path
+        self.data: mmap.mmap | None = None
+        self.count = 0
+        if os.path.isfile(path) and os.path.getsize(path) >= RECORD_SIZE:
+            with open(path, 'rb') as file:
+                # 关闭文件对象后映射依旧有效
+                self.data = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+            self.count = len(self.data) // RECORD_SIZE
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _key_at(self, index: int) -> int:
+        return _RECORD.unpack_from(self.data, index * RECORD_SIZE)[0]
+
+    def probe(self, key: int) -> list[tuple[int, int]]:
+        """
+        查询局面的所有开局走法
+        :param key: 局面的 Zobrist 哈希
+        :return: [(走法, 权重)]，没有记录时为空列表
+        """
+        # 二分查找第一条哈希不小于 key 的记录
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.count:
+            entry_key, move, weight, _ = _RECORD.unpack_from(self.data, low * RECORD_SIZE)
+            if entry_key != key:
+                break
+            entries.append((move, weight))
+            low += 1
+        return entries
+
+    def choose(self, position: Position, best: bool = False, rng: random.Random | None = None) -> int:
+        """
+        从开局库里选一步棋，走法会先和合法走法核对，哈希碰撞不会走出错误的棋
+        :param position: 局面
+        :parameter best: (可选) 为 True 时选权重最大的走法，否则按权重随机选
+        :parameter rng: (可选) 随机数生成器
+        :return: 走法整数，库里没有这个局面时返回 0
+        """
+        if not self.count:
+            return 0
+        entries = self.probe(position.hash)
+        if not entries:
+            return 0
+        legal_moves = set(generate_legal_moves(position))
+        entries = [(move, weight) for move, weight in entries if move in legal_moves and weight > 0]
+        if not entries:
+            return 0
+        if best:
+            return max(entries, key = lambda entry: entry[1])[0]
+        moves, weights = zip(*entries)
+        return (rng or random).choices(moves, weights)[0]
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+            self.count = 0
+
+
+def read_games(path: str) -> Iterable[list[str]]:
+    """
+    逐行读取棋谱文件
+    :param path: 棋谱文件路径
+    :return: 每一局的走法记号列表
+    """
+    with open(path, 'r', encoding = 'utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line.split()
+
+def build_book(games: Iterable[Iterable[str]], path: str, max_ply: int = 20, start: Position | None = None) -> int:
+    """
+    统计棋谱里每个局面下每步棋出现的次数，写成开局库
+    :param games: 每一局的走法记号
+    :param path: 输出文件路径
+    :parameter max_ply: (可选) 每局只收录前多少步
+    :parameter start: (可选) 起始局面，默认为标准开局
+    :return: 写入的记录数
+    """
+    counts: dict[tuple[int, int], int] = {}
+    for game in games:
+        position = start.copy() if start is not None else Position.start()
+        for ply, name in enumerate(game):
+            if ply >= max_ply:
+                break
+            moves = {move_name(move): move for move in generate_legal_moves(position)}
+            move = moves.get(name)
+            if move is None:
+                break
+            counts[position.hash, move] = counts.get((position.hash, move), 0) + 1
+            position.make_move(move)
+
+    records = sorted(counts.items())
+    # 权重按最常见的走法缩放到 2 字节以内
+    scale = max((count for _, count in records), default = 1) / _MAX_WEIGHT
+    with open(path, 'wb') as file:
+        for (key, move), count in records:
+            weight = count if scale <= 1 else max(1, int(count / scale))
+            file.write(_RECORD.pack(key, move, weight, 0))
+    return len(records)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog = 'python -m common.engine.book', description = '从棋谱生成开局库')
+    parser.add_argument('games', nargs = '+', help = '棋谱文件，每行一局')
+    parser.add_argument('-o', '--output', required = True, help = '输出的开局库文件')
+    parser.add_argument('--max-ply', type = int, default = 20, help = '每局只收录前多少步，默认 20')
+    args = parser.parse_args(argv)
+
+    def all_games():
+        for path in args.games:
+            yield from read_games(path)
+
+    count = build_book(all_games(), args.output, args.max_ply)
+    print(f'写入 {count} 条记录到 {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+局面评估，子力价值加上位置分和兵型，分数以兵 = 100 为单位
+"""
+
+from .position import Position, BIN, MA, XIANG, CHE, HOU, WANG
+from .pawns import PawnHashTable, pawn_structure, promotion_distance, PASSED_PAWN_BONUS
+
+__all__ = [
+    "PIECE_VALUES", "PIECE_SQUARE_TABLES", "PIECE_SQUARE_TABLES_ENDGAME", "ENDGAME_MATERIAL", "evaluate",
+]
+
+# 子力价值，王的价值只用来给吃王排序，评估时不计入
+PIECE_VALUES = (100, 320, 330, 500, 900, 20000)
+
+# 位置分表，按白方(P2)视角书写，第一行是第 8 行，和格子编号的顺序一致；黑方(P1)上下翻转后使用
+_PAWN_TABLE = (
+     0,   0,   0,   0,   0,   0,   0,   0,
+    50,  50,  50,  50,  50,  50,  50,  50,
+    10,  10,  20,  30,  30,  20,  10,  10,
+     5,   5,  10,  25,  25,  10,   5,   5,
+     0,   0,   0,  20,  20,   0,   0,   0,
+     5,  -5, -10,   0,   0, -10,  -5,   5,
+     5,  10,  10, -20, -20,  10,  10,   5,
+     0,   0,   0,   0,   0,   0,   0,   0,
+)
+_KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+_BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+_ROOK_TABLE = (
+     0,   0,   0,   0,   0,   0,   0,   0,
+     5,  10,  10,  10,  10,  10,  10,   5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+     0,   0,   0,   5,   5,   0,   0,   0,
+)
+_QUEEN_TABLE = (
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+)
+# 王在中局要躲在底线，残局要走到中间
+_KING_TABLE = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20,
+)
+_KING_ENDGAME_TABLE = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+)
+
+
+def _create_piece_square_tables(king_table: tuple[int, ...]) -> list[list[int]]:
+    """
+    把子力价值和位置分合成一张表，P1 的分数取负，评估时直接累加
+    :param king_table: 王使用的位置分表
+    :return: 下标为 [棋子编号][格子] 的表，空格对应的第 13 行全为 0
+    """
+    tables = (_PAWN_TABLE, _KNIGHT_TABLE, _BISHOP_TABLE, _ROOK_TABLE, _QUEEN_TABLE, king_table)
+    result = []
+    for side in range(2):
+        for chess_type in range(6):
+            value = PIECE_VALUES[chess_type] if chess_type != WANG else 0
+            if side:
+                result.append([value + tables[chess_type][sq] for sq in range(64)])
+            else:
+                # 上下翻转：第 y 行对应第 7 - y 行
+                result.append([-value - tables[chess_type][sq ^ 56] for sq in range(64)])
+    result.append([0] * 64)
+    return result
+
+
+# 中局和残局两套表，下标为 [棋子编号][格子]，以 P2 视角计分
+PIECE_SQUARE_TABLES = _create_piece_square_tables(_KING_TABLE)
+PIECE_SQUARE_TABLES_ENDGAME = _create_piece_square_tables(_KING_ENDGAME_TABLE)
+# 双方除兵和王以外的子力总和低于这个值时视为残局
+ENDGAME_MATERIAL = 2 * (PIECE_VALUES[CHE] + PIECE_VALUES[MA])
+
+
+def evaluate(position: Position, pawn_table: PawnHashTable | None = None) -> int:
+    """
+    静态评估
+    :param position: 局面
+    :parameter pawn_table: (可选) 兵型表，搜索时传入，兵型相同的局面不再重新计算
+    :return: 以当前走棋方视角的分数，越大越好
+    """
+    bitboards = position.bitboards
+    material = 0
+    for chess_type in (MA, XIANG, CHE, HOU):
+        material += (bitboards[chess_type].bit_count() + bitboards[6 + chess_type].bit_count()) * PIECE_VALUES[chess_type]
+    endgame = material <= ENDGAME_MATERIAL
+    tables = PIECE_SQUARE_TABLES_ENDGAME if endgame else PIECE_SQUARE_TABLES
+    # 空格对应的表全为 0，不需要跳过
+    score = sum(tables[piece][sq] for sq, piece in enumerate(position.board))
+
+    if pawn_table is not None:
+        pawn_score, passed = pawn_table.probe(position)
+    else:
+        pawn_score, passed = pawn_structure((bitboards[BIN], bitboards[6 + BIN]))
+    score += pawn_score
+    # 残局里通路兵更值钱，再加一次通路兵的分
+    if endgame:
+        while passed:
+            low_bit = passed & -passed
+            passed ^= low_bit
+            sq = low_bit.bit_length() - 1
+            if bitboards[6 + BIN] & low_bit:
+                score += PASSED_PAWN_BONUS[promotion_distance(1, sq)]
+            else:
+                score -= PASSED_PAWN_BONUS[promotion_distance(0, sq)]
+    return score if position.side else -score
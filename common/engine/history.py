@@ -0,0 +1,112 @@
+"""
+对局历史：按顺序记录每个局面的哈希和半回合计数，用来判定三次重复局面和五十回合规则。
+吃子、兵走动(包括吃过路兵和升变)之后，之前的局面不可能再出现，半回合计数归零，
+所以判定重复时只需要往回看到上一次不可逆的走法为止，代价是 O(距离上次吃子或动兵的步数)，和对局长度无关
+"""
+
+from array import array
+
+from .position import Position, EMPTY
+
+__all__ = [
+    "PositionHistory", "is_irreversible", "FIFTY_MOVE_PLIES", "REPETITION_LIMIT",
+]
+
+# 五十回合规则：双方各走五十步，也就是一百个半回合
+FIFTY_MOVE_PLIES = 100
+# 同一局面出现三次判和
+REPETITION_LIMIT = 3
+
+
+def is_irreversible(position: Position, undo: tuple[int, int, int, int, int]) -> bool:
+    """
+    刚走完的一步是否不可逆：吃子或者兵走动。
+    兵走动时只包含兵的哈希一定会变，吃过路兵和升变也一样，不需要再解析走法。
+    王车移位不算，本项目的易位按王和车的几何位置判断，王和车走回原位后还能再易位
+    :param position: 走完这步棋之后的局面
+    :param undo: 这步棋的撤销记录
+    :return:
+    """
+    return undo[1] != EMPTY or undo[4] != position.pawn_hash
+
+
+class PositionHistory:
+    """
+    紧凑的局面历史，哈希和半回合计数分别放在 array 里，每个局面只占 10 字节。
+    数组记录的是整局的每个局面，吃子或动兵时不会截断，这样悔棋退过不可逆的走法之后还能接着判定，
+    只有判定重复时的扫描范围限制在上次不可逆的走法之后。
+    支持撤销，悔棋、复盘时和局面模型一起 pop 就行
+    """
+    def __init__(self, key: int, halfmove_clock: int = 0):
+        """
+        创建对局历史
+        :param key: 初始局面的哈希
+        :parameter halfmove_clock: (可选) 初始局面距离上次吃子或动兵的半回合数，从 FEN 导入时使用
+        """
+        self.keys = array('Q', [key])
+        self.clocks = array('H', [halfmove_clock])
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def key(self) -> int:
+        return self.keys[-1]
+
+    @property
+    def halfmove_clock(self) -> int:
+        return self.clocks[-1]
+
+    def push(self, key: int, irreversible: bool):
+        """
+        记录走完一步棋之后的局面
+        :param key: 新局面的哈希
+        :param irreversible: 这步棋是否吃子或动兵，见 is_irreversible
+        :return:
+        """
+        self.keys.append(key)
+        # 计数到 65535 就不再增加，反正早已超过五十回合
+        self.clocks.append(0 if irreversible else min(self.clocks[-1] + 1, 0xFFFF))
+
+    def pop(self):
+        """
+        撤销最后一步棋的记录，初始局面不会被撤销
+        :return:
+        """
+        if len(self.keys) > 1:
+            self.keys.pop()
+            self.clocks.pop()
+
+    def repetition_count(self) -> int:
+        """
+        当前局面一共出现过几次。
+        同一局面必须是同一方走棋，所以每次往回跳两个半回合，最多看到上一次不可逆的走法
+        :return: 出现次数，包括当前这次
+        """
+        keys = self.keys
+        key = keys[-1]
+        last = len(keys) - 1
+        # 不可逆的走法之后的第一个局面的下标，再往前的局面不可能和当前相同
+        first = max(last - self.clocks[-1], 0)
+        count = 1
+        for index in range(last - 2, first - 1, -2):
+            if keys[index] == key:
+                count += 1
+        return count
+
+    def is_threefold(self) -> bool:
+        return self.clocks[-1] >= 4 and self.repetition_count() >= REPETITION_LIMIT
+
+    def is_fifty_moves(self) -> bool:
+        return self.clocks[-1] >= FIFTY_MOVE_PLIES
+
+    def draw_reason(self) -> str | None:
+        """
+        当前局面是否按和棋规则判和
+        :return: 判和的原因，不判和时返回 None
+        """
+        if self.is_threefold():
+            return '三次重复局面'
+        if self.is_fifty_moves():
+            return '五十回合无吃子动兵'
+        return None
@@ -0,0 +1,332 @@
+"""
+走法生成，规则与 common.chess 里各棋子的 active_map_block 完全一致
+"""
+
+from .position import (Position, BIN, MA, XIANG, CHE, HOU, WANG, TOWARD, BACK_RANK_Y, PAWN_START_Y,
+                       MOVE_DOUBLE, MOVE_LUGUO, MOVE_WANGCHE, MOVE_PROMOTION)
+from .attacks import (KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, PAWN_ATTACK_SQUARES, ROOK_MASKS, ROOK_TABLES,
+                      BISHOP_MASKS, BISHOP_TABLES, BETWEEN, LINE)
+
+__all__ = [
+    "generate_moves", "generate_legal_moves", "generate_captures", "has_legal_move", "filter_legal",
+    "attackers_to", "checkers_of", "in_check",
+]
+
+# 升变走法的四种类型，依次为 马、象、车、后
+_PROMOTION_KINDS = tuple(MOVE_PROMOTION + n << 12 for n in range(4))
+# 升变为后的走法类型
+_PROMOTION_HOU = MOVE_PROMOTION + HOU - MA << 12
+
+
+def generate_moves(position: Position) -> list[int]:
+    """
+    生成当前走棋方的所有伪合法走法，不检查走完后王是否会被吃。
+    王已经被吃掉时游戏结束，不再有走法
+    :param position: 局面
+    :return: 走法整数列表
+    """
+    side = position.side
+    bitboards = position.bitboards
+    base = side * 6
+    if not bitboards[base + WANG]:
+        return []
+    own = position.occupancy[side]
+    enemy = position.occupancy[side ^ 1]
+    occupied = own | enemy
+    moves = []
+    append = moves.append
+
+    # ============ 兵 ============
+    forward = TOWARD[side] * 8
+    promotion_y = BACK_RANK_Y[side ^ 1]
+    start_y = PAWN_START_Y[side]
+    attack_squares = PAWN_ATTACK_SQUARES[side]
+    # 只有敌方的兵才能被吃过路兵
+    ep_pawns = position.ep_pawns & bitboards[(side ^ 1) * 6 + BIN]
+    pawns = bitboards[base + BIN]
+    while pawns:
+        low_bit = pawns & -pawns
+        pawns ^= low_bit
+        from_sq = low_bit.bit_length() - 1
+        to_sq = from_sq + forward
+        if not occupied >> to_sq & 1:
+            if to_sq >> 3 == promotion_y:
+                for kind in _PROMOTION_KINDS:
+                    append(from_sq | to_sq << 6 | kind)
+            else:
+                append(from_sq | to_sq << 6)
+                # 第一步可以走两格，中间和终点都不能有棋子
+                if from_sq >> 3 == start_y and not occupied >> to_sq + forward & 1:
+                    append(from_sq | to_sq + forward << 6 | MOVE_DOUBLE << 12)
+        for to_sq in attack_squares[from_sq]:
+            if enemy >> to_sq & 1:
+                if to_sq >> 3 == promotion_y:
+                    for kind in _PROMOTION_KINDS:
+                        append(from_sq | to_sq << 6 | kind)
+                else:
+                    append(from_sq | to_sq << 6)
+            # 斜前方是空格，且同一行相邻的是刚走过两格的敌方兵
+            elif not occupied >> to_sq & 1 and ep_pawns >> (from_sq & ~7 | to_sq & 7) & 1:
+                append(from_sq | to_sq << 6 | MOVE_LUGUO << 12)
+
+    not_own = ~own
+    # ============ 马 ============
+    pieces = bitboards[base + MA]
+    while pieces:
+        low_bit = pieces & -pieces
+        pieces ^= low_bit
+        from_sq = low_bit.bit_length() - 1
+        targets = KNIGHT_ATTACKS[from_sq] & not_own
+        while targets:
+            target_bit = targets & -targets
+            targets ^= target_bit
+            append(from_sq | target_bit.bit_length() - 1 << 6)
+
+    # ============ 象、车、后 ============
+    for chess_type in (XIANG, CHE, HOU):
+        pieces = bitboards[base + chess_type]
+        while pieces:
+            low_bit = pieces & -pieces
+            pieces ^= low_bit
+            from_sq = low_bit.bit_length() - 1
+            targets = 0
+            if chess_type != CHE:
+                targets = BISHOP_TABLES[from_sq][occupied & BISHOP_MASKS[from_sq]]
+            if chess_type != XIANG:
+                targets |= ROOK_TABLES[from_sq][occupied & ROOK_MASKS[from_sq]]
+            targets &= not_own
+            while targets:
+                target_bit = targets & -targets
+                targets ^= target_bit
+                append(from_sq | target_bit.bit_length() - 1 << 6)
+
+    # ============ 王 ============
+    from_sq = bitboards[base + WANG].bit_length() - 1
+    targets = KING_ATTACKS[from_sq] & not_own
+    # 王车易位只看几何位置：王在底线第 4 列且同一行第 1 列是己方车、中间两格为空，
+    # 或王在第 6 列且第 8 列是己方车、第 7 列为空，和 WangChess.active_map_block 一致
+    row = from_sq & ~7
+    if from_sq >> 3 == BACK_RANK_Y[side]:
+        castle_sq = -1
+        if from_sq & 7 == 3:
+            if position.board[row] == base + CHE and not occupied >> row + 1 & 3:
+                castle_sq = row + 2
+        elif from_sq & 7 == 5:
+            if position.board[row + 7] == base + CHE and not occupied >> row + 6 & 1:
+                castle_sq = row + 6
+        if castle_sq != -1:
+            targets &= ~(1 << castle_sq)
+            append(from_sq | castle_sq << 6 | MOVE_WANGCHE << 12)
+    while targets:
+        target_bit = targets & -targets
+        targets ^= target_bit
+        append(from_sq | target_bit.bit_length() - 1 << 6)
+
+    return moves
+
+
+def generate_captures(position: Position) -> list[int]:
+    """
+    只生成吃子、吃过路兵和升变为后的伪合法走法，给静态搜索使用
+    :param position: 局面
+    :return: 走法整数列表
+    """
+    side = position.side
+    bitboards = position.bitboards
+    base = side * 6
+    if not bitboards[base + WANG]:
+        return []
+    enemy = position.occupancy[side ^ 1]
+    occupied = position.occupied
+    moves = []
+    append = moves.append
+
+    # ============ 兵 ============
+    forward = TOWARD[side] * 8
+    promotion_y = BACK_RANK_Y[side ^ 1]
+    attack_squares = PAWN_ATTACK_SQUARES[side]
+    ep_pawns = position.ep_pawns & bitboards[(side ^ 1) * 6 + BIN]
+    pawns = bitboards[base + BIN]
+    while pawns:
+        low_bit = pawns & -pawns
+        pawns ^= low_bit
+        from_sq = low_bit.bit_length() - 1
+        to_sq = from_sq + forward
+        promotion = to_sq >> 3 == promotion_y
+        if promotion and not occupied >> to_sq & 1:
+            append(from_sq | to_sq << 6 | _PROMOTION_HOU)
+        for to_sq in attack_squares[from_sq]:
+            if enemy >> to_sq & 1:
+                append(from_sq | to_sq << 6 | (_PROMOTION_HOU if promotion else 0))
+            elif not occupied >> to_sq & 1 and ep_pawns >> (from_sq & ~7 | to_sq & 7) & 1:
+                append(from_sq | to_sq << 6 | MOVE_LUGUO << 12)
+
+    # ============ 马、象、车、后、王 ============
+    for chess_type in (MA, XIANG, CHE, HOU, WANG):
+        pieces = bitboards[base + chess_type]
+        while pieces:
+            low_bit = pieces & -pieces
+            pieces ^= low_bit
+            from_sq = low_bit.bit_length() - 1
+            if chess_type == MA:
+                targets = KNIGHT_ATTACKS[from_sq]
+            elif chess_type == WANG:
+                targets = KING_ATTACKS[from_sq]
+            else:
+                targets = 0
+                if chess_type != CHE:
+                    targets = BISHOP_TABLES[from_sq][occupied & BISHOP_MASKS[from_sq]]
+                if chess_type != XIANG:
+                    targets |= ROOK_TABLES[from_sq][occupied & ROOK_MASKS[from_sq]]
+            targets &= enemy
+            while targets:
+                target_bit = targets & -targets
+                targets ^= target_bit
+                append(from_sq | target_bit.bit_length() - 1 << 6)
+    return moves
+
+
+def attackers_to(position: Position, sq: int, side: int, occupied: int) -> int:
+    """
+    某一方能吃到某个格子的所有棋子
+    :param position: 局面
+    :param sq: 格子
+    :param side: 进攻方
+    :param occupied: 全盘占位，可以传入假设走完某步棋后的占位
+    :return: 进攻棋子的位棋盘
+    """
+    bitboards = position.bitboards
+    base = side * 6
+    queens = bitboards[base + HOU]
+    # 兵的攻击是对称的：能吃到 sq 的兵，正好站在 sq 反方向的斜吃格上
+    return (
+        KNIGHT_ATTACKS[sq] & bitboards[base + MA]
+        | KING_ATTACKS[sq] & bitboards[base + WANG]
+        | PAWN_ATTACKS[side ^ 1][sq] & bitboards[base + BIN]
+        | BISHOP_TABLES[sq][occupied & BISHOP_MASKS[sq]] & (bitboards[base + XIANG] | queens)
+        | ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]] & (bitboards[base + CHE] | queens)
+    ) & occupied
+
+def checkers_of(position: Position) -> int:
+    """
+    正在攻击当前走棋方王的敌方棋子
+    :param position: 局面
+    :return: 位棋盘，王已经被吃掉时为 0
+    """
+    king_sq = position.bitboards[position.side * 6 + WANG].bit_length() - 1
+    if king_sq == -1:
+        return 0
+    return attackers_to(position, king_sq, position.side ^ 1, position.occupied)
+
+def in_check(position: Position) -> bool:
+    return checkers_of(position) != 0
+
+def _pinned_lines(position: Position, king_sq: int) -> dict[int, int]:
+    """
+    找出被牵制的己方棋子
+    :param position: 局面
+    :param king_sq: 己方王的格子
+    :return: {被牵制棋子的格子: 它能移动的牵制线}
+    """
+    side = position.side
+    bitboards = position.bitboards
+    enemy_base = (side ^ 1) * 6
+    own = position.occupancy[side]
+    occupied = own | position.occupancy[side ^ 1]
+    queens = bitboards[enemy_base + HOU]
+    # 假设棋盘上只有敌方棋子时，能看到王的滑动棋子就是潜在的牵制者
+    enemy = position.occupancy[side ^ 1]
+    snipers = (
+        BISHOP_TABLES[king_sq][enemy & BISHOP_MASKS[king_sq]] & (bitboards[enemy_base + XIANG] | queens)
+        | ROOK_TABLES[king_sq][enemy & ROOK_MASKS[king_sq]] & (bitboards[enemy_base + CHE] | queens)
+    )
+    pinned = {}
+    while snipers:
+        low_bit = snipers & -snipers
+        snipers ^= low_bit
+        sniper_sq = low_bit.bit_length() - 1
+        blockers = BETWEEN[king_sq][sniper_sq] & occupied
+        # 中间只隔了一个己方棋子时，这个棋子被牵制
+        if blockers and not blockers & blockers - 1 and blockers & own:
+            pinned[blockers.bit_length() - 1] = LINE[king_sq][sniper_sq]
+    return pinned
+
+def generate_legal_moves(position: Position) -> list[int]:
+    """
+    生成当前走棋方的所有合法走法，也就是走完后己方王不会被吃的走法(王不能送吃)。
+    每个局面只计算一次将军和牵制，再用它们过滤伪合法走法，不需要逐步走棋再撤销
+    :param position: 局面
+    :return: 走法整数列表
+    """
+    return _filter_legal(position, generate_moves(position), False)
+
+def filter_legal(position: Position, moves: list[int]) -> list[int]:
+    """
+    从一部分伪合法走法里挑出合法走法，只关心少数几步(比如走到某一格的走法)时先筛选再判断，比生成全部合法走法快
+    :param position: 局面
+    :param moves: generate_moves 生成的伪合法走法的一部分
+    :return: 合法走法列表
+    """
+    return _filter_legal(position, moves, False)
+
+def has_legal_move(position: Position) -> bool:
+    """
+    当前走棋方是否还有合法走法，找到第一步就返回，用来判定将死和逼和
+    :param position: 局面
+    :return:
+    """
+    return bool(_filter_legal(position, generate_moves(position), True))
+
+def _filter_legal(position: Position, moves: list[int], first_only: bool) -> list[int]:
+    """
+    用将军和牵制过滤伪合法走法
+    :param position: 局面
+    :param moves: 伪合法走法
+    :param first_only: 为 True 时找到第一步合法走法就停下
+    :return: 合法走法列表
+    """
+    if not moves:
+        return moves
+    side = position.side
+    enemy_side = side ^ 1
+    king_sq = position.bitboards[side * 6 + WANG].bit_length() - 1
+    king_bit = 1 << king_sq
+    occupied = position.occupied
+    checkers = attackers_to(position, king_sq, enemy_side, occupied)
+    # 被将军时，其他棋子只能吃掉将军的棋子或者挡在中间；被双将时只能动王
+    if not checkers:
+        check_mask = ~0
+    elif checkers & checkers - 1:
+        check_mask = 0
+    else:
+        check_mask = checkers | BETWEEN[king_sq][checkers.bit_length() - 1]
+    pinned = _pinned_lines(position, king_sq)
+
+    legal_moves = []
+    append = legal_moves.append
+    for move in moves:
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+        kind = move >> 12
+        if from_sq == king_sq:
+            if kind == MOVE_WANGCHE:
+                # 车会移动到王原本的位置
+                rook_sq = to_sq & ~7 | (0 if to_sq & 7 < 4 else 7)
+                after = occupied ^ 1 << rook_sq ^ 1 << to_sq
+            else:
+                # 王离开原位后，原本被王挡住的射线也要算上
+                after = occupied ^ king_bit | 1 << to_sq
+            if attackers_to(position, to_sq, enemy_side, after) & ~(1 << to_sq):
+                continue
+        elif kind == MOVE_LUGUO:
+            # 吃过路兵会同时移走同一行的两个兵，直接按走完后的占位检查
+            ep_bit = 1 << (from_sq & ~7 | to_sq & 7)
+            after = occupied ^ 1 << from_sq ^ 1 << to_sq ^ ep_bit
+            if attackers_to(position, king_sq, enemy_side, after) & ~ep_bit:
+                continue
+        elif not check_mask >> to_sq & 1 or from_sq in pinned and not pinned[from_sq] >> to_sq & 1:
+            continue
+        append(move)
+        if first_only:
+            break
+    return legal_moves
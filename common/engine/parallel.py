@@ -0,0 +1,156 @@
+"""
+Lazy-SMP 并行搜索：主进程和若干辅助进程同时搜索同一个局面，共用一张放在 shared_memory 里的置换表。
+辅助进程的结果不直接使用，它们写进置换表的走法和分数让主进程更快地剪枝，
+这样搜索就不再被一个进程的 GIL 限制，同样的时间能搜得更深
+"""
+
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+from typing import Any, Callable
+
+from .position import Position
+from .search import Searcher, MAX_DEPTH
+from .transposition import TranspositionTable, table_bytes
+
+__all__ = [
+    "ParallelSearcher", "resolve_worker_count",
+]
+
+# 辅助进程不看时间，由主进程通过 stop_event 叫停
+_HELPER_TIME_LIMIT = float('inf')
+
+
+def resolve_worker_count(workers: int | None = None) -> int:
+    """
+    计算搜索进程数
+    :parameter workers: (可选) 进程数，默认读取配置文件里的 search_workers，小于 1 时使用全部 CPU 核心
+    :return: 至少为 1
+    """
+    if workers is None:
+        from common.config import get_config
+        workers = get_config("search_workers")
+    if workers < 1:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def _helper_main(index: int, shm_name: str, request_queue: multiprocessing.Queue,
+                 result_queue: multiprocessing.Queue, stop_event: Any, pawn_mb: float):
+    """
+    辅助进程的主循环
+    :param index: 辅助进程的序号，从 0 开始
+    :param shm_name: 共享置换表的名字
+    :param request_queue: 这个辅助进程专用的请求队列
+    :param result_queue: 所有辅助进程共用的结果队列
+    :param stop_event: 主进程搜索结束时被 set
+    :param pawn_mb: 兵型表占用的内存，每个进程各有一张
+    :return:
+    """
+    shm = shared_memory.SharedMemory(name = shm_name)
+    searcher = Searcher(tt = TranspositionTable(buffer = shm.buf), stop_event = stop_event, pawn_mb = pawn_mb)
+    # 一半的辅助进程从第 2 层开始迭代，和主进程错开深度，写进置换表的内容更多样
+    min_depth = 1 + (index + 1) % 2
+    while True:
+        request = request_queue.get()
+        command = request["command"]
+        if command == "quit":
+            break
+        elif command == "clear":
+            searcher.clear()
+            result_queue.put(0)
+        elif command == "go":
+            searcher.search(request["position"], _HELPER_TIME_LIMIT, MAX_DEPTH, min_depth = min_depth,
+                            standard_rules = request["standard_rules"])
+            result_queue.put(searcher.nodes)
+    # 先释放置换表的引用，否则共享内存无法关闭
+    del searcher
+    shm.close()
+
+
+class ParallelSearcher:
+    """
+    多进程的搜索器，用法和 Searcher 一样。
+    辅助进程在创建时启动，一直等待到 close，进程数为 1 时相当于单进程的 Searcher
+    """
+    def __init__(self, workers: int | None = None, tt_mb: int | None = None, stop_event: Any = None,
+                 pawn_mb: float | None = None):
+        """
+        创建共享置换表并启动辅助进程
+        :parameter workers: (可选) 搜索进程数(包括主进程)，默认读取配置文件里的 search_workers
+        :parameter tt_mb: (可选) 置换表占用的内存，默认读取配置文件里的 tt_mb
+        :parameter stop_event: (可选) 被 set 后主进程的搜索尽快结束，辅助进程随之停下
+        :parameter pawn_mb: (可选) 每个进程的兵型表占用的内存，默认读取配置文件里的 pawn_hash_mb
+        """
+        if tt_mb is None or pawn_mb is None:
+            from common.config import get_config
+            tt_mb = get_config("tt_mb") if tt_mb is None else tt_mb
+            pawn_mb = get_config("pawn_hash_mb") if pawn_mb is None else pawn_mb
+        self.workers = resolve_worker_count(workers)
+        self.shm = shared_memory.SharedMemory(create = True, size = table_bytes(tt_mb))
+        self.tt = TranspositionTable(buffer = self.shm.buf)
+        self.searcher = Searcher(tt = self.tt, stop_event = stop_event, pawn_mb = pawn_mb)
+        # 本次搜索所有进程的节点数之和
+        self.nodes = 0
+        context = multiprocessing.get_context("spawn")
+        self.stop_event = context.Event()
+        self.result_queue = context.Queue()
+        self.request_queues: list[multiprocessing.Queue] = []
+        self.helpers: list[multiprocessing.Process] = []
+        for index in range(self.workers - 1):
+            request_queue = context.Queue()
+            helper = context.Process(
+                target = _helper_main,
+                args = (index, self.shm.name, request_queue, self.result_queue, self.stop_event, pawn_mb),
+                name = f"SearchHelper-{index}",
+                daemon = True,
+            )
+            helper.start()
+            self.request_queues.append(request_queue)
+            self.helpers.append(helper)
+
+    def search(self, position: Position, time_limit: float = 1.0, max_depth: int = MAX_DEPTH,
+               on_iteration: Callable[[int, int, int, int], None] | None = None,
+               standard_rules: bool = False) -> tuple[int, int, int]:
+        """
+        并行搜索，参数和返回值与 Searcher.search 相同，结果只取自主进程
+        """
+        self.stop_event.clear()
+        for request_queue in self.request_queues:
+            request_queue.put({"command": "go", "position": position, "standard_rules": standard_rules})
+        try:
+            result = self.searcher.search(position, time_limit, max_depth, on_iteration,
+                                          standard_rules = standard_rules)
+        finally:
+            # 主进程结束后叫停辅助进程，等它们都停下再返回，保证下一次搜索开始时没有旧的写入
+            self.stop_event.set()
+            helper_nodes = sum(self.result_queue.get() for _ in self.helpers)
+        self.nodes = self.searcher.nodes + helper_nodes
+        return result
+
+    def clear(self):
+        """
+        新开一局时清空置换表和所有进程的走法排序记录
+        :return:
+        """
+        for request_queue in self.request_queues:
+            request_queue.put({"command": "clear"})
+        for _ in self.helpers:
+            self.result_queue.get()
+        self.searcher.clear()
+
+    def close(self):
+        """
+        关闭辅助进程并释放共享内存
+        :return:
+        """
+        for request_queue in self.request_queues:
+            request_queue.put({"command": "quit"})
+        for helper in self.helpers:
+            helper.join()
+        self.request_queues.clear()
+        self.helpers.clear()
+        # 释放所有指向共享内存的 memoryview
+        self.searcher = self.tt = None
+        self.shm.close()
+        self.shm.unlink()
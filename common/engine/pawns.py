@@ -0,0 +1,142 @@
+"""
+兵型评估：叠兵、孤兵和通路兵。
+兵型只在兵走动、被吃或升变时才会变，所以按只包含兵的 Zobrist 哈希(Position.pawn_hash)缓存在兵型表里，
+搜索时绝大多数局面都能直接查到，不用重新计算
+"""
+
+import struct
+
+from .position import Position, BIN
+
+__all__ = [
+    "PawnHashTable", "pawn_structure",
+    "DOUBLED_PAWN_PENALTY", "ISOLATED_PAWN_PENALTY", "PASSED_PAWN_BONUS",
+    "FILE_MASKS", "ADJACENT_FILE_MASKS", "PASSED_PAWN_MASKS", "promotion_distance",
+]
+
+# 同一列每多一个兵扣的分
+DOUBLED_PAWN_PENALTY = 10
+# 相邻两列都没有己方兵时，每个兵扣的分
+ISOLATED_PAWN_PENALTY = 15
+# 通路兵的加分，下标为离升变还差几行
+PASSED_PAWN_BONUS = (0, 90, 60, 40, 25, 15, 10, 0)
+
+# 每一列的格子
+FILE_MASKS = tuple(0x0101010101010101 << x for x in range(8))
+# 左右两列的格子
+ADJACENT_FILE_MASKS = tuple((FILE_MASKS[x - 1] if x > 0 else 0) | (FILE_MASKS[x + 1] if x < 7 else 0) for x in range(8))
+
+
+def promotion_distance(side: int, sq: int) -> int:
+    """
+    兵离升变还差几行，P2 往第 0 行走，P1 往第 7 行走
+    """
+    return sq >> 3 if side else 7 - (sq >> 3)
+
+def _create_passed_pawn_masks() -> tuple[list[int], list[int]]:
+    masks = ([], [])
+    for side in range(2):
+        for sq in range(64):
+            x, y = sq & 7, sq >> 3
+            files = FILE_MASKS[x] | ADJACENT_FILE_MASKS[x]
+            # 前方的所有行
+            rows = range(y) if side else range(y + 1, 8)
+            front = 0
+            for row in rows:
+                front |= 0xFF << row * 8
+            masks[side].append(files & front)
+    return masks
+
+# 兵前方本列和相邻两列的格子，这些格子里没有敌方的兵时就是通路兵，下标为 [阵营][格子]
+PASSED_PAWN_MASKS = _create_passed_pawn_masks()
+
+
+def pawn_structure(pawns: tuple[int, int] | list[int]) -> tuple[int, int]:
+    """
+    从头计算兵型
+    :param pawns: 双方兵的位棋盘，下标为阵营
+    :return: (以 P2 视角的兵型分, 双方通路兵的位棋盘)
+    """
+    score = 0
+    passed = 0
+    for side in range(2):
+        own = pawns[side]
+        enemy = pawns[side ^ 1]
+        side_score = 0
+        for x in range(8):
+            count = (own & FILE_MASKS[x]).bit_count()
+            if not count:
+                continue
+            side_score -= DOUBLED_PAWN_PENALTY * (count - 1)
+            if not own & ADJACENT_FILE_MASKS[x]:
+                side_score -= ISOLATED_PAWN_PENALTY * count
+        passed_masks = PASSED_PAWN_MASKS[side]
+        remaining = own
+        while remaining:
+            low_bit = remaining & -remaining
+            remaining ^= low_bit
+            sq = low_bit.bit_length() - 1
+            if not enemy & passed_masks[sq]:
+                passed |= low_bit
+                side_score += PASSED_PAWN_BONUS[promotion_distance(side, sq)]
+        score += side_score if side else -side_score
+    return score, passed
+
+
+# 条目格式：兵型哈希(8) 通路兵(8) 兵型分(4)
+_ENTRY = struct.Struct('<QQi')
+ENTRY_SIZE = _ENTRY.size
+
+
+class PawnHashTable:
+    """
+    固定大小的兵型表，直接映射、总是替换。
+    和置换表分开，有自己的内存预算，条目很小，1 MB 就能放下五万多个兵型
+    """
+    def __init__(self, size_mb: float | None = None):
+        """
+        创建兵型表
+        :parameter size_mb: (可选) 占用的内存，单位 MB，默认读取配置文件里的 pawn_hash_mb
+        """
+        if size_mb is None:
+            from common.config import get_config
+            size_mb = get_config("pawn_hash_mb")
+        entry_count = 1
+        while entry_count * 2 * ENTRY_SIZE <= max(size_mb, 0.0625) * 1024 * 1024:
+            entry_count *= 2
+        self.mask = entry_count - 1
+        self.data = bytearray(entry_count * ENTRY_SIZE)
+        # 命中统计，用来观察命中率
+        self.probes = 0
+        self.hits = 0
+
+    @property
+    def size_mb(self) -> float:
+        return len(self.data) / 1024 / 1024
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.probes if self.probes else 0.0
+
+    def clear(self):
+        self.data[:] = bytes(len(self.data))
+        self.probes = self.hits = 0
+
+    def probe(self, position: Position) -> tuple[int, int]:
+        """
+        查询局面的兵型，没有记录时计算后存入
+        :param position: 局面
+        :return: (以 P2 视角的兵型分, 双方通路兵的位棋盘)
+        """
+        key = position.pawn_hash
+        offset = (key & self.mask) * ENTRY_SIZE
+        self.probes += 1
+        entry_key, passed, score = _ENTRY.unpack_from(self.data, offset)
+        # 没有兵时哈希为 0，和空条目一样，兵型分和通路兵也都是 0
+        if entry_key == key:
+            self.hits += 1
+            return score, passed
+        bitboards = position.bitboards
+        score, passed = pawn_structure((bitboards[BIN], bitboards[6 + BIN]))
+        _ENTRY.pack_into(self.data, offset, key, passed, score)
+        return score, passed
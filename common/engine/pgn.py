@@ -0,0 +1,321 @@
+"""
+PGN 棋谱的读写。
+read_pgn 是生成器，从文件对象里逐行读取，读完一局就交出一局，内存里只有当前这一局，
+几个 GB 的棋谱也能用 for 循环一局一局地处理，比如统计开局或者生成开局库：
+
+    with open('games.pgn', encoding = 'utf-8') as file:
+        for game in read_pgn(file):
+            print(game.headers.get('White'), game.result, len(game.moves))
+
+走法按本项目的规则解码：王车易位只看王和车的位置，过路兵在它再次移动前一直可以被吃。
+按标准规则下的棋谱里出现本项目不允许的走法时(比如王在 e1 直接易位)，这一局停在这一步，原因记在 error 里
+"""
+
+import re
+from typing import Iterator, TextIO
+
+from .position import (Position, EMPTY, BIN, MOVE_LUGUO, MOVE_WANGCHE, type_of, move_kind, promotion_type,
+                       square_name, parse_square)
+from .movegen import generate_moves, generate_legal_moves, filter_legal, has_legal_move, in_check
+
+__all__ = [
+    "PgnGame", "read_pgn", "write_game", "append_game", "parse_san", "move_san", "SEVEN_TAG_ROSTER",
+]
+
+# 导出时放在最前面、并且一定会写出的七个标签
+SEVEN_TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+# 对局结果的记号
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+# 棋谱里棋子类型的字母，下标为棋子类型
+_SAN_PIECES = 'PNBRQK'
+# 导出时每行的最大长度，PGN 标准建议不超过 80
+_LINE_LENGTH = 79
+
+_TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*]')
+# 注释(可能没有在本行闭合)、行注释、变着括号、NAG、回合数、其余的记号
+_TOKEN = re.compile(r'\{[^}]*}?|;.*|[()]|\$\d+|\d+\.+|[^\s{}();$]+')
+_SAN = re.compile(r'([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?')
+
+
+class PgnGame:
+    """
+    一局棋谱：标签、起始局面和走法
+    """
+    def __init__(self, headers: dict[str, str] | None = None, start: Position | None = None):
+        """
+        创建一局棋谱
+        :parameter headers: (可选) 标签，比如 {"White": "张三", "Result": "1-0"}
+        :parameter start: (可选) 起始局面，默认为标准开局
+        """
+        self.headers: dict[str, str] = headers if headers is not None else {}
+        self.start = start if start is not None else Position.start()
+        # 走法整数，读取时只有 decode 为 True 才会填写
+        self.moves: list[int] = []
+        # 棋谱里原样的走法记号
+        self.sans: list[str] = []
+        # 解码失败的原因，解码失败之后的走法不再放进 moves
+        self.error: str | None = None
+
+    @property
+    def result(self) -> str:
+        return self.headers.get('Result', '*')
+
+    def positions(self) -> Iterator[Position]:
+        """
+        从起始局面依次重放走法
+        :return: 每一步之前的局面和终局，共 len(moves) + 1 个，每个都是独立的副本
+        """
+        position = self.start.copy()
+        yield position.copy()
+        for move in self.moves:
+            position.make_move(move)
+            yield position.copy()
+
+
+def _candidate_moves(position: Position) -> list[int]:
+    # 没有合法走法时只能送吃，和搜索器一致
+    return generate_legal_moves(position) or generate_moves(position)
+
+def _match_san(position: Position, text: str, moves: list[int]) -> list[int]:
+    """
+    按记号筛选走法，不检查合法性
+    :param text: 去掉了 + # ! ? 的记号
+    :return: 符合记号的走法
+    """
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        queen_side = len(text) == 5
+        return [move for move in moves
+                if move_kind(move) == MOVE_WANGCHE and ((move >> 6 & 7) < (move & 7)) == queen_side]
+    match = _SAN.fullmatch(text)
+    if match is None:
+        return []
+    piece, file, rank, target, promotion = match.groups()
+    chess_type = _SAN_PIECES.index(piece) if piece else BIN
+    to_sq = parse_square(target)
+    promotion = _SAN_PIECES.index(promotion) if promotion else -1
+    matched = []
+    for move in moves:
+        from_sq = move & 63
+        if (move >> 6 & 63 != to_sq or type_of(position.board[from_sq]) != chess_type
+                or promotion_type(move) != promotion):
+            continue
+        name = square_name(from_sq)
+        if file and name[0] != file or rank and name[1] != rank:
+            continue
+        matched.append(move)
+    return matched
+
+def parse_san(position: Position, san: str, moves: list[int] | None = None) -> int:
+    """
+    把标准代数记号(SAN)转换为走法整数
+    :param position: 走棋前的局面
+    :param san: 记号，比如 e4、Nbd7、exd6、e8=Q、O-O，末尾的 + # ! ? 会被忽略
+    :parameter moves: (可选) 这个局面的走法列表，已经生成过时传进来可以省一次走法生成
+    :return: 走法整数，不合法或者有歧义时返回 0
+    """
+    text = san.rstrip('+#!?')
+    if text.endswith('e.p.'):
+        text = text[:-4]
+    if moves is not None:
+        matched = _match_san(position, text, moves)
+    else:
+        # 先按记号从伪合法走法里筛选，只对剩下的一两步判断合法性，读大棋谱时比生成全部合法走法快得多
+        matched = _match_san(position, text, generate_moves(position))
+        legal = filter_legal(position, matched)
+        # 没有合法走法时只能送吃，伪合法走法都可以走
+        if legal or has_legal_move(position):
+            matched = legal
+    return matched[0] if len(matched) == 1 else 0
+
+def move_san(position: Position, move: int, moves: list[int] | None = None) -> str:
+    """
+    走法的标准代数记号(SAN)，同类棋子能走到同一格时按列、行或者起点区分，将军加 +，将死加 #
+    :param position: 走棋前的局面，判断将军时会走一步再撤销，返回时不变
+    :param move: 走法整数
+    :parameter moves: (可选) 这个局面的走法列表，用来区分同类棋子
+    :return: 记号
+    """
+    if moves is None:
+        moves = _candidate_moves(position)
+    from_sq = move & 63
+    to_sq = move >> 6 & 63
+    board = position.board
+    if move_kind(move) == MOVE_WANGCHE:
+        san = 'O-O' if to_sq & 7 > from_sq & 7 else 'O-O-O'
+    else:
+        chess_type = type_of(board[from_sq])
+        capture = board[to_sq] != EMPTY or move_kind(move) == MOVE_LUGUO
+        from_name = square_name(from_sq)
+        if chess_type == BIN:
+            san = from_name[0] + 'x' if capture else ''
+        else:
+            san = _SAN_PIECES[chess_type]
+            rivals = {square_name(other & 63) for other in moves
+                      if other >> 6 & 63 == to_sq and other & 63 != from_sq
+                      and type_of(board[other & 63]) == chess_type}
+            if rivals:
+                if all(name[0] != from_name[0] for name in rivals):
+                    san += from_name[0]
+                elif all(name[1] != from_name[1] for name in rivals):
+                    san += from_name[1]
+                else:
+                    san += from_name
+            if capture:
+                san += 'x'
+        san += square_name(to_sq)
+        if promotion_type(move) != -1:
+            san += '=' + _SAN_PIECES[promotion_type(move)]
+    undo = position.make_move(move)
+    # 吃王之后对方没有王，不用判断将军
+    if position.king_square(position.side) != -1 and in_check(position):
+        san += '+' if has_legal_move(position) else '#'
+    position.unmake_move(undo)
+    return san
+
+
+def _start_game(game: PgnGame, decode: bool) -> Position | None:
+    """
+    标签读完、开始读走法时确定起始局面
+    :return: 用来解码的局面，不解码或者 FEN 有误时返回 None
+    """
+    fen = game.headers.get('FEN')
+    if fen is not None:
+        try:
+            game.start = Position.from_fen(fen)
+        except ValueError as error:
+            game.error = str(error)
+            return None
+    return game.start.copy() if decode else None
+
+def read_pgn(file: TextIO, decode: bool = True) -> Iterator[PgnGame]:
+    """
+    逐局读取 PGN 棋谱，是一个生成器，读完一局交出一局，内存占用和文件大小无关。
+    注释、变着和 NAG 会被跳过，只保留主线
+    :param file: 以文本方式打开的文件对象，也可以是任何逐行产出字符串的可迭代对象
+    :parameter decode: (可选) 是否把走法记号解码成走法整数，只看标签或者只要记号时关掉会快很多
+    :return: 每一局的 PgnGame
+    """
+    game: PgnGame | None = None
+    # 解码用的当前局面，为 None 时不解码
+    position: Position | None = None
+    # 是否已经开始读走法，之后再遇到标签就是下一局
+    in_moves = False
+    in_comment = False
+    # 变着的嵌套层数
+    depth = 0
+    for line in file:
+        if in_comment:
+            end = line.find('}')
+            if end == -1:
+                continue
+            in_comment = False
+            line = line[end + 1:]
+        elif line.startswith('%'):
+            continue
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.startswith('[') and depth == 0:
+            if in_moves:
+                # 上一局没有结果记号就开始了下一局
+                yield game
+                game, in_moves = None, False
+            if game is None:
+                game = PgnGame()
+            for key, value in _TAG.findall(stripped):
+                game.headers[key] = value.replace('\\"', '"').replace('\\\\', '\\')
+            continue
+        for token in _TOKEN.findall(line):
+            first = token[0]
+            if first == '{':
+                if not token.endswith('}'):
+                    in_comment = True
+                continue
+            if first == ';':
+                break
+            if first == '(':
+                depth += 1
+                continue
+            if first == ')':
+                depth = max(depth - 1, 0)
+                continue
+            if depth or first == '$' or token.endswith('.'):
+                continue
+            if game is None:
+                game = PgnGame()
+            if not in_moves:
+                in_moves = True
+                position = _start_game(game, decode)
+            if token in RESULTS:
+                game.headers.setdefault('Result', token)
+                yield game
+                game, position, in_moves = None, None, False
+                continue
+            game.sans.append(token)
+            if position is None or game.error is not None:
+                continue
+            move = parse_san(position, token)
+            if not move:
+                game.error = f'第 {len(game.sans)} 个半回合的 {token} 不合法或有歧义'
+                continue
+            game.moves.append(move)
+            position.make_move(move)
+    if game is not None and (in_moves or game.headers):
+        yield game
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+def write_game(file: TextIO, game: PgnGame):
+    """
+    按 PGN 格式写出一局，走法记号由 moves 重新生成，七个必备标签缺的补 ?，
+    起始局面不是标准开局时写上 SetUp 和 FEN 标签
+    :param file: 以文本方式打开的文件对象
+    :param game: 棋谱
+    :return:
+    """
+    headers = {key: game.headers.get(key, '*' if key == 'Result' else '?') for key in SEVEN_TAG_ROSTER}
+    headers.update(game.headers)
+    start = game.start.copy()
+    if start.hash != Position.start().hash or start.side != 1:
+        headers['SetUp'] = '1'
+        headers.setdefault('FEN', start.to_fen() + ' 0 1')
+    fields = headers['FEN'].split() if 'FEN' in headers else []
+    fullmove = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+    for key, value in headers.items():
+        file.write(f'[{key} "{_escape(str(value))}"]\n')
+    file.write('\n')
+
+    tokens = []
+    position = start
+    for ply, move in enumerate(game.moves):
+        san = move_san(position, move)
+        # 回合数和走法放在同一个记号里，换行时不会被拆开
+        if position.side == 1:
+            san = f'{fullmove}. {san}'
+        elif ply == 0:
+            san = f'{fullmove}... {san}'
+        tokens.append(san)
+        if position.side == 0:
+            fullmove += 1
+        position.make_move(move)
+    tokens.append(headers['Result'])
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > _LINE_LENGTH:
+            file.write(line + '\n')
+            line = token
+        else:
+            line = f'{line} {token}' if line else token
+    file.write(line + '\n\n')
+
+def append_game(path: str, game: PgnGame):
+    """
+    把一局追加到棋谱文件末尾，文件不存在时新建
+    :param path: 棋谱文件路径
+    :param game: 棋谱
+    :return:
+    """
+    with open(path, 'a', encoding = 'utf-8') as file:
+        write_game(file, game)
@@ -0,0 +1,468 @@
+"""
+不依赖 pygame 的局面模型，用位棋盘记录棋子，供机器人和服务端直接使用
+"""
+
+from typing import Literal
+from .zobrist import ZOBRIST_PIECE, ZOBRIST_SIDE, ZOBRIST_EP
+
+__all__ = [
+    "Position",
+    "BIN", "MA", "XIANG", "CHE", "HOU", "WANG",
+    "CHESS_TYPES", "SIDE_NAMES", "EMPTY", "TOWARD", "BACK_RANK_Y", "PAWN_START_Y",
+    "MOVE_NORMAL", "MOVE_DOUBLE", "MOVE_LUGUO", "MOVE_WANGCHE", "MOVE_PROMOTION",
+    "encode_move", "move_from", "move_to", "move_kind", "promotion_type",
+    "square", "square_name", "parse_square", "move_name", "piece_of", "side_of", "type_of",
+    "START_FEN",
+]
+
+# 棋子类型，命名沿用 common.chess 里的拼音
+BIN, MA, XIANG, CHE, HOU, WANG = range(6)
+CHESS_TYPES = ('bin', 'ma', 'xiang', 'che', 'hou', 'wang')
+# 双方名字，下标就是局面里的 side，P1 在上方，P2 在下方
+SIDE_NAMES: tuple[Literal['P1'], Literal['P2']] = ('P1', 'P2')
+# 棋盘数组里代表空格的值
+EMPTY = 12
+# 兵的朝向，P1 朝下，P2 朝上，和 BasicChess.toward 一致
+TOWARD = (1, -1)
+# 双方底线与兵的初始行
+BACK_RANK_Y = (0, 7)
+PAWN_START_Y = (1, 6)
+
+# 走法类型，走法整数的第 12 位开始存放
+MOVE_NORMAL = 0 # 普通走子或吃子
+MOVE_DOUBLE = 1 # 兵开局走两格
+MOVE_LUGUO = 2 # 吃过路兵
+MOVE_WANGCHE = 3 # 王车易位
+MOVE_PROMOTION = 4 # 4~7 依次为升变成 马、象、车、后
+
+# 标准开局的 FEN
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - -'
+# FEN 里的棋子字母，下标为棋子编号，小写为 P1(黑)，大写为 P2(白)
+_PIECE_CHARS = 'pnbrqkPNBRQK'
+
+
+def encode_move(from_sq: int, to_sq: int, kind: int = MOVE_NORMAL) -> int:
+    """
+    把一步棋压成一个 16 位整数
+    :param from_sq: 起点格子
+    :param to_sq: 终点格子
+    :parameter kind: (可选) 走法类型
+    :return: 走法整数
+    """
+    return from_sq | to_sq << 6 | kind << 12
+
+def move_from(move: int) -> int:
+    return move & 63
+
+def move_to(move: int) -> int:
+    return move >> 6 & 63
+
+def move_kind(move: int) -> int:
+    return move >> 12
+
+def promotion_type(move: int) -> int:
+    """
+    升变走法对应的棋子类型，不是升变时返回 -1
+    """
+    kind = move >> 12
+    return kind - MOVE_PROMOTION + MA if kind >= MOVE_PROMOTION else -1
+
+def square(list_x: int, list_y: int) -> int:
+    """
+    地图列表坐标转换为格子编号，与 map_data[list_y][list_x] 一一对应
+    """
+    return list_y * 8 + list_x
+
+def square_name(sq: int) -> str:
+    """
+    格子的代数记号，上方 P1 的底线是第 8 行
+    """
+    return 'abcdefgh'[sq & 7] + str(8 - (sq >> 3))
+
+def parse_square(name: str) -> int:
+    """
+    代数记号转换为格子编号，square_name 的逆运算
+    """
+    return (8 - int(name[1])) * 8 + 'abcdefgh'.index(name[0])
+
+def move_name(move: int) -> str:
+    """
+    走法的坐标记号，例如 e2e4、e7e8q，和 UCI 协议的格式一致
+    """
+    name = square_name(move & 63) + square_name(move >> 6 & 63)
+    chess_type = promotion_type(move)
+    if chess_type != -1:
+        name += _PIECE_CHARS[chess_type]
+    return name
+
+def piece_of(side: int, chess_type: int) -> int:
+    return side * 6 + chess_type
+
+def side_of(piece: int) -> int:
+    return piece // 6
+
+def type_of(piece: int) -> int:
+    return piece % 6
+
+
+class Position:
+    """
+    局面类，棋子按 (阵营, 类型) 存成 12 个 64 位整数，同时保留一个 64 格的棋盘数组方便按格子查棋子
+    """
+    __slots__ = ('bitboards', 'occupancy', 'board', 'side', 'ep_pawns', 'hash', 'pawn_hash')
+
+    def __init__(self):
+        """
+        创建一个空局面
+        """
+        # 每种棋子的位棋盘，下标为 side * 6 + 棋子类型
+        self.bitboards: list[int] = [0] * 12
+        # 双方各自占据的格子
+        self.occupancy: list[int] = [0, 0]
+        # 按格子记录棋子，空格为 EMPTY
+        self.board = bytearray([EMPTY]) * 64
+        # 当前走棋方，默认白棋(P2)先行
+        self.side = 1
+        # 可以被吃过路兵的兵，对应 BinChess 的 move_two_step 且 move_step_num == 1
+        self.ep_pawns = 0
+        # 64 位 Zobrist 哈希，随走子增量更新
+        self.hash = 0
+        # 只包含双方兵的 Zobrist 哈希，兵型表用它做键
+        self.pawn_hash = 0
+
+    @classmethod
+    def start(cls) -> 'Position':
+        """
+        标准开局
+        :return: 一个新的局面
+        """
+        position = cls()
+        chess_type_list = [CHE, MA, XIANG, HOU, WANG, XIANG, MA, CHE]
+        for side in range(2):
+            for x in range(8):
+                position.put_piece(piece_of(side, BIN), square(x, PAWN_START_Y[side]))
+                position.put_piece(piece_of(side, chess_type_list[x]), square(x, BACK_RANK_Y[side]))
+        return position
+
+    @classmethod
+    def from_fen(cls, fen: str) -> 'Position':
+        """
+        从 FEN 字符串创建局面。
+        王车易位只看几何位置，所以易位字段会被忽略；
+        吃过路兵字段可以连写多个格子(例如 d6f6)，因为刚走过两格的兵在它再次移动前一直可以被吃
+        :param fen: FEN 字符串，后面的步数字段可以省略
+        :return: 一个新的局面
+        """
+        fields = fen.split()
+        rows = fields[0].split('/') if fields else []
+        if len(rows) != 8:
+            raise ValueError(f'FEN 的棋盘必须有 8 行: {fen!r}')
+        position = cls()
+        for list_y, row in enumerate(rows):
+            list_x = 0
+            for char in row:
+                if char.isdigit():
+                    list_x += int(char)
+                elif char in _PIECE_CHARS and list_x < 8:
+                    position.put_piece(_PIECE_CHARS.index(char), square(list_x, list_y))
+                    list_x += 1
+                else:
+                    raise ValueError(f'FEN 的第 {list_y + 1} 行无法解析: {row!r}')
+            if list_x != 8:
+                raise ValueError(f'FEN 的第 {list_y + 1} 行不是 8 格: {row!r}')
+        position.side = 1 if len(fields) < 2 or fields[1] == 'w' else 0
+        if len(fields) > 3 and fields[3] != '-':
+            for index in range(0, len(fields[3]), 2):
+                target_sq = parse_square(fields[3][index:index + 2])
+                # 目标格在第 3 行时是 P2 的兵，在第 6 行时是 P1 的兵，兵就在目标格的前方
+                owner = 1 if target_sq >> 3 >= 4 else 0
+                position.ep_pawns |= 1 << target_sq + TOWARD[owner] * 8
+        position.compute_hash()
+        return position
+
+    def to_fen(self) -> str:
+        """
+        导出 FEN 字符串，易位字段按王和车当前的几何位置推算
+        :return: FEN 字符串
+        """
+        rows = []
+        for list_y in range(8):
+            row = ''
+            empty_count = 0
+            for list_x in range(8):
+                piece = self.board[square(list_x, list_y)]
+                if piece == EMPTY:
+                    empty_count += 1
+                    continue
+                if empty_count:
+                    row += str(empty_count)
+                    empty_count = 0
+                row += _PIECE_CHARS[piece]
+            if empty_count:
+                row += str(empty_count)
+            rows.append(row)
+
+        castling = ''
+        for side, chars in ((1, 'KQ'), (0, 'kq')):
+            row = BACK_RANK_Y[side] * 8
+            rook = piece_of(side, CHE)
+            if self.board[row + 5] == piece_of(side, WANG) and self.board[row + 7] == rook:
+                castling += chars[0]
+            if self.board[row + 3] == piece_of(side, WANG) and self.board[row] == rook:
+                castling += chars[1]
+
+        ep_targets = ''
+        ep_pawns = self.ep_pawns
+        while ep_pawns:
+            low_bit = ep_pawns & -ep_pawns
+            ep_pawns ^= low_bit
+            pawn_sq = low_bit.bit_length() - 1
+            owner = side_of(self.board[pawn_sq])
+            ep_targets += square_name(pawn_sq - TOWARD[owner] * 8)
+
+        return '{0} {1} {2} {3}'.format(
+            '/'.join(rows), 'w' if self.side else 'b', castling or '-', ep_targets or '-'
+        )
+
+    def copy(self) -> 'Position':
+        """
+        复制局面，只复制几个整数和一个 64 字节的数组
+        :return: 新的局面
+        """
+        position = Position.__new__(Position)
+        position.bitboards = self.bitboards[:]
+        position.occupancy = self.occupancy[:]
+        position.board = self.board[:]
+        position.side = self.side
+        position.ep_pawns = self.ep_pawns
+        position.hash = self.hash
+        position.pawn_hash = self.pawn_hash
+        return position
+
+    __copy__ = copy
+
+    @property
+    def occupied(self) -> int:
+        return self.occupancy[0] | self.occupancy[1]
+
+    @property
+    def round_name(self) -> Literal['P1', 'P2']:
+        return SIDE_NAMES[self.side]
+
+    def piece_at(self, sq: int) -> int:
+        return self.board[sq]
+
+    def pieces(self, side: int, chess_type: int) -> int:
+        return self.bitboards[side * 6 + chess_type]
+
+    def king_square(self, side: int) -> int:
+        """
+        王所在的格子，王已经被吃掉时返回 -1
+        """
+        return self.bitboards[side * 6 + WANG].bit_length() - 1
+
+    def compute_hash(self) -> int:
+        """
+        从头计算 Zobrist 哈希，直接改动 side 或 ep_pawns 之后要调用一次
+        :return: 计算出的哈希，同时写入 self.hash，兵型哈希同时写入 self.pawn_hash
+        """
+        key = 0 if self.side else ZOBRIST_SIDE
+        pawn_key = 0
+        for sq in range(64):
+            piece = self.board[sq]
+            if piece != EMPTY:
+                key ^= ZOBRIST_PIECE[piece][sq]
+                if piece % 6 == BIN:
+                    pawn_key ^= ZOBRIST_PIECE[piece][sq]
+        ep_pawns = self.ep_pawns
+        while ep_pawns:
+            low_bit = ep_pawns & -ep_pawns
+            key ^= ZOBRIST_EP[low_bit.bit_length() - 1]
+            ep_pawns ^= low_bit
+        self.hash = key
+        self.pawn_hash = pawn_key
+        return key
+
+    def put_piece(self, piece: int, sq: int):
+        """
+        在空格上放一个棋子
+        :param piece: 棋子编号
+        :param sq: 格子
+        :return:
+        """
+        bit = 1 << sq
+        self.bitboards[piece] |= bit
+        self.occupancy[piece // 6] |= bit
+        self.board[sq] = piece
+        self.hash ^= ZOBRIST_PIECE[piece][sq]
+        if piece % 6 == BIN:
+            self.pawn_hash ^= ZOBRIST_PIECE[piece][sq]
+
+    def remove_piece(self, sq: int) -> int:
+        """
+        拿走格子上的棋子
+        :param sq: 格子
+        :return: 被拿走的棋子编号
+        """
+        piece = self.board[sq]
+        bit = 1 << sq
+        self.bitboards[piece] ^= bit
+        self.occupancy[piece // 6] ^= bit
+        self.board[sq] = EMPTY
+        self.hash ^= ZOBRIST_PIECE[piece][sq]
+        if piece % 6 == BIN:
+            self.pawn_hash ^= ZOBRIST_PIECE[piece][sq]
+        if self.ep_pawns & bit:
+            self.ep_pawns ^= bit
+            self.hash ^= ZOBRIST_EP[sq]
+        return piece
+
+    def make_move(self, move: int) -> tuple[int, int, int, int, int]:
+        """
+        在局面上走一步棋，并交换走棋方，所有改动都是 O(1) 的位运算
+        :param move: 走法整数
+        :return: 撤销记录，交给 unmake_move 就能精确还原
+        """
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+        kind = move >> 12
+        board = self.board
+        bitboards = self.bitboards
+        occupancy = self.occupancy
+        side = self.side
+        piece = board[from_sq]
+        captured = board[to_sq]
+        undo = (move, captured, self.ep_pawns, self.hash, self.pawn_hash)
+        from_bit = 1 << from_sq
+        to_bit = 1 << to_sq
+        # 走过的兵不能再被吃过路兵
+        ep_pawns = self.ep_pawns & ~from_bit
+        # 交换走棋方
+        key = self.hash ^ ZOBRIST_SIDE ^ ZOBRIST_PIECE[piece][from_sq]
+        pawn_key = self.pawn_hash
+        moving_pawn = piece % 6 == BIN
+        if moving_pawn:
+            pawn_key ^= ZOBRIST_PIECE[piece][from_sq]
+
+        if captured != EMPTY:
+            bitboards[captured] ^= to_bit
+            occupancy[side ^ 1] ^= to_bit
+            ep_pawns &= ~to_bit
+            key ^= ZOBRIST_PIECE[captured][to_sq]
+            if captured % 6 == BIN:
+                pawn_key ^= ZOBRIST_PIECE[captured][to_sq]
+
+        bitboards[piece] ^= from_bit
+        board[from_sq] = EMPTY
+        occupancy[side] ^= from_bit | to_bit
+        if kind >= MOVE_PROMOTION:
+            piece = side * 6 + kind - MOVE_PROMOTION + MA
+        elif moving_pawn:
+            pawn_key ^= ZOBRIST_PIECE[piece][to_sq]
+        bitboards[piece] |= to_bit
+        board[to_sq] = piece
+        key ^= ZOBRIST_PIECE[piece][to_sq]
+
+        if kind == MOVE_DOUBLE:
+            ep_pawns |= to_bit
+        elif kind == MOVE_LUGUO:
+            # 被吃的兵和起点同一行，和终点同一列
+            ep_sq = from_sq & ~7 | to_sq & 7
+            ep_bit = 1 << ep_sq
+            ep_piece = board[ep_sq]
+            bitboards[ep_piece] ^= ep_bit
+            occupancy[side ^ 1] ^= ep_bit
+            board[ep_sq] = EMPTY
+            ep_pawns &= ~ep_bit
+            key ^= ZOBRIST_PIECE[ep_piece][ep_sq]
+            pawn_key ^= ZOBRIST_PIECE[ep_piece][ep_sq]
+        elif kind == MOVE_WANGCHE:
+            # 车移动到王原本的位置
+            rook_sq = to_sq & ~7 | (0 if to_sq & 7 < 4 else 7)
+            rook_bits = 1 << rook_sq | from_bit
+            rook = board[rook_sq]
+            bitboards[rook] ^= rook_bits
+            occupancy[side] ^= rook_bits
+            board[from_sq] = rook
+            board[rook_sq] = EMPTY
+            key ^= ZOBRIST_PIECE[rook][rook_sq] ^ ZOBRIST_PIECE[rook][from_sq]
+
+        # 可被吃过路兵的兵有变化时，异或掉变化的格子
+        ep_changed = ep_pawns ^ self.ep_pawns
+        while ep_changed:
+            low_bit = ep_changed & -ep_changed
+            key ^= ZOBRIST_EP[low_bit.bit_length() - 1]
+            ep_changed ^= low_bit
+
+        self.ep_pawns = ep_pawns
+        self.hash = key
+        self.pawn_hash = pawn_key
+        self.side = side ^ 1
+        return undo
+
+    def unmake_move(self, undo: tuple[int, int, int, int, int]):
+        """
+        撤销 make_move 走的一步棋
+        :param undo: make_move 返回的撤销记录
+        :return:
+        """
+        move, captured, ep_pawns, key, pawn_key = undo
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+        kind = move >> 12
+        board = self.board
+        bitboards = self.bitboards
+        occupancy = self.occupancy
+        side = self.side ^ 1
+        from_bit = 1 << from_sq
+        to_bit = 1 << to_sq
+
+        # 先把车放回去，它占着王原本的位置
+        if kind == MOVE_WANGCHE:
+            rook_sq = to_sq & ~7 | (0 if to_sq & 7 < 4 else 7)
+            rook_bits = 1 << rook_sq | from_bit
+            bitboards[board[from_sq]] ^= rook_bits
+            occupancy[side] ^= rook_bits
+            board[rook_sq] = board[from_sq]
+
+        piece = board[to_sq]
+        bitboards[piece] ^= to_bit
+        if kind >= MOVE_PROMOTION:
+            piece = side * 6 + BIN
+        bitboards[piece] |= from_bit
+        board[from_sq] = piece
+        occupancy[side] ^= from_bit | to_bit
+        board[to_sq] = captured
+
+        if captured != EMPTY:
+            bitboards[captured] |= to_bit
+            occupancy[side ^ 1] |= to_bit
+        elif kind == MOVE_LUGUO:
+            ep_sq = from_sq & ~7 | to_sq & 7
+            ep_bit = 1 << ep_sq
+            ep_piece = (side ^ 1) * 6 + BIN
+            bitboards[ep_piece] |= ep_bit
+            occupancy[side ^ 1] |= ep_bit
+            board[ep_sq] = ep_piece
+
+        self.ep_pawns = ep_pawns
+        self.hash = key
+        self.pawn_hash = pawn_key
+        self.side = side
+
+    def make_null_move(self):
+        """
+        空着，只交换走棋方，搜索里的空着裁剪会用到。
+        可被吃过路兵的兵不受影响，因为它们本来就一直可以被吃
+        :return:
+        """
+        self.side ^= 1
+        self.hash ^= ZOBRIST_SIDE
+
+    unmake_null_move = make_null_move
+
+    def __str__(self):
+        chars = 'pnbrqkPNBRQK.'
+        return '\n'.join(
+            ''.join(chars[self.board[y * 8 + x]] for x in range(8)) for y in range(8)
+        )
@@ -0,0 +1,498 @@
+"""
+离线生成残局库：枚举残局里的所有局面，用逆向分析从能直接吃王的局面往回推，
+得出每个局面的胜负和距离吃王的步数，写成 common.engine.tablebase 读取的文件。
+
+规则和引擎一致：吃掉对方的王就赢，没有合法走法时只能走伪合法走法，下一步王就被吃掉，
+所以困毙也是输棋；王车易位只看几何位置。
+强方吃不到王、弱方吃掉强方棋子或者兵升变时会走到别的残局，这些残局要先生成，会自动按依赖顺序生成。
+
+用法：
+    python -m common.engine.retrograde KQK KRK KPK KBNK -o resource/tablebase -j 8
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from typing import Callable, Iterable
+
+from .position import BIN, MA, XIANG, CHE, HOU
+from .attacks import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, ROOK_MASKS, ROOK_TABLES, BISHOP_MASKS, BISHOP_TABLES
+from .tablebase import (Tablebase, CODE_DRAW, CODE_WIN, CODE_LOSS, CODE_INVALID, HEADER_SIZE, TABLE_NAMES,
+                        table_name, table_pieces, table_index, table_size, bare_kings_result, _HEADER, _MAGIC,
+                        _PIECE_ORDER)
+
+__all__ = [
+    "generate_table", "table_dependencies",
+]
+
+# 初始化时每个任务分析的局面数
+_CHUNK_SIZE = 1 << 14
+# 逆向分析时每个任务处理的局面数
+_FRONTIER_CHUNK_SIZE = 1 << 11
+
+# 初始化时每个局面的标记
+_ESCAPE = 1 # 有走到别的残局且是和棋的走法
+_EXTERNAL_WIN = 2 # 有走到别的残局且能赢的走法
+_INVALID = 4 # 棋子重叠或兵在底线
+
+# 强方是 P2，从第 7 行往第 0 行走，易位只会发生在第 7 行
+_ROW = 56
+_PROMOTION_TYPES = (MA, XIANG, CHE, HOU)
+
+
+def table_dependencies(name: str) -> list[str]:
+    """
+    生成一个残局需要先查询的其他残局，只剩两个王的局面不需要文件
+    :param name: 残局名
+    :return: 残局名列表
+    """
+    pieces = table_pieces(name)
+    dependencies = set()
+    for index, chess_type in enumerate(pieces):
+        # 弱方的王吃掉这个棋子
+        rest = pieces[:index] + pieces[index + 1:]
+        if rest:
+            dependencies.add(table_name(rest))
+        # 兵升变成其他棋子
+        if chess_type == BIN:
+            for promotion in _PROMOTION_TYPES:
+                dependencies.add(table_name(tuple(sorted(rest + (promotion,), key = _PIECE_ORDER.index))))
+    return sorted(dependencies)
+
+
+def _slider_targets(chess_type: int, sq: int, occupied: int) -> int:
+    """
+    棋子能走到的所有格子(包括有棋子的格子)，兵除外
+    """
+    if chess_type == MA:
+        return KNIGHT_ATTACKS[sq]
+    targets = 0
+    if chess_type != CHE:
+        targets = BISHOP_TABLES[sq][occupied & BISHOP_MASKS[sq]]
+    if chess_type != XIANG:
+        targets |= ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]]
+    return targets
+
+
+class _Generator:
+    """
+    一个残局的走法和逆走法，强方为 P2，走棋方 1 为强方、0 为弱方
+    """
+    def __init__(self, name: str, directory: str):
+        self.name = name
+        self.pieces = table_pieces(name)
+        self.count = len(self.pieces)
+        self.size = table_size(self.count)
+        self.tablebase = Tablebase(directory)
+
+    def decode(self, index: int) -> tuple[int, int, int, list[int]]:
+        squares = []
+        for _ in range(self.count):
+            squares.append(index & 63)
+            index >>= 6
+        squares.reverse()
+        return index >> 12, index >> 6 & 63, index & 63, squares
+
+    def encode(self, side: int, strong_king: int, weak_king: int, squares: list[int]) -> int:
+        return table_index(side, strong_king, weak_king, squares)
+
+    def strong_attacks(self, sq: int, occupied: int, strong_king: int, squares: list[int], skip: int = -1) -> bool:
+        """
+        强方是否攻击某个格子
+        :param skip: 已经被吃掉、不再参与攻击的棋子序号
+        """
+        if KING_ATTACKS[strong_king] >> sq & 1:
+            return True
+        for index, chess_type in enumerate(self.pieces):
+            if index == skip:
+                continue
+            if chess_type == BIN:
+                if PAWN_ATTACKS[1][squares[index]] >> sq & 1:
+                    return True
+            elif _slider_targets(chess_type, squares[index], occupied) >> sq & 1:
+                return True
+        return False
+
+    def strong_has_legal_move(self, strong_king: int, weak_king: int, squares: list[int]) -> bool:
+        """
+        强方是否有合法走法。强方的王只会被弱方的王攻击，所以只有王的走法可能不合法；
+        王车易位的目标格和王走一步的格子是同一格，不用单独判断
+        """
+        occupied = 1 << strong_king | 1 << weak_king
+        for sq in squares:
+            occupied |= 1 << sq
+        if KING_ATTACKS[strong_king] & ~occupied & ~KING_ATTACKS[weak_king]:
+            return True
+        for chess_type, sq in zip(self.pieces, squares):
+            if chess_type == BIN:
+                if not occupied >> sq - 8 & 1:
+                    return True
+            elif _slider_targets(chess_type, sq, occupied) & ~occupied:
+                return True
+        return False
+
+    def rook_at(self, sq: int, squares: list[int]) -> bool:
+        return any(chess_type == CHE and squares[index] == sq for index, chess_type in enumerate(self.pieces))
+
+    def external(self, side: int, strong_king: int, weak_king: int, pieces: list[tuple[int, int]]) -> tuple[int, int]:
+        """
+        查询走到别的残局之后的结果
+        :param pieces: [(棋子类型, 格子)]
+        :return: (胜负编码, 步数)，以走到的局面的走棋方视角
+        """
+        if not pieces:
+            return bare_kings_result(side, strong_king, weak_king)
+        pieces = sorted(pieces, key = lambda piece: _PIECE_ORDER.index(piece[0]))
+        name = table_name(tuple(chess_type for chess_type, _ in pieces))
+        result = self.tablebase.lookup(name, table_index(side, strong_king, weak_king, [sq for _, sq in pieces]))
+        if result is None:
+            raise FileNotFoundError(f'生成 {self.name} 之前需要先生成 {name}')
+        return result
+
+    def analyze(self, index: int) -> tuple[int, int, int, int]:
+        """
+        分析一个局面的所有走法
+        :return: (标记, 走到本残局的合法走法数, 走到别的残局后最慢的输棋步数, 初始时就能确定的步数)
+                 最后一项为 0 时表示要等逆向分析
+        """
+        side, strong_king, weak_king, squares = self.decode(index)
+        occupied = 1 << strong_king | 1 << weak_king
+        for sq in squares:
+            occupied |= 1 << sq
+        if occupied.bit_count() != self.count + 2:
+            return _INVALID, 0, 0, 0
+        for chess_type, sq in zip(self.pieces, squares):
+            if chess_type == BIN and sq >> 3 in (0, 7):
+                return _INVALID, 0, 0, 0
+
+        inside = 0
+        legal = 0
+        flags = 0
+        external_win = 0
+        external_loss = 0
+
+        def external(result: tuple[int, int]):
+            nonlocal flags, external_win, external_loss
+            code, dtm = result
+            if code == CODE_LOSS:
+                flags |= _EXTERNAL_WIN
+                external_win = dtm + 1 if not external_win else min(external_win, dtm + 1)
+            elif code == CODE_WIN:
+                external_loss = max(external_loss, dtm)
+            else:
+                flags |= _ESCAPE
+
+        if side:
+            # 强方走棋，能吃到王就赢
+            if self.strong_attacks(weak_king, occupied, strong_king, squares):
+                return 0, 0, 0, 1
+            forbidden = KING_ATTACKS[weak_king]
+            targets = KING_ATTACKS[strong_king] & ~occupied
+            # 王车易位，和 generate_moves 一样，能易位时不再生成王走到同一格的普通走法
+            castle_sq = -1
+            if strong_king == _ROW + 3 and self.rook_at(_ROW, squares) and not occupied >> _ROW + 1 & 3:
+                castle_sq = _ROW + 2
+            elif strong_king == _ROW + 5 and self.rook_at(_ROW + 7, squares) and not occupied >> _ROW + 6 & 1:
+                castle_sq = _ROW + 6
+            if castle_sq != -1:
+                targets &= ~(1 << castle_sq)
+                if not forbidden >> castle_sq & 1:
+                    legal += 1
+                    inside += 1
+            legal += (targets & ~forbidden).bit_count()
+            inside += (targets & ~forbidden).bit_count()
+            # 强方的王没有被攻击，也没有能牵制的棋子，其余棋子的走法都是合法的
+            for piece_index, chess_type in enumerate(self.pieces):
+                sq = squares[piece_index]
+                if chess_type == BIN:
+                    to_sq = sq - 8
+                    if occupied >> to_sq & 1:
+                        continue
+                    if to_sq >> 3 == 0:
+                        rest = [(self.pieces[i], squares[i]) for i in range(self.count) if i != piece_index]
+                        for promotion in _PROMOTION_TYPES:
+                            legal += 1
+                            external(self.external(0, strong_king, weak_king, rest + [(promotion, to_sq)]))
+                        continue
+                    legal += 1
+                    inside += 1
+                    if sq >> 3 == 6 and not occupied >> to_sq - 8 & 1:
+                        legal += 1
+                        inside += 1
+                else:
+                    count = (_slider_targets(chess_type, sq, occupied) & ~occupied).bit_count()
+                    legal += count
+                    inside += count
+        else:
+            # 弱方走棋，两王相邻时直接吃王；王不能送吃，强方的王有保护时只有在没有别的合法走法时才能吃
+            adjacent = KING_ATTACKS[weak_king] >> strong_king & 1
+            if adjacent and not self.strong_attacks(strong_king, occupied ^ 1 << weak_king, strong_king, squares):
+                return 0, 0, 0, 1
+            targets = KING_ATTACKS[weak_king] & ~(1 << strong_king)
+            while targets:
+                low_bit = targets & -targets
+                targets ^= low_bit
+                to_sq = low_bit.bit_length() - 1
+                captured = squares.index(to_sq) if occupied & low_bit else -1
+                after = occupied ^ 1 << weak_king | low_bit
+                if self.strong_attacks(to_sq, after, strong_king, squares, captured):
+                    continue
+                legal += 1
+                if captured == -1:
+                    inside += 1
+                else:
+                    rest = [(self.pieces[i], squares[i]) for i in range(self.count) if i != captured]
+                    external(self.external(1, strong_king, to_sq, rest))
+
+        if not legal:
+            if not side and adjacent:
+                return 0, 0, 0, 1
+            if side:
+                # 强方没有合法走法时只能把王走到弱方的王旁边，之后要看弱方能不能吃
+                inside = (KING_ATTACKS[strong_king] & ~occupied).bit_count()
+                if inside:
+                    return 0, inside, 0, 0
+            # 没有合法走法，随便走一步之后王就被吃掉
+            return flags, 0, 0, 2
+        if flags & _EXTERNAL_WIN:
+            return flags, inside, external_loss, external_win
+        if not inside and not flags & _ESCAPE:
+            # 所有走法都走到别的残局且都输
+            return flags, 0, external_loss, external_loss + 1
+        return flags, inside, external_loss, 0
+
+    def predecessors(self, index: int) -> list[int]:
+        """
+        逆走法：所有走一步能到达这个局面的本残局局面(不含吃子和升变，它们来自别的残局)
+        :return: 局面下标列表
+        """
+        side, strong_king, weak_king, squares = self.decode(index)
+        occupied = 1 << strong_king | 1 << weak_king
+        for sq in squares:
+            occupied |= 1 << sq
+        empty = ~occupied
+        encode = self.encode
+        result = []
+        if not side:
+            # 上一步是强方走的，走完后强方的王被攻击说明上一步的局面没有合法走法
+            adjacent = KING_ATTACKS[weak_king] >> strong_king & 1
+            sources = KING_ATTACKS[strong_king] & empty
+            # 上一步的局面能易位时，王走到易位格的普通走法不存在
+            if strong_king == _ROW + 2 and self.rook_at(_ROW, squares) and not occupied >> _ROW + 1 & 1:
+                sources &= ~(1 << _ROW + 3)
+            elif strong_king == _ROW + 6 and self.rook_at(_ROW + 7, squares):
+                sources &= ~(1 << _ROW + 5)
+            while sources:
+                low_bit = sources & -sources
+                sources ^= low_bit
+                king_from = low_bit.bit_length() - 1
+                if not adjacent or not self.strong_has_legal_move(king_from, weak_king, squares):
+                    result.append(encode(1, king_from, weak_king, squares))
+            # 撤销王车易位
+            for king_to, rook_from, rook_to, king_from in ((_ROW + 2, _ROW, _ROW + 3, _ROW + 3),
+                                                           (_ROW + 6, _ROW + 7, _ROW + 5, _ROW + 5)):
+                if strong_king == king_to and self.rook_at(rook_to, squares) and not occupied >> rook_from & 1:
+                    # 长易位要求原来 b、c 两格为空
+                    if rook_from == _ROW and occupied >> _ROW + 1 & 1:
+                        continue
+                    before = [rook_from if sq == rook_to and chess_type == CHE else sq
+                              for chess_type, sq in zip(self.pieces, squares)]
+                    if not adjacent or not self.strong_has_legal_move(king_from, weak_king, before):
+                        result.append(encode(1, king_from, weak_king, before))
+            if adjacent:
+                return result
+            for piece_index, chess_type in enumerate(self.pieces):
+                sq = squares[piece_index]
+                if chess_type == BIN:
+                    # 兵不会在第 7 行，所以只能从第 6 行以内退回来
+                    if sq >> 3 <= 5 and empty >> sq + 8 & 1:
+                        result.append(encode(1, strong_king, weak_king,
+                                             squares[:piece_index] + [sq + 8] + squares[piece_index + 1:]))
+                        if sq >> 3 == 4 and empty >> sq + 16 & 1:
+                            result.append(encode(1, strong_king, weak_king,
+                                                 squares[:piece_index] + [sq + 16] + squares[piece_index + 1:]))
+                    continue
+                sources = _slider_targets(chess_type, sq, occupied) & empty
+                while sources:
+                    low_bit = sources & -sources
+                    sources ^= low_bit
+                    result.append(encode(1, strong_king, weak_king,
+                                         squares[:piece_index] + [low_bit.bit_length() - 1] + squares[piece_index + 1:]))
+        else:
+            # 上一步是弱方走的，走完后弱方的王不能被攻击
+            if self.strong_attacks(weak_king, occupied, strong_king, squares):
+                return result
+            sources = KING_ATTACKS[weak_king] & empty
+            while sources:
+                low_bit = sources & -sources
+                sources ^= low_bit
+                result.append(encode(0, strong_king, low_bit.bit_length() - 1, squares))
+        return result
+
+
+# 进程池里每个进程各自的生成器
+_generator: _Generator | None = None
+
+def _init_worker(name: str, directory: str):
+    global _generator
+    _generator = _Generator(name, directory)
+
+def _analyze_chunk(bounds: tuple[int, int]) -> tuple[int, bytes, bytes, bytes, list[tuple[int, int]]]:
+    """
+    分析一段连续的局面
+    :param bounds: [起点, 终点)
+    :return: (起点, 标记, 合法走法数, 最慢输棋步数, [(局面, 步数)])
+    """
+    start, end = bounds
+    flags = bytearray(end - start)
+    remaining = bytearray(end - start)
+    external_loss = bytearray(end - start)
+    seeds = []
+    analyze = _generator.analyze
+    for index in range(start, end):
+        flag, inside, loss, seed = analyze(index)
+        offset = index - start
+        flags[offset] = flag
+        remaining[offset] = inside
+        external_loss[offset] = loss
+        if seed:
+            seeds.append((index, seed))
+    return start, bytes(flags), bytes(remaining), bytes(external_loss), seeds
+
+def _predecessor_chunk(frontier: list[int]) -> list[int]:
+    predecessors = _generator.predecessors
+    result = []
+    for index in frontier:
+        result.extend(predecessors(index))
+    return result
+
+
+def _chunks(items: list[int], size: int) -> Iterable[list[int]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _pack_codes(dtm: bytearray, flags: bytearray) -> bytes:
+    """
+    把步数转换成 2 位的胜负编码，每字节 4 个局面，低位在前。
+    胜局的步数是奇数，负局是偶数，和棋为 0
+    """
+    table = bytes([CODE_DRAW] + [CODE_WIN if value & 1 else CODE_LOSS for value in range(1, 256)])
+    codes = bytearray(dtm.translate(table))
+    invalid = flags.translate(bytes(CODE_INVALID if value & _INVALID else 0 for value in range(256)))
+    # 非法局面的步数为 0，编码为 0，按位或上非法编码即可
+    codes = (int.from_bytes(codes, 'little') | int.from_bytes(invalid, 'little')).to_bytes(len(codes), 'little')
+    # 每个字节的值不超过 3，整体左移 2、4、6 位不会溢出到相邻字节
+    packed = 0
+    for offset in range(4):
+        packed |= int.from_bytes(codes[offset::4], 'little') << offset * 2
+    return packed.to_bytes(len(codes) // 4, 'little')
+
+def generate_table(name: str, directory: str, jobs: int = 1, log: Callable[[str], None] | None = None) -> str:
+    """
+    生成一个残局文件，需要的其他残局必须已经在目录里
+    :param name: 残局名
+    :param directory: 输出目录
+    :parameter jobs: (可选) 进程数
+    :parameter log: (可选) 输出进度的函数
+    :return: 生成的文件路径
+    """
+    log = log or (lambda message: None)
+    size = table_size(len(table_pieces(name)))
+    flags = bytearray(size)
+    remaining = bytearray(size)
+    external_loss = bytearray(size)
+    dtm = bytearray(size)
+    buckets: dict[int, list[int]] = {}
+
+    pool = None
+    if jobs > 1:
+        pool = multiprocessing.get_context("spawn").Pool(jobs, initializer = _init_worker, initargs = (name, directory))
+        parallel_map = lambda func, items: pool.imap(func, items)
+    else:
+        _init_worker(name, directory)
+        parallel_map = map
+    try:
+        start_time = time.perf_counter()
+        bounds = [(start, min(start + _CHUNK_SIZE, size)) for start in range(0, size, _CHUNK_SIZE)]
+        for start, chunk_flags, chunk_remaining, chunk_loss, seeds in parallel_map(_analyze_chunk, bounds):
+            end = start + len(chunk_flags)
+            flags[start:end] = chunk_flags
+            remaining[start:end] = chunk_remaining
+            external_loss[start:end] = chunk_loss
+            for index, value in seeds:
+                buckets.setdefault(value, []).append(index)
+        log(f'{name}: 初始化 {size} 个局面，用时 {time.perf_counter() - start_time:.1f}s')
+
+        # 按步数从小到大逆推，胜局的步数是奇数，负局是偶数
+        ply = 1
+        while buckets:
+            frontier = []
+            for index in buckets.pop(ply, ()):
+                if not dtm[index]:
+                    dtm[index] = ply
+                    frontier.append(index)
+            for predecessors in parallel_map(_predecessor_chunk, _chunks(frontier, _FRONTIER_CHUNK_SIZE)):
+                for index in predecessors:
+                    if dtm[index]:
+                        continue
+                    if not ply & 1:
+                        # 能走到对方输的局面，自己赢
+                        buckets.setdefault(ply + 1, []).append(index)
+                        continue
+                    remaining[index] -= 1
+                    if not remaining[index] and not flags[index] & (_ESCAPE | _EXTERNAL_WIN):
+                        # 所有走法都走到对方赢的局面，按最慢的那一步算
+                        buckets.setdefault(max(ply, external_loss[index]) + 1, []).append(index)
+            if frontier:
+                log(f'{name}: 步数 {ply} 共 {len(frontier)} 个局面')
+            ply += 1
+            if ply > 255 and buckets:
+                raise OverflowError(f'{name} 的步数超过了 1 字节')
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        elif _generator is not None:
+            _generator.tablebase.close()
+
+    os.makedirs(directory, exist_ok = True)
+    path = os.path.join(directory, name + '.tb')
+    with open(path, 'wb') as file:
+        file.write(_HEADER.pack(_MAGIC, name.encode('ascii'), size))
+        file.write(_pack_codes(dtm, flags))
+        file.write(dtm)
+    log(f'{name}: 写入 {path}，{HEADER_SIZE + size // 4 + size} 字节，用时 {time.perf_counter() - start_time:.1f}s')
+    return path
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog = 'python -m common.engine.retrograde', description = '离线生成残局库')
+    parser.add_argument('tables', nargs = '+', choices = TABLE_NAMES, help = '要生成的残局')
+    parser.add_argument('-o', '--output', required = True, help = '输出目录')
+    parser.add_argument('-j', '--jobs', type = int, default = os.cpu_count() or 1, help = '进程数，默认为 CPU 核心数')
+    parser.add_argument('-f', '--force', action = 'store_true', help = '文件已存在时重新生成')
+    args = parser.parse_args(argv)
+
+    # 按依赖顺序排好，已经存在的文件不重新生成
+    order: list[str] = []
+    def visit(name: str):
+        if name in order:
+            return
+        for dependency in table_dependencies(name):
+            visit(dependency)
+        order.append(name)
+    for name in args.tables:
+        visit(name)
+    for name in order:
+        exists = Tablebase(args.output).has_table(name)
+        if exists and not (args.force and name in args.tables):
+            print(f'{name}: 已存在，跳过')
+            continue
+        generate_table(name, args.output, args.jobs, print)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
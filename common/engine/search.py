@@ -0,0 +1,335 @@
+"""
+人机对战用的搜索：迭代加深的负极大值 alpha-beta 搜索，
+配合置换表、MVV-LVA 吃子排序、杀手走法和历史启发来提高剪枝效率，叶子节点接只搜吃子的静态搜索
+"""
+
+import time
+from typing import Any, Callable
+
+from .position import Position, EMPTY, BIN, WANG, MOVE_LUGUO, MOVE_PROMOTION
+from .movegen import generate_moves, generate_legal_moves, generate_captures, checkers_of
+from .evaluate import evaluate, PIECE_VALUES
+from .pawns import PawnHashTable
+from .see import see
+from .transposition import TranspositionTable, BOUND_EXACT, BOUND_LOWER, BOUND_UPPER
+
+__all__ = [
+    "Searcher", "MATE", "MATE_BOUND", "MAX_DEPTH",
+]
+
+# 吃王的分数，分数越接近它说明越快吃王
+MATE = 30000
+# 绝对值超过它的分数都是吃王分
+MATE_BOUND = MATE - 1000
+INFINITE = 32000
+# 迭代加深的最大深度，也是杀手走法表的长度
+MAX_DEPTH = 64
+# 每搜索这么多个节点检查一次时间
+_CHECK_INTERVAL = 1023
+
+# 走法排序的分数段，从高到低依次为 置换表走法、吃子、升变、杀手走法、历史分
+_ORDER_TT = 1 << 30
+_ORDER_CAPTURE = 1 << 24
+_ORDER_PROMOTION = 1 << 23
+_ORDER_KILLER = 1 << 22
+
+
+class _SearchTimeout(Exception):
+    """
+    时间用完时抛出，用来一次性退出整棵搜索树
+    """
+
+
+def _score_to_tt(score: int, ply: int) -> int:
+    """
+    吃王分存进置换表前换算成相对当前节点的距离，这样从别的路径查到时依旧准确
+    """
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+def _score_from_tt(score: int, ply: int) -> int:
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class Searcher:
+    """
+    搜索器，置换表、杀手走法和历史分在多次搜索之间保留，同一局棋里复用一个实例即可
+    """
+    def __init__(self, tt_mb: int | None = None, tt: TranspositionTable | None = None, stop_event: Any = None,
+                 pawn_mb: float | None = None):
+        """
+        创建搜索器
+        :parameter tt_mb: (可选) 置换表占用的内存，默认读取配置文件里的 tt_mb
+        :parameter tt: (可选) 使用已有的置换表，比如多个进程共享的置换表，此时忽略 tt_mb
+        :parameter stop_event: (可选) threading 或 multiprocessing 的 Event，被 set 后搜索会尽快结束
+        :parameter pawn_mb: (可选) 兵型表占用的内存，默认读取配置文件里的 pawn_hash_mb
+        """
+        self.tt = tt if tt is not None else TranspositionTable(tt_mb)
+        # 兵型表不随新开一局清空，兵型的分数和对局无关
+        self.pawn_table = PawnHashTable(pawn_mb)
+        self.stop_event = stop_event
+        # 每层两个杀手走法：在兄弟节点上造成过剪枝的非吃子走法
+        self.killers: list[list[int]] = [[0, 0] for _ in range(MAX_DEPTH + 16)]
+        # 历史分，下标为 [棋子编号][终点]
+        self.history: list[list[int]] = [[0] * 64 for _ in range(12)]
+        # 本次搜索的节点数
+        self.nodes = 0
+        # 本次搜索的截止时间
+        self.stop_time = 0.0
+        # 本次搜索是否按标准规则，无路可走且没被将军时是逼和
+        self.standard_rules = False
+
+    def clear(self):
+        """
+        新开一局时清空所有记录
+        :return:
+        """
+        self.tt.clear()
+        self.killers = [[0, 0] for _ in range(MAX_DEPTH + 16)]
+        self.history = [[0] * 64 for _ in range(12)]
+
+    def search(self, position: Position, time_limit: float = 1.0, max_depth: int = MAX_DEPTH,
+               on_iteration: Callable[[int, int, int, int], None] | None = None,
+               min_depth: int = 1, standard_rules: bool = False) -> tuple[int, int, int]:
+        """
+        迭代加深搜索，时间用完或者 stop_event 被 set 时返回最后一次完整搜索的结果
+        :param position: 局面，不会被修改
+        :parameter time_limit: (可选) 思考时间，单位秒
+        :parameter max_depth: (可选) 最大深度
+        :parameter on_iteration: (可选) 每完成一层时调用，参数为 (深度, 分数, 最佳走法, 节点数)
+        :parameter min_depth: (可选) 从第几层开始迭代，并行搜索的辅助进程用它错开深度
+        :parameter standard_rules: (可选) 为 True 时按标准规则搜索，逼和算和棋，默认无路可走时只能送吃
+        :return: (最佳走法, 以走棋方视角的分数, 完成的深度)，没有走法时最佳走法为 0
+        """
+        # 超时会直接跳出搜索树，来不及撤销走法，所以在副本上搜索
+        position = position.copy()
+        start_time = time.perf_counter()
+        self.stop_time = start_time + time_limit
+        self.nodes = 0
+        self.standard_rules = standard_rules
+        self.tt.new_search()
+        # 历史分逐渐衰减，让新局面的信息占主导
+        for row in self.history:
+            for sq in range(64):
+                row[sq] >>= 3
+        for killers in self.killers:
+            killers[0] = killers[1] = 0
+
+        moves = generate_legal_moves(position)
+        if not moves:
+            # 无路可走时只能送吃，随便走一步
+            moves = generate_moves(position)
+            return (moves[0] if moves else 0), -MATE, 0
+        best_move, best_score, finished_depth = moves[0], 0, 0
+        for depth in range(min(min_depth, max_depth), max_depth + 1):
+            try:
+                score, move = self._search_root(position, moves, depth)
+            except _SearchTimeout:
+                break
+            best_move, best_score, finished_depth = move, score, depth
+            # 最佳走法排到最前面，下一层先搜它
+            moves.remove(move)
+            moves.insert(0, move)
+            if on_iteration is not None:
+                on_iteration(depth, score, move, self.nodes)
+            # 已经找到吃王的走法，或者剩下的时间不够再搜一层
+            if abs(score) > MATE_BOUND or time.perf_counter() - start_time > time_limit / 2:
+                break
+        return best_move, best_score, finished_depth
+
+    def _search_root(self, position: Position, moves: list[int], depth: int) -> tuple[int, int]:
+        """
+        根节点搜索，走法顺序由上一层的结果决定
+        :return: (分数, 最佳走法)
+        """
+        alpha = -INFINITE
+        best_move = moves[0]
+        for index, move in enumerate(moves):
+            undo = position.make_move(move)
+            if index == 0:
+                score = -self._negamax(position, depth - 1, -INFINITE, -alpha, 1, True)
+            else:
+                score = -self._negamax(position, depth - 1, -alpha - 1, -alpha, 1, True)
+                if score > alpha:
+                    score = -self._negamax(position, depth - 1, -INFINITE, -alpha, 1, True)
+            position.unmake_move(undo)
+            if score > alpha:
+                alpha = score
+                best_move = move
+        self.tt.store(position.hash, best_move, alpha, depth, BOUND_EXACT)
+        return alpha, best_move
+
+    def _negamax(self, position: Position, depth: int, alpha: int, beta: int, ply: int, allow_null: bool) -> int:
+        """
+        负极大值 alpha-beta 搜索
+        :param position: 局面
+        :param depth: 剩余深度
+        :param alpha: 下界
+        :param beta: 上界
+        :param ply: 距离根节点的步数
+        :param allow_null: 是否允许空着裁剪，连续两步空着没有意义
+        :return: 以走棋方视角的分数
+        """
+        self.nodes += 1
+        if not self.nodes & _CHECK_INTERVAL and (
+            time.perf_counter() > self.stop_time or self.stop_event is not None and self.stop_event.is_set()):
+            raise _SearchTimeout()
+
+        key = position.hash
+        pv_node = beta - alpha > 1
+        tt_move = 0
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_move, tt_score, tt_depth, bound = entry
+            if not pv_node and tt_depth >= depth:
+                tt_score = _score_from_tt(tt_score, ply)
+                if (bound == BOUND_EXACT or
+                    bound == BOUND_LOWER and tt_score >= beta or
+                    bound == BOUND_UPPER and tt_score <= alpha):
+                    return tt_score
+
+        in_check = checkers_of(position) != 0
+        # 被将军时多搜一层，避免把应将的局面留给静态评估
+        if in_check:
+            depth += 1
+        if depth <= 0 or ply >= MAX_DEPTH:
+            return self._quiescence(position, alpha, beta, ply)
+
+        # 空着裁剪：让对方连走两步都占不到便宜，说明这里分数足够高
+        side = position.side
+        if (allow_null and not pv_node and not in_check and depth >= 3 and
+            position.occupancy[side] ^ position.bitboards[side * 6 + BIN] ^ position.bitboards[side * 6 + WANG]):
+            position.make_null_move()
+            score = -self._negamax(position, depth - 3, -beta, -beta + 1, ply + 1, False)
+            position.unmake_null_move()
+            if score >= beta and score < MATE_BOUND:
+                return beta
+
+        moves = generate_legal_moves(position)
+        if not moves:
+            # 标准规则下没被将军就是逼和
+            if self.standard_rules and not in_check:
+                return 0
+            # 无路可走只能送吃，下一步就会被吃王
+            return -MATE + ply
+
+        board = position.board
+        killers = self.killers[ply]
+        history = self.history
+        scored_moves = []
+        for move in moves:
+            to_sq = move >> 6 & 63
+            victim = board[to_sq]
+            if move == tt_move:
+                order = _ORDER_TT
+            elif victim != EMPTY:
+                # MVV-LVA：先吃价值高的棋子，同样的目标先用价值低的棋子去吃
+                order = _ORDER_CAPTURE + victim % 6 * 8 - board[move & 63] % 6
+            elif move >> 12 == MOVE_LUGUO:
+                order = _ORDER_CAPTURE
+            elif move >> 12 >= MOVE_PROMOTION:
+                order = _ORDER_PROMOTION + (move >> 12)
+            elif move == killers[0]:
+                order = _ORDER_KILLER + 1
+            elif move == killers[1]:
+                order = _ORDER_KILLER
+            else:
+                order = min(history[board[move & 63]][to_sq], _ORDER_KILLER - 1)
+            scored_moves.append((order, move))
+        scored_moves.sort(reverse = True)
+
+        best_score = -INFINITE
+        best_move = 0
+        original_alpha = alpha
+        for index, (order, move) in enumerate(scored_moves):
+            quiet = board[move >> 6 & 63] == EMPTY and move >> 12 != MOVE_LUGUO and move >> 12 < MOVE_PROMOTION
+            undo = position.make_move(move)
+            if index == 0:
+                score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1, True)
+            else:
+                # 排在后面的安静走法大概率不好，先少搜一层
+                reduction = 1 if depth >= 3 and index >= 4 and quiet and order < _ORDER_KILLER and not in_check else 0
+                score = -self._negamax(position, depth - 1 - reduction, -alpha - 1, -alpha, ply + 1, True)
+                if score > alpha and (reduction or score < beta):
+                    score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1, True)
+            position.unmake_move(undo)
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if score >= beta:
+                        # 安静走法造成剪枝时记为杀手走法，并增加历史分
+                        if quiet:
+                            if killers[0] != move:
+                                killers[1] = killers[0]
+                                killers[0] = move
+                            history[board[move & 63]][move >> 6 & 63] += depth * depth
+                        break
+
+        if best_score >= beta:
+            bound = BOUND_LOWER
+        elif best_score > original_alpha:
+            bound = BOUND_EXACT
+        else:
+            bound = BOUND_UPPER
+        self.tt.store(key, best_move, _score_to_tt(best_score, ply), depth, bound)
+        return best_score
+
+    def _quiescence(self, position: Position, alpha: int, beta: int, ply: int) -> int:
+        """
+        静态搜索：只搜索吃子和升变，等局面平静下来再评估，避免吃子吃到一半就停下造成的水平线效应。
+        SEE 为负的吃子直接跳过
+        :param position: 局面
+        :param alpha: 下界
+        :param beta: 上界
+        :param ply: 距离根节点的步数
+        :return: 以走棋方视角的分数
+        """
+        self.nodes += 1
+        if not self.nodes & _CHECK_INTERVAL and (
+            time.perf_counter() > self.stop_time or self.stop_event is not None and self.stop_event.is_set()):
+            raise _SearchTimeout()
+
+        # 王已经被吃掉
+        if not position.bitboards[position.side * 6 + WANG]:
+            return -MATE + ply
+        # 不吃子时的分数，吃子只会让分数更高才去吃
+        best_score = evaluate(position, self.pawn_table)
+        if best_score >= beta or ply >= MAX_DEPTH:
+            return best_score
+        if best_score > alpha:
+            alpha = best_score
+
+        board = position.board
+        scored_moves = []
+        for move in generate_captures(position):
+            victim = board[move >> 6 & 63]
+            attacker = board[move & 63]
+            # 吃过路兵和直接升变时目标格为空，按吃兵算
+            victim_type = victim % 6 if victim != EMPTY else BIN
+            # 用便宜的棋子吃贵的棋子不可能亏，不需要算 SEE
+            if PIECE_VALUES[victim_type] < PIECE_VALUES[attacker % 6] and see(position, move) < 0:
+                continue
+            scored_moves.append((victim_type * 8 - attacker % 6, move))
+        scored_moves.sort(reverse = True)
+
+        for _, move in scored_moves:
+            undo = position.make_move(move)
+            score = -self._quiescence(position, -beta, -alpha, ply + 1)
+            position.unmake_move(undo)
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    if score >= beta:
+                        break
+                    alpha = score
+        return best_score
@@ -0,0 +1,69 @@
+"""
+静态交换评估(SEE)：不搜索，只用攻击表算出双方在同一个格子上轮流用最便宜的棋子互吃，最后谁赚谁亏
+"""
+
+from .position import Position, EMPTY, BIN, WANG, MOVE_LUGUO, MOVE_PROMOTION, promotion_type
+from .movegen import attackers_to
+from .evaluate import PIECE_VALUES
+
+__all__ = [
+    "see",
+]
+
+
+def see(position: Position, move: int) -> int:
+    """
+    计算一步吃子之后，双方在目标格上互相兑换到底的子力得失。
+    每次都用最便宜的棋子去吃，任何一方都可以在亏本之前停手；
+    挡在后面的车、象、后会在前面的棋子吃掉后加入(X 光攻击)
+    :param position: 局面，不会被修改
+    :param move: 走法整数，不是吃子时只计算走过去会不会被白吃
+    :return: 以走棋方视角的得失，大于 0 为赚，等于 0 为兑换，小于 0 为亏
+    """
+    from_sq = move & 63
+    to_sq = move >> 6 & 63
+    kind = move >> 12
+    board = position.board
+    bitboards = position.bitboards
+    occupancy = position.occupancy
+    occupied = position.occupied ^ 1 << from_sq
+
+    if kind == MOVE_LUGUO:
+        # 被吃的兵不在目标格上，而在同一行的旁边
+        occupied ^= 1 << (from_sq & ~7 | to_sq & 7)
+        gain = [PIECE_VALUES[BIN]]
+    else:
+        victim = board[to_sq]
+        gain = [PIECE_VALUES[victim % 6] if victim != EMPTY else 0]
+    # 目标格上现在站着的棋子的价值，也就是下一个吃回来的人能得到的
+    on_square = PIECE_VALUES[board[from_sq] % 6]
+    if kind >= MOVE_PROMOTION:
+        on_square = PIECE_VALUES[promotion_type(move)]
+        gain[0] += on_square - PIECE_VALUES[BIN]
+
+    side = position.side ^ 1
+    attackers = (attackers_to(position, to_sq, 0, occupied) | attackers_to(position, to_sq, 1, occupied)) & occupied
+    while True:
+        side_attackers = attackers & occupancy[side]
+        if not side_attackers:
+            break
+        # 找出最便宜的进攻棋子
+        base = side * 6
+        for chess_type in range(BIN, WANG + 1):
+            candidates = side_attackers & bitboards[base + chess_type]
+            if candidates:
+                break
+        # 吃下去和停手都是亏的，结果的正负已经确定，提前结束
+        if max(-gain[-1], on_square - gain[-1]) < 0:
+            break
+        gain.append(on_square - gain[-1])
+        occupied ^= candidates & -candidates
+        on_square = PIECE_VALUES[chess_type]
+        # 移走一个棋子后，后面的滑动棋子可能露出来
+        attackers = (attackers_to(position, to_sq, 0, occupied) | attackers_to(position, to_sq, 1, occupied)) & occupied
+        side ^= 1
+
+    # 从最后一次吃子倒推，每一方都会在吃亏前停手
+    for index in range(len(gain) - 1, 0, -1):
+        gain[index - 1] = -max(-gain[index - 1], gain[index])
+    return gain[0]
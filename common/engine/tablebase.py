@@ -0,0 +1,229 @@
+"""
+残局库：王加一两个子对单王的残局(KQK、KRK、KPK、KBNK 以及生成它们时用到的 KBK、KNK)，
+每个局面都存了胜负和距离吃王的步数，查到的结果是精确的，不需要搜索。
+
+文件由 common.engine.retrograde 离线生成，格式为：
+    文件头(魔数, 残局名, 局面数)
+    胜负表，每个局面 2 位，依次为 和、胜、负、非法局面，以走棋方视角
+    步数表，每个局面 1 字节，是胜负确定之后到吃掉对方王为止的半回合数，和棋为 0
+读取时用 mmap 映射整个文件，只有查到的页才会被读进内存。
+
+残局里只有一方有王以外的棋子(强方)，文件里的强方统一为 P2，P1 为强方时把棋盘上下翻转再查
+"""
+
+import mmap
+import os
+import struct
+
+from .position import Position, EMPTY, BIN, MA, XIANG, CHE, HOU, WANG
+from .movegen import generate_moves, generate_legal_moves
+from .attacks import KING_ATTACKS
+from .search import MATE
+
+__all__ = [
+    "Tablebase", "WDL_WIN", "WDL_DRAW", "WDL_LOSS",
+    "TABLE_NAMES", "table_name", "table_pieces", "table_index", "table_size",
+]
+
+# 胜负，以走棋方视角
+WDL_WIN = 1
+WDL_DRAW = 0
+WDL_LOSS = -1
+
+# 文件里的胜负编码
+CODE_DRAW = 0
+CODE_WIN = 1
+CODE_LOSS = 2
+CODE_INVALID = 3
+_CODE_TO_WDL = (WDL_DRAW, WDL_WIN, WDL_LOSS)
+
+# 文件头：魔数, 残局名, 局面数
+_HEADER = struct.Struct('<4s8sQ')
+HEADER_SIZE = _HEADER.size
+_MAGIC = b'CTB1'
+
+# 残局名里棋子的写法和顺序，同一个残局的棋子总是按这个顺序排列
+_PIECE_LETTERS = {HOU: 'Q', CHE: 'R', XIANG: 'B', MA: 'N', BIN: 'P'}
+_PIECE_ORDER = (HOU, CHE, XIANG, MA, BIN)
+_LETTER_PIECES = {letter: chess_type for chess_type, letter in _PIECE_LETTERS.items()}
+
+# 支持生成的残局
+TABLE_NAMES = ('KQK', 'KRK', 'KPK', 'KBNK', 'KBK', 'KNK')
+
+
+def table_name(pieces: tuple[int, ...]) -> str:
+    """
+    由强方王以外的棋子得到残局名
+    :param pieces: 棋子类型，按 _PIECE_ORDER 排好序
+    :return: 残局名，比如 (XIANG, MA) 为 KBNK
+    """
+    return 'K' + ''.join(_PIECE_LETTERS[chess_type] for chess_type in pieces) + 'K'
+
+def table_pieces(name: str) -> tuple[int, ...]:
+    """
+    由残局名得到强方王以外的棋子
+    :param name: 残局名
+    :return: 棋子类型
+    """
+    if len(name) < 2 or name[0] != 'K' or name[-1] != 'K' or any(letter not in _LETTER_PIECES for letter in name[1:-1]):
+        raise ValueError(f'不认识的残局名：{name}')
+    pieces = tuple(_LETTER_PIECES[letter] for letter in name[1:-1])
+    if pieces != tuple(sorted(pieces, key = _PIECE_ORDER.index)):
+        raise ValueError(f'残局名里棋子的顺序应为 QRBNP：{name}')
+    return pieces
+
+def table_size(piece_count: int) -> int:
+    """
+    残局的局面数，也就是下标的范围
+    :param piece_count: 王以外的棋子数
+    :return: 局面数
+    """
+    return 2 << 6 * (piece_count + 2)
+
+def table_index(side: int, strong_king: int, weak_king: int, squares: list[int] | tuple[int, ...]) -> int:
+    """
+    局面在残局文件里的下标：走棋方、强方王、弱方王和其余棋子的格子依次占 1、6、6、6… 位
+    :param side: 走棋方，1 为强方
+    :param strong_king: 强方王的格子
+    :param weak_king: 弱方王的格子
+    :param squares: 强方其余棋子的格子，和残局名里的顺序一致
+    :return: 下标
+    """
+    index = (side << 6 | strong_king) << 6 | weak_king
+    for sq in squares:
+        index = index << 6 | sq
+    return index
+
+def bare_kings_result(side: int, strong_king: int, weak_king: int) -> tuple[int, int]:
+    """
+    只剩两个王的局面：两王相邻时走棋方直接吃王，否则和棋
+    :return: (文件里的胜负编码, 步数)
+    """
+    if KING_ATTACKS[strong_king] >> weak_king & 1:
+        return CODE_WIN, 1
+    return CODE_DRAW, 0
+
+
+class Tablebase:
+    """
+    只读的残局库，按需打开目录里的残局文件，没有的残局查不到结果
+    """
+    def __init__(self, directory: str):
+        """
+        打开残局库
+        :param directory: 残局文件所在的目录，文件名为 残局名.tb
+        """
+        self.directory = directory
+        # 残局名: (映射, 局面数)，打不开的残局记为 None，避免每次都去找文件
+        self.tables: dict[str, tuple[mmap.mmap, int] | None] = {}
+
+    def _table(self, name: str) -> tuple[mmap.mmap, int] | None:
+        if name in self.tables:
+            return self.tables[name]
+        table = None
+        path = os.path.join(self.directory, name + '.tb')
+        if os.path.isfile(path) and os.path.getsize(path) >= HEADER_SIZE:
+            with open(path, 'rb') as file:
+                data = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+            magic, _, count = _HEADER.unpack_from(data)
+            if magic == _MAGIC and len(data) == HEADER_SIZE + count // 4 + count:
+                table = (data, count)
+            else:
+                data.close()
+        self.tables[name] = table
+        return table
+
+    def has_table(self, name: str) -> bool:
+        return self._table(name) is not None
+
+    def lookup(self, name: str, index: int) -> tuple[int, int] | None:
+        """
+        按下标读取残局文件
+        :param name: 残局名
+        :param index: 局面下标，见 table_index
+        :return: (文件里的胜负编码, 步数)，没有这个残局文件时返回 None
+        """
+        table = self._table(name)
+        if table is None:
+            return None
+        data, count = table
+        code = data[HEADER_SIZE + (index >> 2)] >> (index & 3) * 2 & 3
+        return code, data[HEADER_SIZE + count // 4 + index]
+
+    def probe(self, position: Position) -> tuple[int, int] | None:
+        """
+        查询局面的胜负
+        :param position: 局面
+        :return: (胜负, 步数)，胜负为 WDL_WIN、WDL_DRAW、WDL_LOSS 之一，以走棋方视角；
+                 步数为到吃王为止的半回合数，和棋为 0；局面不在残局库里时返回 None
+        """
+        bitboards = position.bitboards
+        kings = (bitboards[WANG], bitboards[6 + WANG])
+        if not kings[0] or not kings[1]:
+            return None
+        others = (position.occupancy[0] ^ kings[0], position.occupancy[1] ^ kings[1])
+        if others[0] and others[1]:
+            return None
+        strong = 0 if others[0] else 1
+        # 文件里的强方是 P2，P1 为强方时上下翻转
+        flip = 0 if strong else 56
+        side = 1 if position.side == strong else 0
+        strong_king = position.king_square(strong) ^ flip
+        weak_king = position.king_square(strong ^ 1) ^ flip
+
+        pieces = []
+        board = position.board
+        remaining = others[strong]
+        while remaining:
+            low_bit = remaining & -remaining
+            remaining ^= low_bit
+            sq = low_bit.bit_length() - 1
+            pieces.append((_PIECE_ORDER.index(board[sq] % 6), sq ^ flip))
+        if not pieces:
+            code, dtm = bare_kings_result(side, strong_king, weak_king)
+            return _CODE_TO_WDL[code], dtm
+        pieces.sort()
+        name = table_name(tuple(_PIECE_ORDER[order] for order, _ in pieces))
+        result = self.lookup(name, table_index(side, strong_king, weak_king, [sq for _, sq in pieces]))
+        if result is None or result[0] == CODE_INVALID:
+            return None
+        return _CODE_TO_WDL[result[0]], result[1]
+
+    def best_move(self, position: Position) -> tuple[int, int]:
+        """
+        用残局库选出最好的一步：能赢时选最快吃王的走法，和棋时保住和棋，输棋时拖得最久
+        :param position: 局面，查询过程中会走棋再撤销，结束后不变
+        :return: (走法, 分数)，分数和搜索的杀棋分一致；局面或走完后的局面不在残局库里时返回 (0, 0)
+        """
+        if self.probe(position) is None:
+            return 0, 0
+        # 没有合法走法时只能走伪合法走法，和 Searcher 一致
+        moves = generate_legal_moves(position) or generate_moves(position)
+        best_move, best_key, best_score = 0, None, 0
+        board = position.board
+        for move in moves:
+            target = board[move >> 6 & 63]
+            if target != EMPTY and target % 6 == WANG:
+                return move, MATE - 1
+            undo = position.make_move(move)
+            result = self.probe(position)
+            position.unmake_move(undo)
+            if result is None:
+                return 0, 0
+            wdl, dtm = result
+            # 走完之后是对方走棋，对方输就是自己赢
+            if wdl == WDL_LOSS:
+                key, score = (2, -dtm), MATE - dtm - 1
+            elif wdl == WDL_DRAW:
+                key, score = (1, 0), 0
+            else:
+                key, score = (0, dtm), -(MATE - dtm - 1)
+            if best_key is None or key > best_key:
+                best_move, best_key, best_score = move, key, score
+        return best_move, best_score
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table[0].close()
+        self.tables.clear()
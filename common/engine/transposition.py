@@ -0,0 +1,151 @@
+"""
+置换表，所有条目挤在一块预先分配好的 bytearray 里，占用内存只由 config.json 的 tt_mb 决定，
+也可以放进 shared_memory 让多个搜索进程共用
+"""
+
+import struct
+
+__all__ = [
+    "TranspositionTable", "table_bytes",
+    "BOUND_NONE", "BOUND_EXACT", "BOUND_LOWER", "BOUND_UPPER",
+]
+
+# 分数的边界类型，存在条目最后一个字节的低 2 位
+BOUND_NONE = 0
+BOUND_EXACT = 1 # 精确值
+BOUND_LOWER = 2 # 发生剪枝，真实分数 >= 存储的分数
+BOUND_UPPER = 3 # 没有走法超过 alpha，真实分数 <= 存储的分数
+
+# 条目格式：校验(8) 数据(8)，共 16 字节。数据的低位到高位依次为 走法(16) 分数(16) 深度(8) 边界与代数(8)，
+# 校验 = 哈希 ^ 数据，多个进程共用一张表时，被同时写坏的条目对不上校验，会被当作没有记录
+_ENTRY = struct.Struct('<QQ')
+ENTRY_SIZE = _ENTRY.size
+# 每个桶两个条目：第一个按深度优先替换，第二个总是替换
+BUCKET_SIZE = ENTRY_SIZE * 2
+# 代数占最后一个字节的高 6 位
+_GENERATION_MASK = 0xFC
+
+
+def _unpack_data(data: int) -> tuple[int, int, int, int]:
+    """
+    拆开条目的数据部分
+    :return: (走法, 分数, 深度, 边界与代数)
+    """
+    score = data >> 16 & 0xFFFF
+    depth = data >> 32 & 0xFF
+    return data & 0xFFFF, score - 0x10000 if score & 0x8000 else score, depth - 0x100 if depth & 0x80 else depth, data >> 40
+
+
+def _bucket_count(size: int) -> int:
+    # 桶的数量取 2 的幂，用位与代替取模
+    bucket_count = 1
+    while bucket_count * 2 * BUCKET_SIZE <= size:
+        bucket_count *= 2
+    return bucket_count
+
+def table_bytes(size_mb: int) -> int:
+    """
+    计算置换表实际占用的字节数，创建共享内存时使用
+    :param size_mb: 占用的内存上限，单位 MB
+    :return: 字节数
+    """
+    return _bucket_count(max(size_mb, 1) * 1024 * 1024) * BUCKET_SIZE
+
+
+class TranspositionTable:
+    """
+    固定大小的置换表，相同哈希的局面直接复用搜索结果。
+    条目用 struct 打包进 bytearray，不会像 {哈希: 元组} 的字典那样随着分析时间越长越占内存
+    """
+    def __init__(self, size_mb: int | None = None, buffer: memoryview | None = None):
+        """
+        创建置换表
+        :parameter size_mb: (可选) 占用的内存，单位 MB，默认读取配置文件里的 tt_mb
+        :parameter buffer: (可选) 使用外部的内存，比如多个进程共享的 shared_memory，此时忽略 size_mb
+        """
+        if buffer is None:
+            if size_mb is None:
+                # 用到时再导入，局面模型本身不依赖配置文件和 tkinter
+                from common.config import get_config
+                size_mb = get_config("tt_mb")
+            buffer = bytearray(table_bytes(size_mb))
+        bucket_count = _bucket_count(len(buffer))
+        self.mask = bucket_count - 1
+        self.data = buffer if len(buffer) == bucket_count * BUCKET_SIZE else memoryview(buffer)[:bucket_count * BUCKET_SIZE]
+        # 当前搜索的代数，旧搜索留下的条目会被优先替换
+        self.generation = 0
+
+    @property
+    def size_mb(self) -> float:
+        return len(self.data) / 1024 / 1024
+
+    def new_search(self):
+        """
+        开始新一轮搜索时调用，让上一轮的深层条目也可以被替换
+        :return:
+        """
+        self.generation = (self.generation + 4) & _GENERATION_MASK
+
+    def clear(self):
+        """
+        清空所有条目，新开一局时调用
+        :return:
+        """
+        self.data[:] = bytes(len(self.data))
+        self.generation = 0
+
+    def probe(self, key: int) -> tuple[int, int, int, int] | None:
+        """
+        查询局面
+        :param key: 局面的 Zobrist 哈希
+        :return: (走法, 分数, 深度, 边界类型)，没有记录时返回 None
+        """
+        offset = (key & self.mask) * BUCKET_SIZE
+        for entry_offset in (offset, offset + ENTRY_SIZE):
+            check, data = _ENTRY.unpack_from(self.data, entry_offset)
+            if check ^ data == key and data >> 40 & 3:
+                move, score, depth, flags = _unpack_data(data)
+                return move, score, depth, flags & 3
+        return None
+
+    def store(self, key: int, move: int, score: int, depth: int, bound: int):
+        """
+        写入搜索结果。
+        同一局面或者深度不低于原条目、原条目来自旧的搜索时写入深度优先的槽位，否则写入总是替换的槽位
+        :param key: 局面的 Zobrist 哈希
+        :param move: 最佳走法，没有时传 0
+        :param score: 分数，必须在 -32768 ~ 32767 之间
+        :param depth: 剩余搜索深度
+        :param bound: 边界类型
+        :return:
+        """
+        table = self.data
+        offset = (key & self.mask) * BUCKET_SIZE
+        check, data = _ENTRY.unpack_from(table, offset)
+        same_key = check ^ data == key
+        _, _, old_depth, flags = _unpack_data(data)
+        if same_key or depth >= old_depth or flags & _GENERATION_MASK != self.generation:
+            # 同一局面这次没有走法时保留原来的走法，给走法排序用
+            if same_key and not move:
+                move = data & 0xFFFF
+        else:
+            offset += ENTRY_SIZE
+            check, data = _ENTRY.unpack_from(table, offset)
+            if check ^ data == key and not move:
+                move = data & 0xFFFF
+        data = (move | (score & 0xFFFF) << 16 | (max(-128, min(depth, 127)) & 0xFF) << 32
+                | (self.generation | bound) << 40)
+        _ENTRY.pack_into(table, offset, key ^ data, data)
+
+    def hashfull(self) -> int:
+        """
+        抽样估计本轮搜索写入的条目占比，和 UCI 的 hashfull 一样按千分比计
+        :return: 0 ~ 1000
+        """
+        sample = min(1000, len(self.data) // ENTRY_SIZE)
+        used = 0
+        for index in range(sample):
+            flags = self.data[index * ENTRY_SIZE + 13]
+            if flags & 3 and flags & _GENERATION_MASK == self.generation:
+                used += 1
+        return used * 1000 // sample
@@ -0,0 +1,291 @@
+"""
+UCI 引擎适配器：通过标准输入输出和本机安装的 UCI 引擎(可执行文件或 Python 脚本)对话。
+引擎进程只在第一次使用时启动一次，之后每步棋只发 position 和 go，不会每步重新开进程；
+收发消息用 asyncio 的子进程管道，事件循环跑在单独的线程里，不会卡住 game.py 的主循环。
+
+用法和 EngineWorker 一样：go 立即返回，结果以同样格式的字典交给 on_result 回调，
+回调运行在事件循环的线程里，界面上一般用 event_manager.post_event 转交给主循环处理。
+
+外部引擎按标准国际象棋思考，和本项目的规则不完全一致：本项目的王车易位只看几何位置，
+过路兵在它再次移动前一直可以被吃，所以发给引擎的 FEN 里不带易位权利，过路兵只在唯一时才带上。
+引擎给出的走法在本项目里不合法时，结果里的走法为 0，由调用方决定怎么处理
+"""
+
+import asyncio
+import atexit
+import shlex
+import threading
+from typing import Any, Callable
+
+from .position import Position, move_name, TOWARD, side_of, square_name
+from .movegen import generate_moves, generate_legal_moves
+from .search import MATE
+
+__all__ = [
+    "UciEngine", "uci_fen", "parse_uci_move",
+]
+
+# 等待引擎握手(uciok、readyok)的时间上限，单位秒
+_HANDSHAKE_TIMEOUT = 10.0
+# 叫停或退出后等待引擎响应的时间上限，单位秒
+_STOP_TIMEOUT = 2.0
+
+
+def uci_fen(position: Position, halfmove_clock: int = 0, fullmove: int = 1) -> str:
+    """
+    导出给外部引擎的标准 FEN：不带易位权利，可被吃的过路兵只有一个时才写上目标格
+    :param position: 局面
+    :parameter halfmove_clock: (可选) 距离上次吃子或动兵的半回合数
+    :parameter fullmove: (可选) 回合数，从 1 开始
+    :return: FEN 字符串
+    """
+    board_field, side_field = position.to_fen().split()[:2]
+    # 只有对方的兵能被走棋方吃过路兵
+    ep_pawns = position.ep_pawns & position.occupancy[position.side ^ 1]
+    ep_field = '-'
+    if ep_pawns and not ep_pawns & ep_pawns - 1:
+        pawn_sq = ep_pawns.bit_length() - 1
+        ep_field = square_name(pawn_sq - TOWARD[side_of(position.board[pawn_sq])] * 8)
+    return f'{board_field} {side_field} - {ep_field} {halfmove_clock} {fullmove}'
+
+def parse_uci_move(position: Position, text: str) -> int:
+    """
+    把引擎给出的坐标记号转换为本项目的走法整数
+    :param position: 走棋前的局面
+    :param text: 坐标记号，比如 e2e4、e7e8q
+    :return: 走法整数，在本项目的规则下不合法时返回 0
+    """
+    if len(text) < 4:
+        return 0
+    # 没有合法走法时只能送吃，和搜索器一致
+    moves = generate_legal_moves(position) or generate_moves(position)
+    text = text.lower()
+    for move in moves:
+        if move_name(move).lower() == text:
+            return move
+    return 0
+
+
+class UciEngine:
+    """
+    外部 UCI 引擎的句柄，接口和 EngineWorker 一致，可以互相替换
+    """
+    def __init__(self, command: str | list[str], on_result: Callable[[dict[str, Any]], None],
+                 options: dict[str, Any] | None = None):
+        """
+        创建引擎句柄，进程在第一次使用时才启动
+        :param command: 启动引擎的命令行，字符串会按 shell 的规则拆分，比如 "python my_engine.py"
+        :param on_result: 收到搜索结果时调用，参数为结果字典
+        :parameter options: (可选) 握手后用 setoption 设置的引擎选项，比如 {"Threads": 2, "Hash": 64}
+        """
+        self.command = shlex.split(command) if isinstance(command, str) else list(command)
+        self.on_result = on_result
+        self.options = options or {}
+        # 引擎在握手时报告的名字
+        self.name = self.command[0] if self.command else ''
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.process: asyncio.subprocess.Process | None = None
+        # 同一时间只有一个搜索，新的请求要等上一次的 bestmove 回来
+        self.lock: asyncio.Lock | None = None
+        # 正在搜索时为 True，这时才需要发 stop
+        self.searching = False
+        # 启动失败的原因，失败后不再重试
+        self.error: str | None = None
+        atexit.register(self.close)
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    def _ensure_loop(self):
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            threading.Thread(target = self.loop.run_forever, name = "UciEngine", daemon = True).start()
+
+    def _submit(self, coroutine) -> 'asyncio.Future':
+        self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def _send(self, line: str):
+        self.process.stdin.write((line + '\n').encode())
+        await self.process.stdin.drain()
+
+    async def _read_until(self, prefix: str, timeout: float | None = None) -> list[str]:
+        """
+        一直读到以 prefix 开头的一行
+        :return: 读到的所有行，最后一行以 prefix 开头
+        """
+        lines = []
+        while True:
+            raw = await asyncio.wait_for(self.process.stdout.readline(), timeout)
+            if not raw:
+                raise ConnectionError('引擎已退出')
+            line = raw.decode(errors = 'replace').strip()
+            lines.append(line)
+            if line.startswith(prefix):
+                return lines
+
+    async def _start(self) -> bool:
+        if self.running:
+            return True
+        if self.error is not None:
+            return False
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                *self.command, stdin = asyncio.subprocess.PIPE, stdout = asyncio.subprocess.PIPE,
+                stderr = asyncio.subprocess.DEVNULL,
+            )
+            await self._send('uci')
+            for line in await self._read_until('uciok', _HANDSHAKE_TIMEOUT):
+                if line.startswith('id name '):
+                    self.name = line[8:]
+            for key, value in self.options.items():
+                await self._send(f'setoption name {key} value {value}')
+            await self._send('isready')
+            await self._read_until('readyok', _HANDSHAKE_TIMEOUT)
+        except (OSError, ValueError, ConnectionError, asyncio.TimeoutError) as error:
+            self.error = f'{type(error).__name__}: {error}'
+            if self.process is not None and self.process.returncode is None:
+                self.process.kill()
+            self.process = None
+            return False
+        return True
+
+    async def _go(self, position: Position, time_limit: float, tag: Any, fen: str):
+        result = {
+            "command": "bestmove",
+            "tag": tag,
+            "key": position.hash,
+            "move": 0,
+            "score": 0,
+            "depth": 0,
+            "nodes": 0,
+            "book": False,
+            "tablebase": False,
+            "ponder_hit": False,
+            "ponder_move": 0,
+            "uci": True,
+        }
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            if not await self._start():
+                result["error"] = self.error
+                self.on_result(result)
+                return
+            try:
+                await self._send(f'position fen {fen}')
+                await self._send(f'go movetime {max(int(time_limit * 1000), 1)}')
+                self.searching = True
+                lines = await self._read_until('bestmove')
+            except (OSError, ConnectionError) as error:
+                self.error = f'{type(error).__name__}: {error}'
+                self.process = None
+                result["error"] = self.error
+                self.on_result(result)
+                return
+            finally:
+                self.searching = False
+        for line in lines:
+            if line.startswith('info '):
+                self._parse_info(line.split(), result)
+        words = lines[-1].split()
+        if len(words) > 1:
+            result["move"] = parse_uci_move(position, words[1])
+        self.on_result(result)
+
+    @staticmethod
+    def _parse_info(words: list[str], result: dict[str, Any]):
+        """
+        从 info 行里取出深度、节点数和分数，分数换算成和搜索器一致的杀棋分
+        """
+        for index, word in enumerate(words[:-1]):
+            value = words[index + 1]
+            if word == 'depth' and value.isdigit():
+                result["depth"] = int(value)
+            elif word == 'nodes' and value.isdigit():
+                result["nodes"] = int(value)
+            elif word == 'score' and index + 2 < len(words):
+                try:
+                    number = int(words[index + 2])
+                except ValueError:
+                    continue
+                if value == 'cp':
+                    result["score"] = number
+                elif value == 'mate':
+                    # mate n 表示 n 回合内将死，-n 表示 n 回合内被将死
+                    result["score"] = MATE - (2 * number - 1) if number > 0 else -MATE - 2 * number
+
+    def go(self, position: Position, time_limit: float, tag: Any = None, halfmove_clock: int = 0,
+           fullmove: int = 1, **option):
+        """
+        让引擎搜索一个局面，立即返回，结果稍后通过 on_result 送回
+        :param position: 局面，发送前就已经转换成 FEN，之后修改原局面不影响搜索
+        :param time_limit: 思考时间，单位秒
+        :parameter tag: (可选) 原样放进结果里，用来区分是谁发起的搜索
+        :parameter halfmove_clock: (可选) 距离上次吃子或动兵的半回合数，引擎用来判断五十回合
+        :parameter fullmove: (可选) 回合数
+        :param option: 和 EngineWorker.go 兼容的其他参数(开局库、后台思考等)，外部引擎用不到，直接忽略
+        :return:
+        """
+        self.stop()
+        self._submit(self._go(position.copy(), time_limit, tag, uci_fen(position, halfmove_clock, fullmove)))
+
+    def stop(self):
+        """
+        叫停正在进行的搜索，引擎会尽快给出 bestmove，过期的结果由调用方按 tag 和 key 丢弃
+        :return:
+        """
+        if self.loop is not None and self.searching and self.running:
+            self.loop.call_soon_threadsafe(lambda: self.running and self.process.stdin.write(b'stop\n'))
+
+    async def _new_game(self):
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            if await self._start():
+                try:
+                    await self._send('ucinewgame')
+                    await self._send('isready')
+                    await self._read_until('readyok', _HANDSHAKE_TIMEOUT)
+                except (OSError, ConnectionError, asyncio.TimeoutError):
+                    pass
+
+    def new_game(self):
+        """
+        新开一局时通知引擎清空它的记录
+        :return:
+        """
+        self.stop()
+        self._submit(self._new_game())
+
+    async def _quit(self):
+        if not self.running:
+            return
+        try:
+            if self.searching:
+                await self._send('stop')
+            await self._send('quit')
+            await asyncio.wait_for(self.process.wait(), _STOP_TIMEOUT)
+        except (OSError, ConnectionError, asyncio.TimeoutError):
+            self.process.kill()
+            await self.process.wait()
+
+    def close(self):
+        """
+        让引擎退出并结束事件循环线程
+        :return:
+        """
+        if self.loop is None:
+            return
+        if self.running:
+            try:
+                self._submit(self._quit()).result(_STOP_TIMEOUT * 2)
+            except Exception:
+                pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop = None
+        self.process = None
+        self.lock = None
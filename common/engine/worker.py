@@ -0,0 +1,257 @@
+"""
+引擎工作进程：搜索放在单独的进程里跑，主进程只负责收发消息，
+电脑思考时界面依旧按原帧率刷新，动画、鼠标悬浮和计时都不受影响
+"""
+
+import atexit
+import multiprocessing
+import queue
+import threading
+import time
+from typing import Any, Callable
+
+from .position import Position
+from .movegen import generate_legal_moves
+from .search import Searcher, MATE_BOUND
+from .parallel import ParallelSearcher, resolve_worker_count
+from .book import OpeningBook
+from .tablebase import Tablebase
+
+__all__ = [
+    "EngineWorker",
+]
+
+# 后台思考的时间上限，防止玩家一直不走时白白占用 CPU
+_PONDER_TIME_LIMIT = 600.0
+
+
+def _predict_reply(searcher: Searcher | ParallelSearcher, position: Position, move: int) -> tuple[int, Position | None]:
+    """
+    从置换表里取出对手最可能的应着
+    :param searcher: 刚搜索完的搜索器
+    :param position: 电脑走棋前的局面
+    :param move: 电脑走的棋
+    :return: (预测的应着, 走完电脑的棋和应着之后的局面)，置换表里没有应着时返回 (0, None)
+    """
+    position = position.copy()
+    position.make_move(move)
+    entry = searcher.tt.probe(position.hash)
+    if entry is None or entry[0] not in generate_legal_moves(position):
+        return 0, None
+    position.make_move(entry[0])
+    return entry[0], position
+
+
+def _worker_main(request_queue: multiprocessing.Queue, result_queue: multiprocessing.Queue, stop_event: Any,
+                 tt_mb: int, workers: int, book_path: str | None, tablebase_path: str | None):
+    """
+    工作进程的主循环，按顺序处理主进程发来的请求
+    :param request_queue: 请求队列
+    :param result_queue: 结果队列
+    :param stop_event: 主进程发新请求前会 set 它，用来叫停后台思考
+    :param tt_mb: 置换表占用的内存
+    :param workers: 搜索进程数，大于 1 时使用并行搜索
+    :param book_path: 开局库文件路径，为 None 时不使用开局库
+    :param tablebase_path: 残局库目录，为 None 时不使用残局库
+    :return:
+    """
+    if workers > 1:
+        searcher = ParallelSearcher(workers, tt_mb, stop_event)
+    else:
+        searcher = Searcher(tt_mb, stop_event = stop_event)
+    book = OpeningBook(book_path) if book_path else None
+    tablebase = Tablebase(tablebase_path) if tablebase_path else None
+    parent = multiprocessing.parent_process()
+    # 上一次后台思考的结果：{'key': 局面哈希, 'move', 'score', 'depth', 'nodes', 'seconds': 思考了多久}
+    ponder: dict[str, Any] | None = None
+    while True:
+        try:
+            request = request_queue.get(timeout = 1)
+        except queue.Empty:
+            # 主进程意外退出时没人发 quit，自己结束
+            if parent is not None and not parent.is_alive():
+                break
+            continue
+        command = request["command"]
+        if command == "quit":
+            break
+        elif command == "new_game":
+            ponder = None
+            searcher.clear()
+        elif command == "go":
+            # 主进程发请求前 set 过，开始正式思考前清掉
+            stop_event.clear()
+            position: Position = request["position"]
+            time_limit = request["time_limit"]
+            standard_rules = request["standard_rules"]
+            # 玩家走的正好是预测的应着，后台思考的结果和置换表都能接着用
+            ponder_hit = ponder is not None and ponder["key"] == position.hash
+            pondered = ponder
+            ponder = None
+            # 残局库里有的局面结果是精确的，直接查表；残局库按吃王规则生成，标准规则下不能用
+            tablebase_move, score = (tablebase.best_move(position) if tablebase is not None and not standard_rules
+                                     else (0, 0))
+            # 还在开局库里时直接按库走，不用搜索
+            book_move = book.choose(position) if book is not None and request["use_book"] and not tablebase_move else 0
+            if tablebase_move:
+                move, depth, nodes = tablebase_move, 0, 0
+            elif book_move:
+                move, score, depth, nodes = book_move, 0, 0, 0
+            elif ponder_hit and pondered["move"] and (pondered["seconds"] >= time_limit
+                                                      or abs(pondered["score"]) > MATE_BOUND):
+                # 后台思考的时间已经够了，或者已经算出了吃王，直接走
+                move, score, depth, nodes = pondered["move"], pondered["score"], pondered["depth"], pondered["nodes"]
+            else:
+                # 预测命中时置换表里已经有了后台思考的结果，剩下的时间能搜得更深
+                remaining = time_limit - pondered["seconds"] if ponder_hit else time_limit
+                move, score, depth = searcher.search(position, remaining, standard_rules = standard_rules)
+                nodes = searcher.nodes
+            ponder_move, predicted = 0, None
+            if request["ponder"] and move and not tablebase_move:
+                ponder_move, predicted = _predict_reply(searcher, position, move)
+            result_queue.put({
+                "command": "bestmove",
+                "tag": request["tag"],
+                "key": position.hash,
+                "move": move,
+                "score": score,
+                "depth": depth,
+                "nodes": nodes,
+                "book": bool(book_move),
+                "tablebase": bool(tablebase_move),
+                "ponder_hit": ponder_hit,
+                "ponder_move": ponder_move,
+            })
+            if predicted is not None:
+                # 在玩家思考的时候搜索预测的局面，直到主进程发来新的请求
+                start_time = time.perf_counter()
+                move, score, depth = searcher.search(predicted, _PONDER_TIME_LIMIT, standard_rules = standard_rules)
+                ponder = {
+                    "key": predicted.hash,
+                    "move": move,
+                    "score": score,
+                    "depth": depth,
+                    "nodes": searcher.nodes,
+                    "seconds": time.perf_counter() - start_time,
+                }
+    if isinstance(searcher, ParallelSearcher):
+        searcher.close()
+    if book is not None:
+        book.close()
+    if tablebase is not None:
+        tablebase.close()
+    # 通知主进程的监听线程退出
+    result_queue.put(None)
+
+
+class EngineWorker:
+    """
+    在单独进程里运行的搜索器。
+    请求和结果都通过 multiprocessing 的队列传递，结果由后台线程收取后交给 on_result 回调，
+    回调运行在后台线程里，界面上一般用 event_manager.post_event 转交给主循环处理
+    """
+    def __init__(self, on_result: Callable[[dict[str, Any]], None], tt_mb: int | None = None,
+                 book_path: str | None = None, tablebase_path: str | None = None):
+        """
+        创建工作进程的句柄，进程在第一次使用时才启动
+        :param on_result: 收到搜索结果时调用，参数为结果字典
+        :parameter tt_mb: (可选) 置换表占用的内存，默认读取配置文件里的 tt_mb
+        :parameter book_path: (可选) 开局库文件路径，默认不使用开局库
+        :parameter tablebase_path: (可选) 残局库目录，默认不使用残局库
+        """
+        self.on_result = on_result
+        self.tt_mb = tt_mb
+        self.book_path = book_path
+        self.tablebase_path = tablebase_path
+        self.process: multiprocessing.Process | None = None
+        self.request_queue: multiprocessing.Queue | None = None
+        self.result_queue: multiprocessing.Queue | None = None
+        # 叫停工作进程里后台思考的信号
+        self.stop_event: Any = None
+        # 工作进程不是守护进程，退出程序时要先让它结束
+        atexit.register(self.close)
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        """
+        启动工作进程和收取结果的后台线程，已经启动时什么也不做
+        :return:
+        """
+        if self.running:
+            return
+        tt_mb = self.tt_mb
+        if tt_mb is None:
+            from common.config import get_config
+            tt_mb = get_config("tt_mb")
+        workers = resolve_worker_count()
+        # 统一使用 spawn，子进程不会继承主进程里 pygame 的窗口和音频状态
+        context = multiprocessing.get_context("spawn")
+        self.request_queue = context.Queue()
+        self.result_queue = context.Queue()
+        self.stop_event = context.Event()
+        self.process = context.Process(
+            target = _worker_main,
+            args = (self.request_queue, self.result_queue, self.stop_event, tt_mb, workers, self.book_path,
+                    self.tablebase_path),
+            name = "EngineWorker",
+            # 并行搜索需要再开辅助进程，守护进程不能有子进程，所以退出时由 close 负责关闭
+            daemon = False,
+        )
+        self.process.start()
+        threading.Thread(target = self._receive_results, args = (self.result_queue,), daemon = True).start()
+
+    def _receive_results(self, result_queue: multiprocessing.Queue):
+        while True:
+            result = result_queue.get()
+            if result is None:
+                break
+            self.on_result(result)
+
+    def go(self, position: Position, time_limit: float, tag: Any = None, use_book: bool = True,
+           ponder: bool = False, standard_rules: bool = False):
+        """
+        让工作进程搜索一个局面，立即返回，结果稍后通过 on_result 送回
+        :param position: 局面，发送时会被序列化，之后修改原局面不影响搜索
+        :param time_limit: 思考时间，单位秒
+        :parameter tag: (可选) 原样放进结果里，用来区分是谁发起的搜索
+        :parameter use_book: (可选) 局面在开局库里时是否直接按库走
+        :parameter ponder: (可选) 走完之后是否在对手思考时搜索预测的应着，
+                           下一次 go 的局面正好是预测的局面时接着用后台思考的结果
+        :parameter standard_rules: (可选) 是否按标准规则思考，逼和算和棋，也不查按吃王规则生成的残局库
+        :return:
+        """
+        self.start()
+        self.stop()
+        self.request_queue.put({"command": "go", "position": position, "time_limit": time_limit, "tag": tag,
+                                "use_book": use_book, "ponder": ponder, "standard_rules": standard_rules})
+
+    def stop(self):
+        """
+        叫停工作进程正在进行的后台思考，比如对局已经结束
+        :return:
+        """
+        if self.running:
+            self.stop_event.set()
+
+    def new_game(self):
+        """
+        新开一局时清空工作进程里的置换表和走法排序记录
+        :return:
+        """
+        self.start()
+        self.stop()
+        self.request_queue.put({"command": "new_game"})
+
+    def close(self):
+        """
+        叫停当前的搜索后关闭工作进程
+        :return:
+        """
+        if self.running:
+            self.stop()
+            self.request_queue.put({"command": "quit"})
+            self.process.join()
+        self.process = None
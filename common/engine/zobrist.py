@@ -0,0 +1,21 @@
+"""
+Zobrist 哈希的随机键，置换表、重复局面检测、开局库都用它做局面的键
+"""
+
+import random
+
+__all__ = [
+    "ZOBRIST_PIECE", "ZOBRIST_SIDE", "ZOBRIST_EP",
+]
+
+# 固定种子，保证每次启动、每个进程生成的键完全一致，写到磁盘上的开局库等文件才能通用
+_random = random.Random(0x4E6942757443)
+
+# 每种棋子在每个格子上的键，下标为 [棋子编号][格子]
+ZOBRIST_PIECE: list[list[int]] = [[_random.getrandbits(64) for _ in range(64)] for _ in range(12)]
+# 轮到 P1 走棋时异或上这个键
+ZOBRIST_SIDE: int = _random.getrandbits(64)
+# 可以被吃过路兵的兵所在格子的键
+ZOBRIST_EP: list[int] = [_random.getrandbits(64) for _ in range(64)]
+
+del _random
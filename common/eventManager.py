@@ -2,6 +2,7 @@
 这是一个事件管理类，用于处理事件消息的传递与发送
 """
 import pygame
+from typing import Literal, Callable
 from .sceneManager import scene_manager
 
 class EventManager:
@@ -11,6 +12,8 @@ class EventManager:
     def __init__(self):
         # 用于存储用户自己创建的事件名称与对应的事件id
         self.user_events = {}
+        # 自定义事件id与对应的处理函数，由主循环调用
+        self.event_callbacks: dict[int, Callable[[pygame.event.Event], None]] = {}
         # 现在最新注册的事件id
         self.now_event_id = pygame.USEREVENT
         # 记录游戏是否暂停
@@ -19,6 +22,8 @@ class EventManager:
         self.game_has_started = False
         # 记录是否在游戏中
         self.game_playing = False
+        # 游戏模式，双人为同屏双人，人机为玩家执白对战电脑
+        self.game_mode: Literal['双人', '人机'] = '双人'
 
     def register_event(self, event_name: str) -> None:
         """
@@ -38,6 +43,27 @@ class EventManager:
         """
         pygame.event.post(pygame.event.Event(self.user_events[event_name], **option))
 
+    def bind_event(self, event_name: str, callback: Callable[[pygame.event.Event], None]) -> None:
+        """
+        绑定用户自定义事件的处理函数，同一事件只保留最后绑定的函数
+        :param event_name: 事件名称
+        :param callback: 处理函数，参数为pygame的Event类
+        :return:
+        """
+        self.event_callbacks[self.user_events[event_name]] = callback
+
+    def dispatch(self, event: pygame.event.Event) -> bool:
+        """
+        把用户自定义事件交给绑定的处理函数
+        :param event: pygame的Event类
+        :return: 是否有处理函数
+        """
+        callback = self.event_callbacks.get(event.type)
+        if callback is None:
+            return False
+        callback(event)
+        return True
+
 def emit(event: pygame.event.Event, **option) -> None:
     """
     给所有需要接收事件的实例发送事件消息
@@ -8,6 +8,28 @@ from typing import Any, Literal, Callable
 from common.sceneManager import scene_manager
 from common.uiBase import UIBase
 from common import resources
+from common.config import get_config, abs_path
+from common.engine.position import (Position, EMPTY, BIN, CHESS_TYPES, SIDE_NAMES, PAWN_START_Y,
+                                    MOVE_NORMAL, MOVE_DOUBLE, MOVE_LUGUO, MOVE_WANGCHE, MOVE_PROMOTION,
+                                    HOU, MA, encode_move, promotion_type, square, side_of, type_of)
+from common.engine.movegen import generate_moves, generate_legal_moves, has_legal_move, in_check
+from common.engine.see import see
+from common.engine.history import PositionHistory, is_irreversible
+from common.engine.worker import EngineWorker
+from common.engine.parallel import resolve_worker_count
+from common.engine.analysis import GameAnalysis
+from common.engine.pgn import PgnGame
+from common.engine.uci import UciEngine
+from common.eventManager import event_manager
+
+# 吃子后子力得失的绝对值小于它时视为兑换，比如马换象
+EXCHANGE_MARGIN = 50
+# 获胜方对应的 PGN 对局结果，和棋时获胜方为 None
+PGN_RESULTS = {'P2': '1-0', 'P1': '0-1', None: '1/2-1/2'}
+# 开局库文件，配置里的路径相对于项目根目录
+BOOK_PATH = abs_path("../" + get_config("book_path"))
+# 残局库目录，由 python -m common.engine.retrograde 生成
+TABLEBASE_PATH = abs_path("../" + get_config("tablebase_path"))
 
 
 class MapBlock:
@@ -51,10 +73,17 @@ class MapBlock:
             'normal': self.create_border(4, 'orange'),
             'special': self.create_border(4, (0, 198, 255)),
             'eaten': self.create_border(4, 'red'),
+            'eaten_trade': self.create_border(4, 'yellow'),
+            'eaten_win': self.create_border(4, (0, 200, 80)),
             'LuGuo': self.create_border(4, 'purple'),
             'WangChe': self.create_border(4, 'purple')
         }
-        self.border: Literal['normal', 'special', 'eaten', 'LuGuo', 'WangChe'] = 'normal'
+        # 可以吃的棋子按吃完后的子力得失分三种边框，对应的背景色，亏本的吃子沿用 eaten 的红色
+        self.exchange_border_to_bg = {
+            'eaten_trade': 'yellow',
+            'eaten_win': 'green'
+        }
+        self.border: Literal['normal', 'special', 'eaten', 'eaten_trade', 'eaten_win', 'LuGuo', 'WangChe'] = 'normal'
         self.chess: None | BasicChess = None
         self.hover = False # 鼠标是否在方块上, 只有 Display 为 True 时才绘判断
         # 通用背景字典
@@ -63,10 +92,11 @@ class MapBlock:
             'red': self.create_block_bg('red'),
             'blue': self.create_block_bg((0, 198, 255)),
             'purple': self.create_block_bg((255, 0, 255)),
-            'yellow': self.create_block_bg('yellow')
+            'yellow': self.create_block_bg('yellow'),
+            'green': self.create_block_bg((0, 200, 80))
         }
         # 方块背景
-        self.block_bg: Literal['orange', 'red', 'blue', 'purple'] | None = None
+        self.block_bg: Literal['orange', 'red', 'blue', 'purple', 'yellow', 'green'] | None = None
 
     def create_block_bg(self, color: tuple[int, int, int] | str, opacity = 80):
         # 方块背景色
@@ -112,6 +142,8 @@ class MapBlock:
                         # 设置背景色, 将军的背景色更特别
                         if self.chess.state == 'eaten' and self.chess.chess_type == 'wang':
                             self.block_bg = 'purple'
+                        elif self.border in self.exchange_border_to_bg:
+                            self.block_bg = self.exchange_border_to_bg[self.border]
                         else:
                             self.block_bg = self.chess_state_to_bg[self.chess.state]
 
@@ -190,11 +222,14 @@ class GameMap:
     地图类，负责与外界交互
     """
 
-    def __init__(self, container: UIBase, size: int):
+    def __init__(self, container: UIBase, size: int, position: Position | None = None,
+                 ai_side: Literal['P1', 'P2'] | None = None):
         """
         绘制地图
         :param container: 要绘制的 UIBase 对象
         :param size: 地图大小
+        :parameter position: (可选) 局面模型，默认为标准开局
+        :parameter ai_side: (可选) 由电脑控制的一方，默认为双人对战
         :return:
         """
 
@@ -203,6 +238,48 @@ class GameMap:
 
         # 游戏是否结束
         self.game_over = False
+        # 对局结果，按 PGN 的记号记录，没有结束时为 *
+        self.result = '*'
+        # 对局结束、终局的那步棋记进撤销栈之后调用，参数为地图本身，比如由场景把棋谱存档
+        self.game_over_callback: Callable[['GameMap'], Any] | None = None
+        # 局面模型，地图只是它的显示层
+        self.position = position if position is not None else Position.start()
+        # 等待玩家选择升变对象的走法
+        self.promotion_move: int | None = None
+        # 局面模型的撤销栈，记录了开局以来的每一步棋
+        self.undo_stack: list[tuple[int, int, int, int, int]] = []
+        # 整局的局面哈希和半回合计数，和棋规则用它判定重复局面和五十回合
+        self.history = PositionHistory(self.position.hash)
+        # 初始局面的回合数和走棋方，从 FEN 载入时不一定是第 1 回合白方先行
+        self.start_fullmove = 1
+        self.start_side = self.position.side
+        # 是否按标准规则判定胜负(将死获胜、逼和)，开局时确定，对局中途改设置不影响这一局
+        self.standard_rules: bool = get_config("standard_rules")
+        # 合法走法缓存，(局面哈希, {起点 | 终点 << 6})
+        self.legal_move_cache: tuple[int, set[int]] | None = None
+        # 由电脑控制的一方
+        self.ai_side = ai_side
+        # 电脑对手：配置了外部 UCI 引擎并选择用它做对手时使用外部引擎，否则使用内置引擎
+        self.engine: EngineWorker | UciEngine = uci_engine if uci_engine is not None and get_config("uci_opponent") else engine_worker
+        if ai_side is not None:
+            # 电脑的搜索结果只交给最新的一局
+            event_manager.bind_event("电脑走棋", self.receive_ai_move)
+            self.engine.new_game()
+        event_manager.bind_event("引擎提示", self.receive_hint)
+        # 提示的缓存，{局面哈希: 走法}
+        self.hint_cache: dict[int, int] = {}
+        # 正在计算提示的局面哈希
+        self.hint_key: int | None = None
+        # 提示结束时的回调，参数为提示的走法，提示作废时为 0
+        self.hint_callback: Callable[[int], Any] | None = None
+        event_manager.bind_event("对局分析", self.receive_analysis)
+        # 正在进行的复盘分析
+        self.analysis: GameAnalysis | None = None
+        # 已经判定的走法，{第几个半回合: 判定结果}
+        self.analysis_moves: dict[int, dict[str, Any]] = {}
+        # 复盘分析的标题和双方的统计，显示在选择 UI 上
+        self.analysis_title_ui: UIBase | None = None
+        self.analysis_summary_ui: dict[int, UIBase] = {}
         # 地图大小
         self.size = size
         # 地图背景基底
@@ -217,10 +294,10 @@ class GameMap:
         self.block_size = (size - self.map_border * 2) // 8
         # 选中的 chess
         self.selected_chess: BasicChess | None = None
-        # 当前首发回合名字, 默认为 P2
-        self.round_name: Literal['P1', 'P2'] = 'P2'
-        # 保存双方名字对应棋子的字典
-        self.chess_dict: dict[Literal['P1', 'P2'], list[BasicChess]] = {'P1': [], 'P2': []}
+        # 当前首发回合名字, 由局面决定, 默认为 P2
+        self.round_name: Literal['P1', 'P2'] = self.position.round_name
+        # 保存双方名字对应棋子的字典，用集合保证吃子时 O(1) 删除
+        self.chess_dict: dict[Literal['P1', 'P2'], set[BasicChess]] = {'P1': set(), 'P2': set()}
         # 鼠标当前悬停的方块
         self.hover_block: MapBlock | None = None
         # 信息叠加层已激活的对象集合
@@ -250,65 +327,13 @@ class GameMap:
         container.set_background_image(self.game_map_base)
         container.mouse_up(self.map_position)
 
-        # 防止导致循环引用
-        from .chess import BinChess, CheChess, WangChess, MaChess, HouChess, XiangChess
         # 记录双方玩家的棋子颜色， 默认上黑下白
         self.chess_color = {
             "P1": "black",
             "P2": "white",
         }
-        chess_type_list = ["che", 'ma', 'xiang', 'hou', 'wang', 'xiang', 'ma', 'che']
-        chess_type_dict = {
-            "che": CheChess,
-            "ma": MaChess,
-            "xiang": XiangChess,
-            "wang": WangChess,
-            "hou": HouChess,
-        }
-        chess_pos = {
-            "P1": [1, 0],
-            "P2": [6, 7]
-        }
-        # 将棋子放入棋盘
-        chess_name: Literal["P1", "P2"]
-        for chess_name in ['P1', 'P2']:
-            for x in range(8):
-                chess_bin = BinChess(
-                    self.container.screen,
-                    x, chess_pos[chess_name][0],
-                    self.block_size,
-                    self,
-                    self.chess_color[chess_name],
-                    chess_name
-                )
-                chess_other = chess_type_dict[chess_type_list[x]](
-                    self.container.screen,
-                    x, chess_pos[chess_name][1],
-                    self.block_size,
-                    self,
-                    self.chess_color[chess_name],
-                    chess_name
-                )
-
-                # 地图方块记录数据
-                self.map_data[chess_pos[chess_name][0]][x].chess = chess_bin
-                self.map_data[chess_pos[chess_name][1]][x].chess = chess_other
-
-                # 写入回合管理字典
-                self.chess_dict[chess_name].append(chess_bin)
-                self.chess_dict[chess_name].append(chess_other)
-
-                # 新游戏载入时可以跟随父容器淡入
-                chess_bin.opacity = 0
-                chess_other.opacity = 0
-
-                # 把非当前回合的棋子禁止响应事件
-                if not self.round_name == chess_name:
-                    chess_bin.enabled_event = False
-                    chess_other.enabled_event = False
-
-                container.children.append(chess_bin)
-                container.children.append(chess_other)
+        # 按照局面模型摆放棋子
+        self.sync_from_position()
 
         # 选择 UI 初始化
         self.choose_ui = UIBase(
@@ -331,7 +356,7 @@ class GameMap:
             740,
             (0, 0),
             (0, 0, 0),
-            '白棋先行',
+            '白棋先行' if self.chess_color[self.round_name] == 'white' else '黑棋先行',
             enabled_event = False,
             font_size = 30,
             font_family = 'font.ttf',
@@ -344,13 +369,58 @@ class GameMap:
             (22, 35),
             enabled_event = False,
         )
-        self.round_info_ui_img.set_background_image(resources.CHESS_img_map['white']['bin'])
+        self.round_info_ui_img.set_background_image(resources.CHESS_img_map[self.chess_color[self.round_name]]['bin'])
         self.round_info_ui.opacity = 0
         self.round_info_ui_img.opacity = 0
         self.round_info_ui.children.append(self.round_info_ui_img)
         self.container.children.append(self.round_info_ui)
 
 
+    @classmethod
+    def from_fen(cls, container: UIBase, fen: str, size: int = 640, ai_side: Literal['P1', 'P2'] | None = None) -> 'GameMap':
+        """
+        按 FEN 摆出一个局面，用来载入残局、谜题和测试局面，不用在界面上一步步走出来。
+        走棋方、吃过路兵的目标格(可以连写多个)、半回合计数和回合数都从 FEN 读取；
+        本项目的王车易位只看王和车的位置，易位字段不影响能否易位，直接忽略
+        :param container: 父容器
+        :param fen: FEN 字符串，后面的字段可以省略
+        :parameter size: (可选) 地图大小
+        :parameter ai_side: (可选) 由电脑控制的一方，默认为双人对战
+        :return: 新的游戏地图
+        """
+        fields = fen.split()
+        # 先解析完整个 FEN，格式不对时不会往父容器里加东西
+        position = Position.from_fen(fen)
+        try:
+            halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+            fullmove = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError(f'FEN 的步数字段不是整数: {fen!r}') from None
+        game_map = cls(container, size, position, ai_side)
+        game_map.history = PositionHistory(game_map.position.hash, min(max(halfmove_clock, 0), 0xFFFF))
+        game_map.start_fullmove = max(fullmove, 1)
+        return game_map
+
+    def to_fen(self) -> str:
+        """
+        导出当前局面的 FEN，易位字段按王和车的位置推算，吃过路兵的目标格和棋子的 move_two_step 一致，
+        有多个兵可以被吃过路兵时目标格连写
+        :return: 完整的六段 FEN 字符串
+        """
+        return f'{self.position.to_fen()} {self.history.halfmove_clock} {self.fullmove}'
+
+    def move_number(self, ply: int) -> int:
+        """
+        第几个半回合的走法属于第几回合，黑方走完一步后回合数加一
+        :param ply: 开局以来的第几个半回合，从 0 开始
+        :return: 回合数
+        """
+        return self.start_fullmove + (ply + (self.start_side == 0)) // 2
+
+    @property
+    def fullmove(self) -> int:
+        return self.move_number(len(self.undo_stack))
+
     # noinspection PyUnusedLocal
     def map_position(self, event: pygame.event.Event, option: dict[str, Any]):
         """
@@ -381,6 +451,8 @@ class GameMap:
 
             if self.selected_chess:
                 if dest_block.display and dest_block.chess is None:
+                    # 边框会在移动时被重置，所以先生成走法
+                    move = self.create_move(self.selected_chess, list_x, list_y)
                     if dest_block.border == 'LuGuo':
                         dest_block.switch_block.chess.die()
                     # 移动王车
@@ -396,8 +468,214 @@ class GameMap:
                     if che_block:
                         che_block.chess.move_to(origin_x, origin_y)
 
-                    # 切换回合
-                    self.change_round()
+                    # 同步局面并切换回合
+                    self.finish_turn(move)
+
+    def sync_from_position(self):
+        """
+        按照局面模型重新摆放所有棋子
+        :return:
+        """
+        # 防止导致循环引用
+        from .chess import BinChess, CheChess, WangChess, MaChess, HouChess, XiangChess
+        chess_type_dict = {
+            "bin": BinChess,
+            "che": CheChess,
+            "ma": MaChess,
+            "xiang": XiangChess,
+            "wang": WangChess,
+            "hou": HouChess,
+        }
+        # 清除旧的棋子
+        self.cancel_select_chess()
+        for chess_set in self.chess_dict.values():
+            for chess in chess_set:
+                self.map_data[chess.list_y][chess.list_x].chess = None
+                chess.close()
+            chess_set.clear()
+
+        board = self.position.board
+        for sq in range(64):
+            piece = board[sq]
+            if piece == EMPTY:
+                continue
+            side = side_of(piece)
+            chess_name = SIDE_NAMES[side]
+            list_x = sq & 7
+            list_y = sq >> 3
+            chess = chess_type_dict[CHESS_TYPES[type_of(piece)]](
+                self.container.screen,
+                list_x, list_y,
+                self.block_size,
+                self,
+                self.chess_color[chess_name],
+                chess_name
+            )
+            # 兵的状态从局面还原
+            if type_of(piece) == BIN:
+                chess.have_moved = list_y != PAWN_START_Y[side]
+                if self.position.ep_pawns >> sq & 1:
+                    chess.move_two_step = True
+                    chess.move_step_num = 1
+
+            # 地图方块记录数据
+            self.map_data[list_y][list_x].chess = chess
+            # 写入回合管理字典
+            self.chess_dict[chess_name].add(chess)
+            # 新游戏载入时可以跟随父容器淡入
+            chess.opacity = 0
+            # 把非当前回合的棋子禁止响应事件
+            if not self.round_name == chess_name:
+                chess.enabled_event = False
+            self.container.children.append(chess)
+
+        # 重新摆放时，保证选择 UI 和回合信息依旧在棋子上层
+        if hasattr(self, 'choose_ui'):
+            for ui in (self.choose_ui, self.round_info_ui):
+                self.container.children.remove(ui)
+                self.container.children.append(ui)
+
+    def create_move(self, chess, list_x: int, list_y: int) -> int:
+        """
+        把界面上的一步棋转换为局面模型的走法，必须在棋子移动之前调用
+        :param chess: 要走的 BasicChess 实例
+        :param list_x: 目标列表坐标 x
+        :param list_y: 目标列表坐标 y
+        :return: 走法整数
+        """
+        dest_block = self.map_data[list_y][list_x]
+        kind = MOVE_NORMAL
+        if dest_block.border == 'LuGuo':
+            kind = MOVE_LUGUO
+        elif dest_block.border == 'WangChe':
+            kind = MOVE_WANGCHE
+        elif chess.chess_type == 'bin':
+            if abs(list_y - chess.list_y) == 2:
+                kind = MOVE_DOUBLE
+            elif list_y == 0 or list_y == 7:
+                # 升变对象要等玩家选择，先按皇后记录
+                kind = MOVE_PROMOTION + HOU - MA
+        return encode_move(square(chess.list_x, chess.list_y), square(list_x, list_y), kind)
+
+    def push_move(self, move: int):
+        """
+        把已经在地图上走完的一步棋同步到局面模型
+        :param move: 走法整数
+        :return:
+        """
+        undo = self.position.make_move(move)
+        self.undo_stack.append(undo)
+        self.history.push(self.position.hash, is_irreversible(self.position, undo))
+        self.drop_stale_hint()
+
+    def make_move(self, move: int) -> tuple:
+        """
+        不播放动画，直接在地图和局面模型上走一步棋，用于悔棋、复盘等需要快速前进后退的场景。
+        会更新地图数据、双方棋子集合、兵的标记和局面模型，但不会切换回合 UI 和棋子的事件响应
+        :param move: 走法整数
+        :return: 撤销记录，交给 unmake_move 就能精确还原
+        """
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+        kind = move >> 12
+        from_block = self.map_data[from_sq >> 3][from_sq & 7]
+        to_block = self.map_data[to_sq >> 3][to_sq & 7]
+        chess = from_block.chess
+        captured = to_block.chess
+        rook = None
+        new_chess = None
+        # 兵的标记
+        pawn_flags = None
+
+        if kind == MOVE_LUGUO:
+            captured = self.map_data[from_sq >> 3][to_sq & 7].chess
+        if captured is not None:
+            self.map_data[captured.list_y][captured.list_x].chess = None
+            self.chess_dict[captured.chess_name].discard(captured)
+            self.container.children.remove(captured)
+
+        from_block.chess = None
+        to_block.chess = chess
+        chess.place_at(to_sq & 7, to_sq >> 3)
+        if chess.chess_type == 'bin':
+            pawn_flags = (chess.have_moved, chess.move_two_step, chess.move_step_num)
+            chess.have_moved = True
+            chess.move_step_num += 1
+            if kind == MOVE_DOUBLE:
+                chess.move_two_step = True
+
+        if kind == MOVE_WANGCHE:
+            # 车移动到王原本的位置
+            rook_block = self.map_data[to_sq >> 3][0 if to_sq & 7 < 4 else 7]
+            rook = rook_block.chess
+            rook_block.chess = None
+            from_block.chess = rook
+            rook.place_at(from_sq & 7, from_sq >> 3)
+        elif kind >= MOVE_PROMOTION:
+            from .chess.binChess import type_to_chess_switch
+            new_chess = type_to_chess_switch[promotion_type(move)](
+                self.container.screen, to_sq & 7, to_sq >> 3, self.block_size,
+                self, chess.chess_color, chess.chess_name
+            )
+            new_chess.enabled_event = False
+            self.chess_dict[chess.chess_name].discard(chess)
+            self.chess_dict[chess.chess_name].add(new_chess)
+            self.container.children.remove(chess)
+            self.container.children.append(new_chess)
+            to_block.chess = new_chess
+
+        self.push_move(move)
+        self.round_name = self.position.round_name
+        return move, chess, captured, rook, new_chess, pawn_flags
+
+    def unmake_move(self, undo: tuple):
+        """
+        撤销 make_move 走的一步棋
+        :param undo: make_move 返回的撤销记录
+        :return:
+        """
+        move, chess, captured, rook, new_chess, pawn_flags = undo
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+        from_block = self.map_data[from_sq >> 3][from_sq & 7]
+        to_block = self.map_data[to_sq >> 3][to_sq & 7]
+        self.position.unmake_move(self.undo_stack.pop())
+        self.history.pop()
+        self.drop_stale_hint()
+        self.round_name = self.position.round_name
+
+        if new_chess is not None:
+            self.chess_dict[chess.chess_name].discard(new_chess)
+            self.chess_dict[chess.chess_name].add(chess)
+            self.container.children.remove(new_chess)
+            self.container.children.append(chess)
+        if rook is not None:
+            rook_x = 0 if to_sq & 7 < 4 else 7
+            self.map_data[to_sq >> 3][rook_x].chess = rook
+            rook.place_at(rook_x, to_sq >> 3)
+
+        to_block.chess = None
+        from_block.chess = chess
+        chess.place_at(from_sq & 7, from_sq >> 3)
+        if pawn_flags is not None:
+            chess.have_moved, chess.move_two_step, chess.move_step_num = pawn_flags
+
+        if captured is not None:
+            self.map_data[captured.list_y][captured.list_x].chess = captured
+            self.chess_dict[captured.chess_name].add(captured)
+            self.container.children.append(captured)
+
+    def finish_turn(self, move: int):
+        """
+        走子结束，同步局面并切换回合，兵升变要等选择完升变对象后再同步
+        :param move: 走法整数
+        :return:
+        """
+        if promotion_type(move) != -1 and not self.game_over:
+            self.promotion_move = move
+            return
+        self.push_move(move)
+        self.change_round()
 
     def cancel_select_chess(self):
         """
@@ -419,6 +697,8 @@ class GameMap:
                     block.chess.state = 'normal'
                 block.border = 'normal'
                 block.switch_block = None
+                # 提示铺上的背景色也一起清掉
+                block.block_bg = None
             self.active_block_set.clear()
 
     def select_chess(self, chess):
@@ -432,8 +712,42 @@ class GameMap:
         self.selected_chess = chess
         self.selected_chess.selected = True
         self.selected_chess.active_map_block()
+        # 等待升变时局面还没有同步，不做过滤
+        if self.promotion_move is None:
+            self.filter_active_blocks(chess)
         self.select_sound_effect.play()
 
+    def legal_move_set(self) -> set[int]:
+        """
+        当前局面下可以走的棋，王不能送吃。
+        一步合法的棋都没有时允许送吃，让对方吃王结束游戏，和原本的胜负判定一致
+        :return: {起点 | 终点 << 6} 的集合，升变的四种走法合并为一个
+        """
+        key = self.position.hash
+        if self.legal_move_cache is None or self.legal_move_cache[0] != key:
+            moves = generate_legal_moves(self.position) or generate_moves(self.position)
+            self.legal_move_cache = (key, {move & 0xFFF for move in moves})
+        return self.legal_move_cache[1]
+
+    def filter_active_blocks(self, chess):
+        """
+        熄灭 active_map_block 激活的地图块中会让己方王被吃的那些
+        :param chess: 被选中的 BasicChess 实例
+        :return:
+        """
+        legal_moves = self.legal_move_set()
+        from_sq = square(chess.list_x, chess.list_y)
+        for block in list(self.active_block_set):
+            if from_sq | square(block.list_x, block.list_y) << 6 in legal_moves:
+                continue
+            self.active_block_set.discard(block)
+            block.display = False
+            block.border = 'normal'
+            block.switch_block = None
+            if block.chess:
+                block.chess.state = 'normal'
+                block.chess.enabled_event = False
+
     def change_chess_state(self, block: MapBlock, state: Literal[
                                                             'normal', 'eaten', 'special'
                                                         ]):
@@ -445,10 +759,49 @@ class GameMap:
         """
         block.change_render_index(63)
         block.border = state
+        # 等待升变时局面还没有同步，不计算兑换
+        if state == 'eaten' and self.selected_chess is not None and self.promotion_move is None:
+            block.border = self.exchange_border(self.create_move(self.selected_chess, block.list_x, block.list_y))
         block.display = True
         block.chess.state = state
         self.active_block_set.add(block)
 
+    def exchange_border(self, move: int) -> Literal['eaten', 'eaten_trade', 'eaten_win']:
+        """
+        用静态交换评估判断一步吃子是赚、兑换还是亏
+        :param move: 吃子的走法整数
+        :return: 对应的地图块边框，赚为 eaten_win，兑换为 eaten_trade，亏为 eaten
+        """
+        value = see(self.position, move)
+        if value >= EXCHANGE_MARGIN:
+            return 'eaten_win'
+        if value > -EXCHANGE_MARGIN:
+            return 'eaten_trade'
+        return 'eaten'
+
+    def show_hint(self, move: int, color: Literal['orange', 'red', 'blue', 'purple', 'yellow', 'green'] = 'yellow'):
+        """
+        提示一步棋：选中要走的棋子，并给起点和目标地图块铺上背景色
+        :param move: 走法整数
+        :parameter color: (可选) 地图块的背景色，取自 MapBlock.block_bg_dict
+        :return:
+        """
+        if self.game_over or self.promotion_move is not None:
+            return
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+        chess = self.map_data[from_sq >> 3][from_sq & 7].chess
+        # 不是玩家的回合时棋子不响应事件，也就不提示
+        if chess is None or not chess.enabled_event:
+            return
+        self.select_chess(chess)
+        self.map_data[to_sq >> 3][to_sq & 7].block_bg = color
+        # 起点平时不显示，放进激活的地图块里，取消选中时会和其他地图块一起熄灭
+        from_block = self.map_data[from_sq >> 3][from_sq & 7]
+        from_block.display = True
+        from_block.block_bg = color
+        self.active_block_set.add(from_block)
+
     def create_choose_ui(self,
                          title: str,
                          option: dict[str, pygame.Surface],
@@ -463,7 +816,7 @@ class GameMap:
         :param callback: 回调函数, 会传入一个最终选项字符串作为参数
         :parameter image_size: 图片大小
         :parameter remove_text: 是否移除文字
-        :return: 返回一个 UIBase 实例
+        :return: 返回标题的 UIBase 实例，方便之后修改标题
         """
         self.choose_ui.children.clear()
         self.choose_ui.enabled_event = True
@@ -510,11 +863,13 @@ class GameMap:
 
         self.choose_ui.children.append(title_ui)
         self.choose_ui.display = True
+        # 刚关闭又马上打开时，清掉关闭动画结束后隐藏选择 UI 的回调
         self.choose_ui.transition_opacity(180, duration = 0.4,
                                           children_together = False, fps_clock = scene_manager.FPS_CLOCK
-        )# .then(lambda : print(self.choose_ui.display))
+        ).then(lambda: None)
         for ui in self.choose_ui.children:
             ui.transition_opacity(255, duration = 0.3, fps_clock = scene_manager.FPS_CLOCK)
+        return title_ui
 
     def close_choose_ui(self):
         """
@@ -528,12 +883,310 @@ class GameMap:
         self.choose_ui.enabled_event_children = False
         pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_ARROW)
 
+    def end_game(self, title: str, winner: Literal['P1', 'P2'] | None = None):
+        """
+        结束游戏并弹出选择 UI，可以重新开始或者复盘分析
+        :param title: 选择 UI 的标题
+        :parameter winner: (可选) 获胜方，和棋时为 None
+        :return:
+        """
+        self.game_over = True
+        self.result = PGN_RESULTS[winner]
+        if self.ai_side is not None:
+            # 对局结束了，不用再替电脑在后台思考
+            self.engine.stop()
+        self.create_choose_ui(
+            title,
+            {'重新开始': resources.ICON, '对局分析': resources.GAME_ui_play_img},
+            self.after_game,
+            (140, 140),
+        )
+
+    def after_game(self, result: str):
+        """
+        对局结束后的选择 UI 的回调
+        :param result: 选项名
+        :return:
+        """
+        from .scene.gameScene import load_new_game
+        if result == '对局分析':
+            self.start_analysis()
+        else:
+            load_new_game(self.container)
+
+    def game_positions(self) -> list[Position]:
+        """
+        从终局往回撤销，依次得到开局以来的每个局面
+        :return: 每一步之前的局面和当前局面，比撤销栈多一个
+        """
+        positions = [self.position.copy()]
+        for undo in reversed(self.undo_stack):
+            position = positions[-1].copy()
+            position.unmake_move(undo)
+            positions.append(position)
+        positions.reverse()
+        return positions
+
+    def to_pgn_game(self, headers: dict[str, str] | None = None) -> PgnGame:
+        """
+        把开局以来的走法整理成一局 PGN 棋谱，对局结果和规则写进标签，从 FEN 摆出的局面连同步数记进 FEN 标签
+        :parameter headers: (可选) 额外的标签，比如双方的名字
+        :return: 棋谱
+        """
+        start = self.game_positions()[0]
+        game = PgnGame(dict(headers or {}), start)
+        game.headers["Result"] = self.result
+        game.headers["Variant"] = "标准规则" if self.standard_rules else "吃王规则"
+        if start.hash != Position.start().hash:
+            game.headers["SetUp"] = "1"
+            game.headers["FEN"] = f"{start.to_fen()} {self.history.clocks[0]} {self.start_fullmove}"
+        game.moves = [undo[0] for undo in self.undo_stack]
+        return game
+
+    def start_analysis(self):
+        """
+        复盘分析：整盘棋的每个局面分给进程池搜索，结果通过 对局分析 事件陆续送回 receive_analysis，
+        选择 UI 上实时显示进度和双方的漏着、失误次数
+        :return:
+        """
+        positions = self.game_positions()
+        self.analysis_moves.clear()
+        self.analysis = GameAnalysis(positions, [undo[0] for undo in self.undo_stack], post_analysis_result,
+                                     get_config("analysis_depth"), resolve_worker_count(get_config("analysis_workers")),
+                                     self.standard_rules, id(self))
+        self.analysis_title_ui = self.create_choose_ui(f'对局分析中 0/{len(positions)}', {'重新开始': resources.ICON},
+                                                       self.after_game, (140, 140))
+        self.analysis_summary_ui.clear()
+        for index, side in enumerate((1, 0)):
+            summary_ui = UIBase(self.container.screen, 400, 270 + index * 40, (0, 0), text = '',
+                                font_family = 'font.ttf', user_font_family = True, center_anchor = True,
+                                font_size = 22, font_color = (255, 255, 255), enabled_event = False)
+            summary_ui.opacity = 0
+            self.choose_ui.children.append(summary_ui)
+            summary_ui.transition_opacity(255, duration = 0.3, fps_clock = scene_manager.FPS_CLOCK)
+            self.analysis_summary_ui[side] = summary_ui
+        self.update_analysis_summary()
+        self.analysis.start()
+
+    def stop_analysis(self):
+        """
+        叫停正在进行的复盘分析，比如重新开局
+        :return:
+        """
+        if self.analysis is not None:
+            self.analysis.stop()
+            self.analysis = None
+
+    def receive_analysis(self, event: pygame.event.Event):
+        """
+        收到复盘分析的结果后更新选择 UI 上的进度和统计
+        :param event: 对局分析 事件，参数见 GameAnalysis
+        :return:
+        """
+        if self.analysis is None or event.tag != id(self):
+            return
+        for move in event.moves:
+            self.analysis_moves[move["ply"]] = move
+        if event.command == "done":
+            self.analysis = None
+            self.analysis_title_ui.set_text(content = '对局分析完成')
+        else:
+            self.analysis_title_ui.set_text(content = f'对局分析中 {event.finished}/{event.total}')
+        self.update_analysis_summary()
+
+    def update_analysis_summary(self):
+        """
+        按已经判定的走法刷新双方的漏着、失误次数，并列出前几次漏着所在的回合
+        :return:
+        """
+        color = {
+            1: '白方',
+            0: '黑方'
+        }
+        for side, summary_ui in self.analysis_summary_ui.items():
+            moves = sorted((move for move in self.analysis_moves.values() if move["side"] == side),
+                           key = lambda move: move["ply"])
+            blunders = [self.move_number(move["ply"]) for move in moves if move["label"] == '漏着']
+            mistakes = sum(move["label"] == '失误' for move in moves)
+            text = f'{color[side]}：漏着 {len(blunders)} 次，失误 {mistakes} 次'
+            if blunders:
+                text += '，漏着在第 {0}{1}回合'.format('、'.join(map(str, blunders[:3])),
+                                                   ' 等' if len(blunders) > 3 else ' ')
+            summary_ui.set_text(content = text)
+
+    def play_move(self, move: int):
+        """
+        带动画地走一步棋，和玩家用鼠标走棋的流程一致，电脑走棋时使用
+        :param move: 走法整数
+        :return:
+        """
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+        kind = move >> 12
+        from_x, from_y = from_sq & 7, from_sq >> 3
+        to_x, to_y = to_sq & 7, to_sq >> 3
+        chess = self.map_data[from_y][from_x].chess
+        captured = self.map_data[to_y][to_x].chess
+        if kind == MOVE_LUGUO:
+            self.map_data[from_y][to_x].chess.die()
+        elif captured is not None:
+            # 注意顺序，die 一定要在 move 前
+            captured.die()
+        chess.move_to(to_x, to_y)
+        if kind == MOVE_WANGCHE:
+            self.map_data[to_y][0 if to_x < 4 else 7].chess.move_to(from_x, from_y)
+        if captured is not None and captured.chess_type == 'wang':
+            color = {
+                'P1': '黑方',
+                'P2': '白方'
+            }
+            self.end_game(f'{color[self.round_name]}获得胜利', self.round_name)
+        self.finish_turn(move)
+
+    def play_ai_move(self):
+        """
+        轮到电脑时让工作进程开始搜索，结果通过 电脑走棋 事件送回 receive_ai_move。
+        开启后台思考时，电脑走完后会接着搜索预测的应着，玩家不管是点地图块(map_position)还是点棋子吃子(BasicChess._mouse_up)，
+        最后都会走到这里，走的棋和预测一致就接着用后台思考的结果，否则丢弃
+        :return:
+        """
+        if self.engine is engine_worker:
+            engine_worker.go(self.position, get_config("ai_time"), tag = id(self), ponder = get_config("ponder"),
+                             standard_rules = self.standard_rules)
+        else:
+            self.engine.go(self.position, get_config("ai_time"), tag = id(self),
+                           halfmove_clock = self.history.halfmove_clock, fullmove = self.fullmove)
+
+    def receive_ai_move(self, event: pygame.event.Event):
+        """
+        收到电脑的搜索结果后走棋
+        :param event: 电脑走棋 事件，带有 tag、key、move 等参数
+        :return:
+        """
+        # 已经重新开局或者局面变了，说明是过期的结果
+        if (event.tag != id(self) or self.game_over or self.round_name != self.ai_side
+            or event.key != self.position.hash):
+            return
+        if event.move:
+            self.play_move(event.move)
+        elif getattr(event, "uci", False):
+            # 外部引擎启动失败，或者按标准规则走出了本项目不允许的棋，这一步由内置引擎代走
+            engine_worker.go(self.position, get_config("ai_time"), tag = id(self), standard_rules = self.standard_rules)
+
+    def request_hint(self, callback: Callable[[int], Any] | None = None) -> bool:
+        """
+        请引擎在后台给当前局面算一步提示，算完后标出起点和终点。
+        配置了外部 UCI 引擎并开启 uci_hint 时用外部引擎，否则用内置引擎；
+        结果按局面哈希缓存，再次提示或者悔棋回到算过的局面时直接标出，不再搜索。
+        内置引擎的提示在单独的 hint_worker 里算，不会叫停电脑的搜索和后台思考
+        :parameter callback: (可选) 提示结束时调用，参数为提示的走法，提示作废(局面变了、对局结束、没算出走法)时为 0
+        :return: 标出了缓存的提示或者开始了搜索时返回 True，
+                 不能提示(对局结束、等待升变、电脑正在思考)时返回 False，这时不会调用 callback
+        """
+        if self.game_over or self.promotion_move is not None or self.round_name == self.ai_side:
+            return False
+        key = self.position.hash
+        self.hint_callback = callback
+        if key in self.hint_cache:
+            self.show_hint(self.hint_cache[key], 'blue')
+            self.finish_hint(self.hint_cache[key])
+            return True
+        if self.hint_key == key:
+            # 这个局面已经在算了
+            return True
+        self.hint_key = key
+        if uci_engine is not None and get_config("uci_hint") and uci_engine.error is None:
+            # 外部引擎没有后台思考，轮到玩家时它是空闲的，不会打断电脑
+            uci_engine.go(self.position, get_config("ai_time"), tag = (HINT_TAG, id(self)),
+                          halfmove_clock = self.history.halfmove_clock, fullmove = self.fullmove)
+        else:
+            hint_worker.go(self.position, get_config("ai_time"), tag = (HINT_TAG, id(self)),
+                           standard_rules = self.standard_rules)
+        return True
+
+    def finish_hint(self, move: int):
+        """
+        提示结束，调用一次 request_hint 传入的回调
+        :param move: 提示的走法，提示作废时为 0
+        :return:
+        """
+        callback, self.hint_callback = self.hint_callback, None
+        if callback is not None:
+            callback(move)
+
+    def drop_stale_hint(self):
+        """
+        局面变了以后，还没算完的提示已经用不上了，马上通知回调；结果送回时照样存进缓存
+        :return:
+        """
+        if self.hint_key is not None and self.hint_key != self.position.hash:
+            self.hint_key = None
+            self.finish_hint(0)
+
+    def receive_hint(self, event: pygame.event.Event):
+        """
+        收到提示的结果后存入缓存，局面还没变时标出这步棋
+        :param event: 引擎提示 事件，参数和 电脑走棋 事件相同
+        :return:
+        """
+        if event.tag != (HINT_TAG, id(self)):
+            return
+        # 是不是还在等的那次提示，局面变了的话 drop_stale_hint 已经通知过回调
+        pending = event.key == self.hint_key
+        if pending:
+            self.hint_key = None
+        current = pending and event.key == self.position.hash and not self.game_over
+        if not event.move:
+            if current and getattr(event, "uci", False):
+                # 外部引擎给不出本项目允许的棋，改用内置引擎
+                self.hint_key = event.key
+                hint_worker.go(self.position, get_config("ai_time"), tag = (HINT_TAG, id(self)),
+                               standard_rules = self.standard_rules)
+            elif pending:
+                self.finish_hint(0)
+            return
+        # 局面已经变了也照样缓存，悔棋回到这个局面时能直接用
+        self.hint_cache[event.key] = event.move
+        if current:
+            self.show_hint(event.move, 'blue')
+            self.finish_hint(event.move)
+        elif pending:
+            self.finish_hint(0)
+
+    def game_result(self) -> tuple[str, Literal['P1', 'P2'] | None] | None:
+        """
+        按开启的规则判定刚走完一步之后对局是否结束，吃王的情况在走棋时就已经处理
+        :return: 结束时返回 (选择 UI 的标题, 获胜方)，和棋时获胜方为 None；没有结束时返回 None
+        """
+        if self.standard_rules and not has_legal_move(self.position):
+            # 找到一步合法走法就停下，绝大多数局面第一步就能返回
+            if in_check(self.position):
+                color = {
+                    'P1': '黑方',
+                    'P2': '白方'
+                }
+                return f'{color[self.round_name]}将死对方，获得胜利', self.round_name
+            return '逼和，和棋', None
+        if get_config("draw_rules"):
+            reason = self.history.draw_reason()
+            if reason is not None:
+                return f'{reason}，和棋', None
+        return None
+
     def change_round(self):
         """
         改变回合
         :return:
         """
+        if not self.game_over:
+            result = self.game_result()
+            if result is not None:
+                self.end_game(*result)
         if self.game_over:
+            # 终局的这步棋已经记进撤销栈，这时存档才完整；回调只调用一次
+            callback, self.game_over_callback = self.game_over_callback, None
+            if callback is not None:
+                callback(self)
             self.round_info_ui.set_text(content = '游戏结束')
             self.round_info_ui_img.width = 50
             self.round_info_ui_img.height = 50
@@ -545,8 +1198,10 @@ class GameMap:
         for chess in self.chess_dict[self.round_name]:
             chess.enabled_event = False
         self.round_name: Literal['P1', 'P2'] = 'P1' if self.round_name == 'P2' else 'P2'
-        for chess in self.chess_dict[self.round_name]:
-            chess.enabled_event = True
+        # 电脑的棋子不响应鼠标
+        if self.round_name != self.ai_side:
+            for chess in self.chess_dict[self.round_name]:
+                chess.enabled_event = True
 
         chinese_name = {
             'P2': '白棋',
@@ -556,4 +1211,43 @@ class GameMap:
         self.round_info_ui.set_text( content = "{0}回合".format(chinese_name[self.round_name]))
         self.round_info_ui_img.set_background_image(
             resources.CHESS_img_map[self.chess_color[self.round_name]]['bin']
-        )
\ No newline at end of file
+        )
+        if self.round_name == self.ai_side:
+            self.play_ai_move()
+
+
+# 电脑走棋的事件，工作进程的搜索结果通过它交给主循环
+event_manager.register_event("电脑走棋")
+# 提示的事件，tag 为 (HINT_TAG, 地图 id) 的搜索结果通过它交给主循环
+event_manager.register_event("引擎提示")
+HINT_TAG = "提示"
+
+def post_engine_result(result: dict[str, Any]):
+    """
+    引擎的结果回调，按 tag 区分是电脑走棋还是提示，转交给主循环
+    :param result: 引擎送回的结果字典
+    :return:
+    """
+    tag = result["tag"]
+    is_hint = isinstance(tag, tuple) and tag[0] == HINT_TAG
+    event_manager.post_event("引擎提示" if is_hint else "电脑走棋", **result)
+
+# 复盘分析的事件，每算完一个局面送回一次
+event_manager.register_event("对局分析")
+
+def post_analysis_result(result: dict[str, Any]):
+    """
+    复盘分析的结果回调，转交给主循环
+    :param result: GameAnalysis 送回的结果字典
+    :return:
+    """
+    event_manager.post_event("对局分析", **result)
+
+# 单例类，电脑在单独的进程里思考，不会卡住界面
+engine_worker = EngineWorker(post_engine_result, book_path = BOOK_PATH, tablebase_path = TABLEBASE_PATH)
+# 提示用单独的工作进程，和电脑各用各的叫停信号，请求提示不会打断电脑的搜索和后台思考
+hint_worker = EngineWorker(post_engine_result, book_path = BOOK_PATH, tablebase_path = TABLEBASE_PATH)
+# 外部 UCI 引擎，配置文件里填了启动命令时才创建，引擎进程在第一次使用时启动
+uci_engine: UciEngine | None = None
+if get_config("uci_engine"):
+    uci_engine = UciEngine(get_config("uci_engine"), post_engine_result, get_config("uci_options"))
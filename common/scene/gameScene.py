@@ -10,7 +10,9 @@ from common import resources
 from common.eventManager import event_manager
 from common.uiBase import UIBase
 from common.config import *
-from common.gameMap import GameMap
+from common.gameMap import GameMap, BOOK_PATH
+from common.engine.book import OpeningBook
+from common.engine.pgn import append_game
 
 
 # 背景图片的画布，为了调整背景图片的大小和位置
@@ -25,6 +27,10 @@ font_path = "font.ttf"
 # 按钮图片加载
 play_img = resources.GAME_ui_play_img
 pause_img = resources.GAME_ui_pause_img
+# 开局库，只做内存映射，不会在启动时读入整个文件
+opening_book = OpeningBook(BOOK_PATH)
+# 当前的游戏地图
+current_game_map: GameMap | None = None
 # 音效加载
 hover_sound_effect = resources.EFFECT_hover
 press_sound_effect = resources.EFFECT_press
@@ -77,7 +83,7 @@ def create_scene(screen: pygame.Surface) -> tuple[list[UIBase], pygame.Surface]:
     config = get_config_all()
 
     # 基础信息文本
-    base_info_text = "双人互啄 {0}".format(config["player_names"][config["player_name_index"]])
+    base_info_text = "{0}互啄 {1}".format(event_manager.game_mode, config["player_names"][config["player_name_index"]])
 
     # 基础信息UI
     base_info = UIBase(screen, 0, 0, (800, 50), (255, 255, 255), base_info_text, 23,
@@ -99,7 +105,7 @@ def create_scene(screen: pygame.Surface) -> tuple[list[UIBase], pygame.Surface]:
     back_btn.mouse_up(
         lambda event, option: (
             scene_manager.smooth_toggle_scene(screen, "menu"),
-            scene_manager.ui_dict["btn_start_game"].set_text("继续"),
+            scene_manager.ui_dict["btn_start_game" if event_manager.game_mode == '双人' else "btn_start_ai_game"].set_text("继续"),
             back_btn.transition_scale(1, 1, 0.05),
             pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_ARROW),
             press_sound_effect.play()
@@ -114,17 +120,37 @@ def create_scene(screen: pygame.Surface) -> tuple[list[UIBase], pygame.Surface]:
     refresh_btn.mouse_leave(lambda event, option: (refresh_btn.transition_opacity(100, 0.0), pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_ARROW)))
     refresh_btn.mouse_up(lambda event, option: (load_new_game(game_ui), press_sound_effect.play()))
     refresh_btn.enabled_event = False
+    # 开局提示按钮
+    book_btn = UIBase(screen, 655, 25, (0, 0), text = "开局提示", font_size = 18,
+                      center_anchor = True, user_font_family = True, font_family = font_path)
+    book_btn.opacity = 0
+    book_btn.mouse_enter(lambda event, option: (book_btn.set_text(font_size = 20), pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_HAND), hover_sound_effect.play()))
+    book_btn.mouse_leave(lambda event, option: (book_btn.set_text(font_size = 18), pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_ARROW)))
+    book_btn.mouse_up(lambda event, option: (suggest_opening(book_btn), press_sound_effect.play()))
+    book_btn.enabled_event = False
+    scene_manager.ui_dict["book_btn"] = book_btn
+    # 提示按钮，在后台算出最佳走法
+    hint_btn = UIBase(screen, 722, 25, (0, 0), text = "提示", font_size = 18,
+                      center_anchor = True, user_font_family = True, font_family = font_path)
+    hint_btn.opacity = 0
+    hint_btn.mouse_enter(lambda event, option: (hint_btn.set_text(font_size = 20), pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_HAND), hover_sound_effect.play()))
+    hint_btn.mouse_leave(lambda event, option: (hint_btn.set_text(font_size = 18), pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_ARROW)))
+    hint_btn.mouse_up(lambda event, option: (suggest_move(hint_btn), press_sound_effect.play()))
+    hint_btn.enabled_event = False
+    scene_manager.ui_dict["hint_btn"] = hint_btn
     # 游戏加载渲染区域
     game_ui = UIBase(screen, 75, 75, (640,640))
     game_ui.opacity = 0
+    scene_manager.ui_dict["game_ui"] = game_ui
     # 开始游戏按钮
     start_game_btn = UIBase(screen, 400, 200, (0, 0), text = "菜鸡博弈", font_size = 30,
                             center_anchor = True, user_font_family = True, font_family = font_path)
 
     start_game_btn.mouse_up(
         lambda e, a: (
-            start_game_btn.transition_opacity(0, 0.5).then(start_game, ui = game_ui,
-                                                           btn = start_game_btn, refresh_btn = refresh_btn),
+            start_game_btn.transition_opacity(0, 0.5).then(start_game, ui = game_ui, btn = start_game_btn,
+                                                           refresh_btn = refresh_btn, book_btn = book_btn,
+                                                           hint_btn = hint_btn),
             press_sound_effect.play(),
             pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_ARROW),
             fade_out_bg_img(1)
@@ -141,6 +167,8 @@ def create_scene(screen: pygame.Surface) -> tuple[list[UIBase], pygame.Surface]:
         back_btn,
         game_ui,
         refresh_btn,
+        book_btn,
+        hint_btn,
         start_game_btn
     ]
     # load_new_game(game_ui)
@@ -156,9 +184,17 @@ def load_new_game(ui: UIBase, **option):
     :param option: 函数携带参数
     :return:
     """
+    global current_game_map
     # ui.opacity = 255 # 调试用
+    if current_game_map is not None:
+        # 上一局的复盘分析不用再算了
+        current_game_map.stop_analysis()
     ui.children.clear()
-    game_map = GameMap(ui, 640)
+    # 人机模式下玩家执白，电脑执黑
+    current_game_map = GameMap(ui, 640, ai_side = 'P1' if event_manager.game_mode == '人机' else None)
+    current_game_map.game_over_callback = archive_game
+    scene_manager.ui_dict["book_btn"].set_text("开局提示")
+    scene_manager.ui_dict["hint_btn"].set_text("提示")
     ui.transition_opacity(255, 1) # 正常淡入
 
     # 如果游戏是第一次开始，则...
@@ -177,10 +213,69 @@ def start_game(option: dict[str, UIBase]):
     refresh_btn = option["refresh_btn"]
     refresh_btn.transition_opacity(100, 0.5)
     refresh_btn.enabled_event = True
+    book_btn = option["book_btn"]
+    book_btn.transition_opacity(255, 0.5)
+    book_btn.enabled_event = True
+    hint_btn = option["hint_btn"]
+    hint_btn.transition_opacity(255, 0.5)
+    hint_btn.enabled_event = True
     load_new_game(game_ui)
     btn.close()
 
 
+def suggest_opening(btn: UIBase):
+    """
+    按开局库提示当前局面最常见的下法，局面不在库里时按钮显示 棋谱已尽
+    :param btn: 开局提示按钮
+    :return:
+    """
+    if current_game_map is None or current_game_map.game_over:
+        return
+    move = opening_book.choose(current_game_map.position, best = True)
+    if move:
+        current_game_map.show_hint(move)
+    else:
+        btn.set_text("棋谱已尽")
+
+
+def suggest_move(btn: UIBase):
+    """
+    请引擎在后台算出当前局面的最佳走法并标出起点和终点，算好之前按钮显示 思考中
+    :param btn: 提示按钮
+    :return:
+    """
+    if current_game_map is None:
+        return
+    btn.set_text("思考中")
+    if not current_game_map.request_hint(lambda move: btn.set_text("提示")):
+        btn.set_text("提示")
+
+
+def archive_game(game_map: GameMap):
+    """
+    把下完的一局追加到 PGN 棋谱存档，配置里的 pgn_archive 为空时不存档
+    由 load_new_game 注册为地图的 game_over_callback，终局的那步棋记进撤销栈之后调用
+    :param game_map: 已经结束的游戏地图
+    :return:
+    """
+    path = get_config("pgn_archive")
+    if not path or not game_map.undo_stack:
+        return
+    player_name = get_config("player_names")[get_config("player_name_index")]
+    game = game_map.to_pgn_game({
+        "Event": f"{event_manager.game_mode}对局",
+        "Site": "chess-pygame",
+        "Date": time.strftime("%Y.%m.%d"),
+        "Round": "-",
+        "White": player_name,
+        "Black": "电脑" if game_map.ai_side == 'P1' else "?",
+    })
+    try:
+        append_game(abs_path("../" + path), game)
+    except OSError as error:
+        print(f"棋谱存档写入失败: {error}")
+
+
 def __fade_out_bg_img(duration: float = 0.5):
     fps_clock = scene_manager.FPS_CLOCK
     step = duration / fps_clock
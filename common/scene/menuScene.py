@@ -3,6 +3,7 @@
 """
 import pygame
 import sys
+from typing import Literal
 
 from common import uiBase
 from webbrowser import open
@@ -22,6 +23,11 @@ __all__ = [
 
 # FPS预设列表d
 FPS_PRESET = [30, 60, 120, 240]
+# 只有开和关两种状态的设置选项，值为配置文件里的键
+SETTING_SWITCHES = {
+    "和棋规则": "draw_rules",
+    "标准规则": "standard_rules",
+}
 
 
 screen_width = get_config("width")
@@ -71,16 +77,21 @@ def create_scene(screen: pygame.Surface) -> tuple[list[StartSceneBtn], pygame.Su
     btn_start_game.mouse_enter(lambda event, args: (switch_img_surface.set_background_image(btn_start_game_switch_img), switch_text.set_text(content = "同屏双人")))
     btn_start_game.mouse_up(lambda event, args: open_start_game(screen))
     scene_manager.ui_dict["btn_start_game"] = btn_start_game
+    # 人机按钮
+    btn_start_ai_game = StartSceneBtn(screen, -52, 180, (200, 70), text = "人机", font_size = 22)
+    btn_start_ai_game.mouse_enter(lambda event, args: (switch_img_surface.set_background_image(btn_start_game_switch_img), switch_text.set_text(content = "单挑电脑")))
+    btn_start_ai_game.mouse_up(lambda event, args: open_start_game(screen, '人机'))
+    scene_manager.ui_dict["btn_start_ai_game"] = btn_start_ai_game
     # 联机按钮
-    btn_online = StartSceneBtn(screen, -52, 180, (200, 70), text = "联机", font_size = 22)
+    btn_online = StartSceneBtn(screen, -52, 260, (200, 70), text = "联机", font_size = 22)
     btn_online.mouse_enter(lambda event, args: (switch_img_surface.set_background_image(btn_online_switch_img), switch_text.set_text(content = "开发中...")))
     # btn_setting.mouse_up(lambda event, args: open_setting(screen, btn_setting))
     # 设置按钮
-    btn_setting = StartSceneBtn(screen, -52, 260, (200, 70), text = "设置", font_size = 22)
+    btn_setting = StartSceneBtn(screen, -52, 340, (200, 70), text = "设置", font_size = 22)
     btn_setting.mouse_enter(lambda event, args: (switch_img_surface.set_background_image(btn_setting_switch_img), switch_text.set_text(content = "懒狗设置")))
     btn_setting.mouse_up(lambda event, args: open_setting(screen,btn_setting))
     # 致谢按钮
-    btn_create = StartSceneBtn(screen, -52, 340, (200, 70), text = "致谢", font_size = 22)
+    btn_create = StartSceneBtn(screen, -52, 420, (200, 70), text = "致谢", font_size = 22)
     btn_create.mouse_enter(lambda event, args: ( switch_img_surface.set_background_image(btn_create_switch_img), switch_text.set_text(content = "开发者名单")))
     btn_create.mouse_up(lambda event, args: open_create(screen, btn_create))
     # 退出按钮
@@ -111,6 +122,7 @@ def create_scene(screen: pygame.Surface) -> tuple[list[StartSceneBtn], pygame.Su
     # 将按钮添加进UI列表
     ui_list= [
         btn_start_game,
+        btn_start_ai_game,
         btn_online,
         btn_setting,
         btn_create,
@@ -159,7 +171,7 @@ def open_setting(screen: pygame.Surface, btn: StartSceneBtn):
             # 保存配置
             save_config()
             # 及时更新信息
-            scene_manager.ui_dict["base_info"].set_text("双人互啄 {0}".format(get_config("player_names")[get_config("player_name_index")]))
+            scene_manager.ui_dict["base_info"].set_text("{0}互啄 {1}".format(event_manager.game_mode, get_config("player_names")[get_config("player_name_index")]))
             # 淡出
             setting_ui_mask.transition_opacity(0, 0.1, fps_clock, children_together = False).then(lambda **options: setting_ui_mask.close())
             setting_ui.transition_opacity(0, 0.2, fps_clock)
@@ -177,7 +189,9 @@ def open_setting(screen: pygame.Surface, btn: StartSceneBtn):
             "玩家名称": ( f"{get_config('player_names')[get_config('player_name_index')]}", "知子莫如父" ),
             "窗口大小": ( f"{get_config('width')} x {get_config('height')}", "暂不支持更改" ),
             "游戏帧率": ( f"{get_config('FPS')} FPS", "你玩的不是3A大作" ),
-            "背景音乐": ( f"{int(get_config('volume') * 100)}", "调整背景音乐的音量" )
+            "背景音乐": ( f"{int(get_config('volume') * 100)}", "调整背景音乐的音量" ),
+            "和棋规则": ( "开启" if get_config('draw_rules') else "关闭", "三次重复局面或五十回合无吃子动兵时判和" ),
+            "标准规则": ( "开启" if get_config('standard_rules') else "关闭", "将死获胜，逼和判和，新开一局后生效" )
         }
         ui_num = 0
         # 用于设置选项的提示文本
@@ -220,11 +234,13 @@ def open_setting(screen: pygame.Surface, btn: StartSceneBtn):
             setting_info.mouse_enter(setting_info_mouse_enter,btn = (btn_right_arrow,btn_left_arrow), tips = setting_ui_tips, tips_text = content[1],info = setting_info,title = title)
             setting_info.mouse_leave(setting_info_mouse_leave, btn = (btn_right_arrow, btn_left_arrow))
             setting_info.mouse_up(setting_info_mouse_up, btn = (btn_right_arrow,btn_left_arrow), tips = setting_ui_tips, info = setting_info,title = title)
-            btn_right_arrow.mouse_up(setting_right_arrow_mouse_up, btn = btn_right_arrow, info = setting_info, title = title)
+            btn_right_arrow.mouse_up(setting_right_arrow_mouse_up, btn = btn_right_arrow, info = setting_info, title = title,
+                                     other_btn = btn_left_arrow)
             btn_right_arrow.mouse_down(setting_arrow_mouse_down, btn = btn_right_arrow)
             btn_right_arrow.mouse_enter(setting_arrow_mouse_enter, btn = btn_right_arrow)
             btn_right_arrow.mouse_leave(setting_arrow_mouse_leave, btn = btn_right_arrow, info = setting_info, title = title)
-            btn_left_arrow.mouse_up(setting_left_arrow_mouse_up, btn = btn_left_arrow, info = setting_info, title = title)
+            btn_left_arrow.mouse_up(setting_left_arrow_mouse_up, btn = btn_left_arrow, info = setting_info, title = title,
+                                    other_btn = btn_right_arrow)
             btn_left_arrow.mouse_down(setting_arrow_mouse_down, btn = btn_left_arrow)
             btn_left_arrow.mouse_enter(setting_arrow_mouse_enter, btn = btn_left_arrow)
             btn_left_arrow.mouse_leave(setting_arrow_mouse_leave, btn = btn_left_arrow, info = setting_info, title = title)
@@ -296,6 +312,15 @@ def setting_right_arrow_mouse_up(event: pygame.event.Event, option: dict[str, ui
             get_config_all()["volume"] = now_volume
             pygame.mixer.music.set_volume(now_volume)
 
+    elif title in SETTING_SWITCHES:
+        setting_info.set_text("开启")
+        get_config_all()[SETTING_SWITCHES[title]] = True
+        # 只有开和关两种，切换完当前方向的箭头就没用了
+        btn.opacity = 80
+        btn.enabled_event = False
+        option["other_btn"].opacity = 255
+        option["other_btn"].enabled_event = True
+
     elif title == "玩家名称":
         player_names = get_config("player_names")
         name_index = player_names.index(setting_info.name)
@@ -333,6 +358,14 @@ def setting_left_arrow_mouse_up(event: pygame.event.Event, option: dict[str, uiB
             get_config_all()["volume"] = now_volume
             pygame.mixer.music.set_volume(now_volume)
 
+    elif title in SETTING_SWITCHES:
+        setting_info.set_text("关闭")
+        get_config_all()[SETTING_SWITCHES[title]] = False
+        btn.opacity = 80
+        btn.enabled_event = False
+        option["other_btn"].opacity = 255
+        option["other_btn"].enabled_event = True
+
     elif title == "玩家名称":
         player_names = get_config("player_names")
         name_index = player_names.index(setting_info.name)
@@ -384,6 +417,12 @@ def setting_info_mouse_up(event: pygame.event.Event, option: dict[str, tuple[uiB
             btn_right_arrow.enabled_event = False
             pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_ARROW)
 
+    elif title in SETTING_SWITCHES:
+        # 已经开启时右箭头不可用，已经关闭时左箭头不可用
+        btn_disabled = btn_right_arrow if get_config(SETTING_SWITCHES[title]) else btn_left_arrow
+        btn_disabled.opacity = 80
+        btn_disabled.enabled_event = False
+
     elif title == "玩家名称":
         tips.set_text("知子莫如父")
         if get_config("player_name_index") == 0:
@@ -468,6 +507,12 @@ def setting_info_mouse_enter(event: pygame.event.Event, option: dict[str, tuple[
             btn_right_arrow.enabled_event = False
             pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_ARROW)
 
+    elif title in SETTING_SWITCHES:
+        # 已经开启时右箭头不可用，已经关闭时左箭头不可用
+        btn_disabled = btn_right_arrow if get_config(SETTING_SWITCHES[title]) else btn_left_arrow
+        btn_disabled.opacity = 80
+        btn_disabled.enabled_event = False
+
 # 设置选项操作鼠标离开时
 # noinspection PyUnusedLocal
 def setting_info_mouse_leave(event: pygame.event.Event, option: dict[str, uiBase.UIBase]):
@@ -547,6 +592,21 @@ def open_create(screen: pygame.Surface, btn: StartSceneBtn):
         # 把遮罩推入渲染UI列表
         scene_manager.now_scene[0].append(create_ui_mask)
 
-def open_start_game(screen: pygame.Surface):
+def open_start_game(screen: pygame.Surface, game_mode: Literal['双人', '人机'] = '双人'):
+    """
+    进入游戏场景
+    :param screen: 要绘制的surface
+    :parameter game_mode: (可选) 游戏模式
+    :return:
+    """
+    if event_manager.game_mode != game_mode:
+        event_manager.game_mode = game_mode
+        # 换了模式之前的对局就不能继续了
+        scene_manager.ui_dict["btn_start_game"].set_text("双人")
+        scene_manager.ui_dict["btn_start_ai_game"].set_text("人机")
+        if event_manager.game_has_started:
+            from .gameScene import load_new_game
+            load_new_game(scene_manager.ui_dict["game_ui"])
+    scene_manager.ui_dict["base_info"].set_text("{0}互啄 {1}".format(game_mode, get_config("player_names")[get_config("player_name_index")]))
     scene_manager.smooth_toggle_scene(screen,"game")
     event_manager.post_event("打开开始游戏")
@@ -2,63 +2,76 @@
 逻辑代码集合处和游戏入口
 """
 
-from common import config
-import pygame
-import time
-import sys
-from common.resources import ICON
-from common.scene import menuScene, gameScene
-from common.sceneManager import scene_manager
-from common.eventManager import emit, event_manager
-from common.inputBox import message_box
+import multiprocessing
 
 
-# 初始化，切记这是所有游戏代码操作之前
-pygame.init()
-# 设置一个Surface类的图标
-pygame.display.set_icon(ICON)
-# 设置标题
-pygame.display.set_caption("阿伟的国际象棋 🤣👉🤡")
-# 设置屏幕大小
-screen = pygame.display.set_mode((config.get_config("width"), config.get_config("height")))
-# ==== 设定初始场景UI ====
-# 将菜单场景和游戏场景推入场景列表进行初始化
-scene_manager.push_scene("menu", menuScene.create_scene(screen), bg_music="music2.mp3")
-scene_manager.push_scene("game", gameScene.create_scene(screen), bg_music="music1.mp3")
-# 加载启动场景
-scene_manager.load_welcome_scene(screen)
-# scene_manager.load_scene("game")
-# 帧率控制
-clock = pygame.time.Clock()
+def main():
+    # 游戏模块放在函数里导入，电脑思考用的子进程启动时不会加载图片和音乐
+    from common import config
+    import pygame
+    import time
+    import sys
+    from common.resources import ICON
+    from common.scene import menuScene, gameScene
+    from common.sceneManager import scene_manager
+    from common.eventManager import emit, event_manager
+    from common.inputBox import message_box
 
-while True:
-    # 事件监听
-    for event in pygame.event.get():
-        # 是否开启事件穿透。只针对鼠标事件
-        event.enabled_event_penetration = False
-        if event.type == pygame.QUIT:
-            res = message_box("太狠心了", "要离开了吗？")
-            if res:
-                pygame.quit()
-                sys.exit()
-        # 游戏是否处于暂停状态
-        elif event_manager.game_stop:
-            time.sleep(scene_manager.FPS_CLOCK)
-            continue
-        else:
-            # 向事件管理器发送事件
-            emit(event, stop_emit = False)
+    # 初始化，切记这是所有游戏代码操作之前
+    pygame.init()
+    # 设置一个Surface类的图标
+    pygame.display.set_icon(ICON)
+    # 设置标题
+    pygame.display.set_caption("阿伟的国际象棋 🤣👉🤡")
+    # 设置屏幕大小
+    screen = pygame.display.set_mode((config.get_config("width"), config.get_config("height")))
+    # ==== 设定初始场景UI ====
+    # 将菜单场景和游戏场景推入场景列表进行初始化
+    scene_manager.push_scene("menu", menuScene.create_scene(screen), bg_music="music2.mp3")
+    scene_manager.push_scene("game", gameScene.create_scene(screen), bg_music="music1.mp3")
+    # 加载启动场景
+    scene_manager.load_welcome_scene(screen)
+    # scene_manager.load_scene("game")
+    # 帧率控制
+    clock = pygame.time.Clock()
 
-    # 清屏
-    screen.fill((0, 0, 0))
-    # 这是背景图片绘制
-    screen.blit(scene_manager.now_scene[1], (0, 0))
-    # UI绘制
-    for ui in scene_manager.now_scene[0]:
-        ui.update(scene_manager.FPS_CLOCK)
-    # 更新屏幕
-    pygame.display.flip()
-    # 保证帧率，注意！！！这种sleep控制帧数本质上是完全错误的，只是懒得修改以前的代码了
-    time.sleep(scene_manager.FPS_CLOCK)
-    # 这是才正确的帧率控制器！但不适配目前的 UIBase 动画逻辑(╯°□°）╯︵ ┻━┻
-    # clock.tick(scene_manager.FPS)
+    while True:
+        # 事件监听
+        for event in pygame.event.get():
+            # 是否开启事件穿透。只针对鼠标事件
+            event.enabled_event_penetration = False
+            if event.type == pygame.QUIT:
+                res = message_box("太狠心了", "要离开了吗？")
+                if res:
+                    pygame.quit()
+                    sys.exit()
+            # 自定义事件(比如电脑的搜索结果)交给绑定的处理函数，暂停时也不会丢失
+            elif event_manager.dispatch(event):
+                continue
+            # 游戏是否处于暂停状态
+            elif event_manager.game_stop:
+                time.sleep(scene_manager.FPS_CLOCK)
+                continue
+            else:
+                # 向事件管理器发送事件
+                emit(event, stop_emit = False)
+
+        # 清屏
+        screen.fill((0, 0, 0))
+        # 这是背景图片绘制
+        screen.blit(scene_manager.now_scene[1], (0, 0))
+        # UI绘制
+        for ui in scene_manager.now_scene[0]:
+            ui.update(scene_manager.FPS_CLOCK)
+        # 更新屏幕
+        pygame.display.flip()
+        # 保证帧率，注意！！！这种sleep控制帧数本质上是完全错误的，只是懒得修改以前的代码了
+        time.sleep(scene_manager.FPS_CLOCK)
+        # 这是才正确的帧率控制器！但不适配目前的 UIBase 动画逻辑(╯°□°）╯︵ ┻━┻
+        # clock.tick(scene_manager.FPS)
+
+
+if __name__ == '__main__':
+    # 打包成 exe 后子进程也能正常启动
+    multiprocessing.freeze_support()
+    main()